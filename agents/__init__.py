@@ -1 +1 @@
-# Agents package for MCP Web Search Answer application
\ No newline at end of file
+# Agents package for MCP Web Search Answer application
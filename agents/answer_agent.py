@@ -1,18 +1,36 @@
 """
 Answer Agent - Summarizes search results into concise answers
-Uses Google Gemini 2.5 Flash Lite wrapped in LangChain for response generation
+Uses Google Gemini 2.5 Flash Lite wrapped in LangChain for response generation,
+with a local extractive mode for low-latency answers and Gemini outages
 """
 
 import os
-from typing import Dict, Any
-from langchain_google_genai import ChatGoogleGenerativeAI
+import time
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
 from langchain.prompts import PromptTemplate
 from langchain.schema import BaseOutputParser
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from agents.extractive_answerer import ExtractiveAnswerer
+from tools.circuit_breaker import CircuitBreaker
+from tools.metrics import TokenUsageCallback
+from tools.model_router import DEFAULT_MODEL, ModelRouter, current_stage
+from tools.rate_limiter import UpstreamLimiter
+from tools.resilience import ResilientCaller
+from tools.search_results import Evidence, SearchResult, evidence_records, evidence_text
+from tools.tracing import current_trace, span
+
+# "llm" synthesizes with Gemini; "extractive" ranks snippet sentences locally
+ANSWER_MODES = ("llm", "extractive")
 
 
 class AnswerParser(BaseOutputParser):
     """Custom parser to format the final answer response"""
-    
+
     def parse(self, text: str) -> str:
         # Clean up the response and ensure it's well-formatted
         return text.strip()
@@ -22,15 +40,38 @@ class AnswerAgent:
     """
     Agent that synthesizes search results into comprehensive, concise answers
     """
-    
-    def __init__(self):
-        # Initialize Gemini LLM with LangChain wrapper
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-exp",  # Using Gemini 2.5 Flash Lite equivalent
-            google_api_key=os.getenv("GEMINI_API_KEY"),
-            temperature=0.7  # Slightly higher temperature for more natural responses
+
+    def __init__(
+        self,
+        llm: Optional[Any] = None,
+        limiter: Optional[UpstreamLimiter] = None,
+        resilience: Optional[ResilientCaller] = None,
+        extractive: Optional[ExtractiveAnswerer] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        default_mode: Optional[str] = None,
+        fallback: Optional[bool] = None,
+        router: Optional[ModelRouter] = None,
+    ):
+        # Initialize Gemini LLM with LangChain wrapper (or reuse a shared client)
+        self.llm = (
+            llm
+            if llm is not None
+            else ChatGoogleGenerativeAI(
+                model=os.getenv("GEMINI_MODEL", DEFAULT_MODEL),
+                google_api_key=os.getenv("GEMINI_API_KEY"),
+                timeout=float(os.getenv("GEMINI_TIMEOUT", 60)),
+                # Retries happen in self.resilience (jittered, visible to the rate limiter)
+                max_retries=0,
+            )
+        )
+
+        # Per-agent sampling settings, applied per request so the client can be shared.
+        # Slightly higher temperature for more natural responses
+        self.usage_callback = TokenUsageCallback("answer_agent")
+        self.model = self.llm.bind(generation_config={"temperature": 0.7}).with_config(
+            callbacks=[self.usage_callback]
         )
-        
+
         # Define prompt template for answer generation
         self.prompt_template = PromptTemplate(
             input_variables=["search_results", "original_question"],
@@ -50,69 +91,619 @@ Original Question: {original_question}
 Search Results:
 {search_results}
 
-Answer:"""
+Answer:""",
         )
-        
+
         # Create the chain with output parser
         self.parser = AnswerParser()
-        self.chain = self.prompt_template | self.llm | self.parser
-    
-    def __call__(self, input_data: str, original_question: str = "") -> Dict[str, Any]:
+        self.chain = self.prompt_template | self.model | self.parser
+
+        # Token-level chain for streaming; AnswerParser.parse would strip every chunk
+        self.stream_chain = self.prompt_template | self.model | StrOutputParser()
+
+        # Gemini rate/concurrency limit shared with the query agent (GEMINI_* settings)
+        self.limiter = (
+            limiter if limiter is not None else UpstreamLimiter.from_env("gemini")
+        )
+
+        # Hedging and retries for answer calls; streams are neither (HEDGE_* / RETRY_* settings)
+        self.resilience = (
+            resilience
+            if resilience is not None
+            else ResilientCaller.from_env("gemini.answer")
+        )
+
+        # Local BM25 answers over the snippets, used on request and when Gemini fails
+        self.extractive = (
+            extractive
+            if extractive is not None
+            else ExtractiveAnswerer(
+                max_sentences=int(os.getenv("EXTRACTIVE_MAX_SENTENCES", 3))
+            )
+        )
+
+        # Model tier and answer length per request, shared with the query agent (MODEL_ROUTER_* settings)
+        self.router = router if router is not None else ModelRouter.from_env()
+        # (kind, tier, max output tokens) -> chain, built on first use by routed requests
+        self.routed_chains: Dict[Tuple[str, str, int], Any] = {}
+
+        # Opens on repeated Gemini errors or slow answers (ANSWER_BREAKER_* settings)
+        self.breaker = (
+            breaker
+            if breaker is not None
+            else CircuitBreaker.from_env("gemini.answer", "ANSWER_BREAKER")
+        )
+
+        self.default_mode = default_mode or os.getenv("ANSWER_MODE", "llm")
+        if self.default_mode not in ANSWER_MODES:
+            raise ValueError(
+                f"ANSWER_MODE must be one of {ANSWER_MODES}, got {self.default_mode!r}"
+            )
+
+        # Answer extractively when Gemini fails or the breaker is open (off: always return the LLM result)
+        if fallback is None:
+            fallback = os.getenv("ANSWER_FALLBACK", "true").lower() not in (
+                "0",
+                "false",
+                "no",
+                "off",
+            )
+        self.fallback = fallback
+
+        self.mode_counts: Counter = Counter()
+        self.fallback_counts: Counter = Counter()
+
+    def select_mode(self, requested: Optional[str] = None) -> Tuple[str, Optional[str]]:
+        """
+        Decide how the next answer is produced
+
+        Args:
+            requested: Mode asked for by the client (defaults to ANSWER_MODE)
+
+        Returns:
+            Tuple of (mode, fallback reason); the reason is "breaker_open"
+            when an LLM answer was asked for but Gemini is being avoided
+
+        Raises:
+            ValueError: For modes other than ANSWER_MODES
+        """
+        mode = requested or self.default_mode
+        if mode not in ANSWER_MODES:
+            raise ValueError(
+                f"Unknown answer mode {mode!r} (expected one of {ANSWER_MODES})"
+            )
+        if mode == "llm" and self.fallback and not self.breaker.allow():
+            return "extractive", "breaker_open"
+        return mode, None
+
+    def __call__(
+        self,
+        input_data: Evidence,
+        original_question: str = "",
+        mode: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """
         Process search results and return a synthesized answer
-        
+
+        Args:
+            input_data: Search result records (rendered into the prompt here)
+                or formatted search results text
+            original_question: The original user question (optional)
+            mode: "llm" or "extractive" (defaults to ANSWER_MODE)
+
+        Returns:
+            Dict with content key containing the final answer and metadata
+            with answer_mode and fallback_reason
+        """
+        mode, reason = self.select_mode(mode)
+        if mode == "extractive":
+            return self._extract(input_data, original_question, reason)
+
+        start = time.perf_counter()
+        try:
+            # Generate answer using the chain; the prompt text is rendered once, here
+            text = evidence_text(input_data)
+            with span("gemini.answer", input_chars=len(text)) as current:
+                answer = self._invoke(self._inputs(text, original_question))
+                if current is not None:
+                    current.set(output_chars=len(answer))
+
+            self.breaker.record_success(time.perf_counter() - start)
+            return self._result(answer, "llm")
+
+        except Exception as e:
+            self.breaker.record_failure()
+            return self._on_error(e, input_data, original_question)
+
+    async def acall(
+        self,
+        input_data: Evidence,
+        original_question: str = "",
+        mode: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Async variant of __call__ using chain.ainvoke
+
         Args:
-            input_data: Formatted search results text
+            input_data: Search result records or formatted search results text
             original_question: The original user question (optional)
-            
+            mode: "llm" or "extractive" (defaults to ANSWER_MODE)
+
         Returns:
-            Dict with content key containing the final answer
+            Dict with content key containing the final answer and metadata
+            with answer_mode and fallback_reason
+        """
+        mode, reason = self.select_mode(mode)
+        if mode == "extractive":
+            return self._extract(input_data, original_question, reason)
+
+        start = time.perf_counter()
+        try:
+            text = evidence_text(input_data)
+            with span("gemini.answer", input_chars=len(text)) as current:
+                answer = await self._ainvoke(self._inputs(text, original_question))
+                if current is not None:
+                    current.set(output_chars=len(answer))
+
+            self.breaker.record_success(time.perf_counter() - start)
+            return self._result(answer, "llm")
+
+        except Exception as e:
+            self.breaker.record_failure()
+            return self._on_error(e, input_data, original_question)
+
+    def stream(
+        self,
+        input_data: Evidence,
+        original_question: str = "",
+        mode: Optional[str] = None,
+        info: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[str]:
+        """
+        Stream the synthesized answer token by token
+
+        Extractive answers arrive as a single chunk, as does the extractive
+        fallback when Gemini fails before its first token.
+
+        Args:
+            input_data: Search result records or formatted search results text
+            original_question: The original user question (optional)
+            mode: "llm" or "extractive" (defaults to ANSWER_MODE)
+            info: Optional dict filled with answer_mode and fallback_reason,
+                plus error when Gemini failed after the first token
+
+        Yields:
+            Answer text chunks as they arrive from the LLM
+        """
+        info = info if info is not None else {}
+        mode, reason = self.select_mode(mode)
+        if mode == "extractive":
+            result = self._extract(input_data, original_question, reason)
+            info.update(result["metadata"])
+            yield result["content"]
+            return
+
+        info.update(answer_mode="llm", fallback_reason=None)
+        # Recorded after the fact: a span held open across yields would leak into the consumer
+        trace, start, first_token_at, output_chars = (
+            current_trace(),
+            time.perf_counter(),
+            None,
+            0,
+        )
+        started = False
+        text = evidence_text(input_data)
+        chain, tier = self._chain(streaming=True)
+        try:
+            # The slot is held until the last token arrives
+            with self.limiter.slot("answer") as permit:
+                for chunk in chain.stream(self._inputs(text, original_question)):
+                    if not started:
+                        # Mirror AnswerParser by dropping leading whitespace
+                        chunk = chunk.lstrip()
+                        started = bool(chunk)
+                    if chunk:
+                        permit.first_token()
+                        first_token_at = first_token_at or time.perf_counter()
+                        output_chars += len(chunk)
+                        yield chunk
+
+            self._record_stream_success(start, first_token_at)
+            self.router.record(
+                "answer",
+                tier,
+                (time.perf_counter() - start) * 1000,
+                len(text),
+                output_chars,
+            )
+
+        except Exception as e:
+            self.breaker.record_failure()
+            if started:
+                # Marks the streamed text as failed so callers don't treat (or cache) it as an answer
+                info["error"] = str(e)
+                yield f"Error generating answer: {str(e)}"
+            else:
+                result = self._on_error(e, input_data, original_question)
+                info.update(result["metadata"])
+                yield result["content"]
+        finally:
+            self._record_stream(trace, start, first_token_at, len(text), output_chars)
+
+    async def astream(
+        self,
+        input_data: Evidence,
+        original_question: str = "",
+        mode: Optional[str] = None,
+        info: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Async variant of stream
+
+        Args:
+            input_data: Search result records or formatted search results text
+            original_question: The original user question (optional)
+            mode: "llm" or "extractive" (defaults to ANSWER_MODE)
+            info: Optional dict filled with answer_mode and fallback_reason,
+                plus error when Gemini failed after the first token
+
+        Yields:
+            Answer text chunks as they arrive from the LLM
         """
+        info = info if info is not None else {}
+        mode, reason = self.select_mode(mode)
+        if mode == "extractive":
+            result = self._extract(input_data, original_question, reason)
+            info.update(result["metadata"])
+            yield result["content"]
+            return
+
+        info.update(answer_mode="llm", fallback_reason=None)
+        trace, start, first_token_at, output_chars = (
+            current_trace(),
+            time.perf_counter(),
+            None,
+            0,
+        )
+        started = False
+        text = evidence_text(input_data)
+        chain, tier = self._chain(streaming=True)
         try:
-            # Generate answer using the chain
-            answer = self.chain.invoke({
-                "search_results": input_data,
-                "original_question": original_question or "Please provide a summary of the information."
-            })
-            
-            return {
-                "content": answer
-            }
-            
+            async with self.limiter.aslot("answer") as permit:
+                async for chunk in chain.astream(self._inputs(text, original_question)):
+                    if not started:
+                        chunk = chunk.lstrip()
+                        started = bool(chunk)
+                    if chunk:
+                        permit.first_token()
+                        first_token_at = first_token_at or time.perf_counter()
+                        output_chars += len(chunk)
+                        yield chunk
+
+            self._record_stream_success(start, first_token_at)
+            self.router.record(
+                "answer",
+                tier,
+                (time.perf_counter() - start) * 1000,
+                len(text),
+                output_chars,
+            )
+
         except Exception as e:
-            return {
-                "content": f"Error generating answer: {str(e)}"
-            }
-    
+            self.breaker.record_failure()
+            if started:
+                # Marks the streamed text as failed so callers don't treat (or cache) it as an answer
+                info["error"] = str(e)
+                yield f"Error generating answer: {str(e)}"
+            else:
+                result = self._on_error(e, input_data, original_question)
+                info.update(result["metadata"])
+                yield result["content"]
+        finally:
+            self._record_stream(trace, start, first_token_at, len(text), output_chars)
+
+    def _record_stream_success(
+        self, start: float, first_token_at: Optional[float]
+    ) -> None:
+        """Report a finished stream to the breaker, judged by its time to first token"""
+        self.mode_counts["llm"] += 1
+        self.breaker.record_success((first_token_at or time.perf_counter()) - start)
+
+    def _record_stream(
+        self,
+        trace: Any,
+        start: float,
+        first_token_at: Optional[float],
+        input_chars: int,
+        output_chars: int,
+    ) -> None:
+        """Add a finished stream's gemini.answer span (with time to first token) to its trace"""
+        if trace is None:
+            return
+        ttft_ms = (
+            (first_token_at - start) * 1000 if first_token_at is not None else None
+        )
+        trace.record(
+            "gemini.answer",
+            start,
+            input_chars=input_chars,
+            output_chars=output_chars,
+            streamed=True,
+            ttft_ms=ttft_ms,
+        )
+
+    def batch(
+        self,
+        items: List[Tuple[Evidence, str]],
+        max_concurrency: int = 8,
+        mode: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Generate answers for many (search_results, question) pairs in parallel
+
+        Args:
+            items: List of (search result records or text, original question) tuples
+            max_concurrency: Maximum parallel LLM requests
+            mode: "llm" or "extractive" for every item (defaults to ANSWER_MODE)
+
+        Returns:
+            List of dicts with content key, in input order
+        """
+        modes = [self.select_mode(mode) for _ in items]
+        llm_items = [
+            item for item, (selected, _) in zip(items, modes) if selected == "llm"
+        ]
+        outputs = (
+            self._limited_chain().batch(
+                [self._inputs(results, question) for results, question in llm_items],
+                config={"max_concurrency": max_concurrency},
+                return_exceptions=True,
+            )
+            if llm_items
+            else []
+        )
+        return self._batch_results(items, modes, outputs)
+
+    async def abatch(
+        self,
+        items: List[Tuple[Evidence, str]],
+        max_concurrency: int = 8,
+        mode: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Async variant of batch
+
+        Args:
+            items: List of (search result records or text, original question) tuples
+            max_concurrency: Maximum parallel LLM requests
+            mode: "llm" or "extractive" for every item (defaults to ANSWER_MODE)
+
+        Returns:
+            List of dicts with content key, in input order
+        """
+        modes = [self.select_mode(mode) for _ in items]
+        llm_items = [
+            item for item, (selected, _) in zip(items, modes) if selected == "llm"
+        ]
+        outputs = (
+            await self._limited_chain().abatch(
+                [self._inputs(results, question) for results, question in llm_items],
+                config={"max_concurrency": max_concurrency},
+                return_exceptions=True,
+            )
+            if llm_items
+            else []
+        )
+        return self._batch_results(items, modes, outputs)
+
+    def _batch_results(
+        self,
+        items: List[Tuple[Evidence, str]],
+        modes: List[Tuple[str, Optional[str]]],
+        outputs: List[Any],
+    ) -> List[Dict[str, Any]]:
+        """Merge LLM batch outputs with extractive answers, falling back per failed item"""
+        outputs = iter(outputs)
+        results = []
+        for (search_results, question), (mode, reason) in zip(items, modes):
+            if mode == "extractive":
+                results.append(self._extract(search_results, question, reason))
+                continue
+            output = next(outputs)
+            if isinstance(output, Exception):
+                self.breaker.record_failure()
+                results.append(self._on_error(output, search_results, question))
+            else:
+                # Batch latency includes queueing behind other items, so only errors count
+                self.breaker.record_success()
+                results.append(self._result(output, "llm"))
+        return results
+
+    def _invoke(self, inputs: Dict[str, str]) -> str:
+        """Run the chain, hedged and retried; every attempt is admitted by the Gemini limiter"""
+        chain, tier = self._chain()
+
+        def attempt() -> str:
+            with self.limiter.slot("answer"):
+                start = time.perf_counter()
+                answer = chain.invoke(inputs)
+            self._record_call(tier, start, inputs, answer)
+            return answer
+
+        return self.resilience.call(attempt)
+
+    async def _ainvoke(self, inputs: Dict[str, str]) -> str:
+        """Async variant of _invoke"""
+        chain, tier = self._chain()
+
+        async def attempt() -> str:
+            async with self.limiter.aslot("answer"):
+                start = time.perf_counter()
+                answer = await chain.ainvoke(inputs)
+            self._record_call(tier, start, inputs, answer)
+            return answer
+
+        return await self.resilience.acall(attempt)
+
+    def _chain(self, streaming: bool = False) -> Tuple[Any, str]:
+        """
+        Chain for the active route's answer stage, and its tier
+
+        Requests without a route use the default chains on the shared client.
+        """
+        stage = current_stage("answer")
+        if stage is None:
+            return (
+                self.stream_chain if streaming else self.chain
+            ), self.router.default_tier
+
+        key = ("stream" if streaming else "chain", stage.tier, stage.max_output_tokens)
+        chain = self.routed_chains.get(key)
+        if chain is None:
+            model = (
+                self.router.client(stage.tier, self.llm)
+                .bind(
+                    generation_config={
+                        "temperature": 0.7,
+                        "max_output_tokens": stage.max_output_tokens,
+                    }
+                )
+                .with_config(callbacks=[self.usage_callback])
+            )
+            parser = StrOutputParser() if streaming else self.parser
+            chain = self.routed_chains.setdefault(
+                key, self.prompt_template | model | parser
+            )
+        return chain, stage.tier
+
+    def _record_call(
+        self, tier: str, start: float, inputs: Dict[str, str], answer: str
+    ) -> None:
+        """Report a finished Gemini call's latency and size to the router"""
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.router.record(
+            "answer",
+            tier,
+            elapsed_ms,
+            sum(len(value) for value in inputs.values()),
+            len(answer),
+        )
+
+    def _limited_chain(self) -> RunnableLambda:
+        """Chain whose batch calls go through the limiter one item at a time"""
+        return RunnableLambda(self._invoke, afunc=self._ainvoke)
+
+    def _inputs(
+        self, search_results: Evidence, original_question: str
+    ) -> Dict[str, str]:
+        """Build the prompt inputs for one answer"""
+        return {
+            "search_results": evidence_text(search_results),
+            "original_question": original_question
+            or "Please provide a summary of the information.",
+        }
+
+    def _extract(
+        self,
+        search_results: Evidence,
+        original_question: str,
+        reason: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Answer from the search snippets alone"""
+        results = evidence_records(search_results)
+        with span("extractive.answer", results=len(results)) as current:
+            answer = self.extractive.answer(results, original_question)
+            if current is not None:
+                current.set(output_chars=len(answer), fallback_reason=reason)
+
+        if reason:
+            self.fallback_counts[reason] += 1
+        return self._result(answer, "extractive", reason)
+
+    def _on_error(
+        self, error: Exception, search_results: Evidence, original_question: str
+    ) -> Dict[str, Any]:
+        """Degrade a failed LLM answer to an extractive one (or an error message)"""
+        if self.fallback:
+            print(f"⚠️ Gemini answer failed, answering extractively: {error}")
+            return self._extract(search_results, original_question, "llm_error")
+        return {
+            "content": f"Error generating answer: {str(error)}",
+            "metadata": {"answer_mode": "llm", "fallback_reason": None},
+        }
+
+    def _result(
+        self, answer: str, mode: str, reason: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Wrap an answer in a result dict and count it by mode"""
+        self.mode_counts[mode] += 1
+        return {
+            "content": answer,
+            "metadata": {"answer_mode": mode, "fallback_reason": reason},
+        }
+
+    def mode_stats(self) -> Dict[str, Any]:
+        """
+        Get answer counts by mode and the circuit breaker state
+
+        Returns:
+            Dict with llm / extractive counts, fallbacks by reason and breaker stats
+        """
+        return {
+            "llm": self.mode_counts.get("llm", 0),
+            "extractive": self.mode_counts.get("extractive", 0),
+            "fallbacks": dict(self.fallback_counts),
+            "breaker": self.breaker.stats(),
+        }
+
     def process(self, search_results: str, question: str = "") -> str:
         """
         Alternative method for direct processing
-        
+
         Args:
             search_results: Formatted search results
             question: Original user question
-            
+
         Returns:
             Generated answer string
         """
         result = self.__call__(search_results, question)
         return result["content"]
-    
-    def summarize_results(self, results_list: list, question: str = "") -> Dict[str, Any]:
+
+    async def aprocess(self, search_results: str, question: str = "") -> str:
+        """
+        Async variant of process
+
+        Args:
+            search_results: Formatted search results
+            question: Original user question
+
+        Returns:
+            Generated answer string
+        """
+        result = await self.acall(search_results, question)
+        return result["content"]
+
+    def summarize_results(
+        self, results_list: list, question: str = ""
+    ) -> Dict[str, Any]:
         """
         Method to handle structured results list
-        
+
         Args:
-            results_list: List of result dictionaries
+            results_list: SearchResult records or result dictionaries
+                (as returned by SearchTool.search)
             question: Original user question
-            
+
         Returns:
             Dict with synthesized answer
         """
-        # Convert structured results to text format
-        formatted_results = ""
-        for i, result in enumerate(results_list, 1):
-            formatted_results += f"{i}. {result.get('title', 'No title')}\n"
-            formatted_results += f"   {result.get('snippet', 'No description')}\n\n"
-        
-        return self.__call__(formatted_results, question)
\ No newline at end of file
+        records = [
+            (
+                result
+                if isinstance(result, SearchResult)
+                else SearchResult.from_serpapi(result, position)
+            )
+            for position, result in enumerate(results_list, 1)
+        ]
+        return self.__call__(records, question)
@@ -0,0 +1,113 @@
+"""
+Answer Cache - Reuses AnswerAgent answers while the search evidence is unchanged
+Entries are keyed on the canonicalized question plus a fingerprint of the
+ordered result URLs and snippets, so any change in the results forces a new answer
+"""
+
+import hashlib
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from agents.rewrite_cache import canonicalize_question
+from tools.cache import CacheBackend, create_cache, make_cache_key
+from tools.search_results import Evidence, evidence_records
+
+
+def evidence_fingerprint(search_results: Evidence) -> str:
+    """
+    Fingerprint the evidence an answer was generated from
+
+    Args:
+        search_results: Search result records, or formatted search results
+
+    Returns:
+        Hex digest over the ordered (URL, snippet) pairs
+    """
+    digest = hashlib.sha256()
+    for result in evidence_records(search_results):
+        digest.update(result.link.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(" ".join(result.snippet.split()).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class AnswerCache:
+    """
+    Question + evidence -> answer cache on a pluggable backend
+    """
+
+    def __init__(self, backend: CacheBackend, clock: Callable[[], float] = time.time):
+        """
+        Args:
+            backend: Storage backend (memory or Redis)
+            clock: Wall clock used to timestamp entries and report their age
+        """
+        self.backend = backend
+        self._clock = clock
+
+    @classmethod
+    def from_env(cls) -> Optional["AnswerCache"]:
+        """
+        Build an answer cache from ANSWER_CACHE_* environment variables
+
+        Returns:
+            Configured AnswerCache, or None when ANSWER_CACHE_BACKEND is none
+        """
+        backend = create_cache(env_prefix="ANSWER_CACHE")
+        return cls(backend) if backend is not None else None
+
+    def cacheable(self, search_results: Evidence) -> bool:
+        """Only answers grounded in actual results are worth caching"""
+        return bool(evidence_records(search_results))
+
+    def get(
+        self, question: str, search_results: Evidence
+    ) -> Optional[Tuple[str, float]]:
+        """
+        Look up the answer generated from the same evidence
+
+        Args:
+            question: Original user question
+            search_results: Search result records, or formatted search results
+
+        Returns:
+            Tuple of (answer, age in seconds), or None on a miss
+        """
+        entry = self.backend.get(self._key(question, search_results))
+        if entry is None:
+            return None
+        return entry["answer"], max(0.0, self._clock() - entry["created_at"])
+
+    def set(self, question: str, search_results: Evidence, answer: str) -> None:
+        """
+        Store an answer for a question and its evidence
+
+        Args:
+            question: Original user question
+            search_results: Search results (records or text) the answer was built from
+            answer: Generated answer
+        """
+        if self.cacheable(search_results) and not answer.startswith(
+            "Error generating answer"
+        ):
+            self.backend.set(
+                self._key(question, search_results),
+                {"answer": answer, "created_at": self._clock()},
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get answer cache counters
+
+        Returns:
+            Dict with backend name, hits, misses, evictions and hit rate
+        """
+        return self.backend.stats()
+
+    def _key(self, question: str, search_results: Evidence) -> str:
+        return make_cache_key(
+            "answer",
+            canonicalize_question(question),
+            evidence=evidence_fingerprint(search_results),
+        )
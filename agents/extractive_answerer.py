@@ -0,0 +1,126 @@
+"""
+Extractive Answerer - Answers from search snippets without calling an LLM
+Splits the snippets into sentences, ranks them against the question with
+BM25 (vectorized with NumPy) and returns the best sentences with their sources.
+Used as an explicit low-latency answer mode and as the fallback when Gemini
+is failing.
+"""
+
+import re
+from typing import Any, Dict, List
+
+import numpy as np
+
+from tools.bm25 import bm25_scores, query_terms, tokenize
+from tools.context_compactor import BOILERPLATE_PATTERNS, jaccard, shingles
+from tools.search_results import Evidence, evidence_records
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+
+NO_ANSWER = "No relevant information was found in the search results."
+
+
+class ExtractiveAnswerer:
+    """
+    BM25 sentence ranker over formatted search results
+    """
+
+    def __init__(
+        self,
+        max_sentences: int = 3,
+        k1: float = 1.5,
+        b: float = 0.75,
+        min_words: int = 4,
+        duplicate_threshold: float = 0.6,
+    ):
+        """
+        Args:
+            max_sentences: Sentences included in the answer
+            k1: BM25 term-frequency saturation
+            b: BM25 length normalization
+            min_words: Shorter fragments are not used as answer sentences
+            duplicate_threshold: Shingle similarity above which a sentence repeats another
+        """
+        self.max_sentences = max_sentences
+        self.k1 = k1
+        self.b = b
+        self.min_words = min_words
+        self.duplicate_threshold = duplicate_threshold
+
+    def answer(self, search_results: Evidence, question: str) -> str:
+        """
+        Build an answer from the sentences most relevant to the question
+
+        Args:
+            search_results: Search result records, or formatted search results
+            question: Original user question
+
+        Returns:
+            Top sentences with [n] citations followed by a Sources list
+        """
+        sentences = self._sentences(search_results)
+        if not sentences:
+            return NO_ANSWER
+
+        scores = self.score(question, [sentence["tokens"] for sentence in sentences])
+        # Prefer higher-ranked search results when scores tie
+        order = sorted(range(len(sentences)), key=lambda i: (-scores[i], i))
+        if scores[order[0]] <= 0:
+            # Nothing matches the question terms; the top result is still the best guess
+            order = list(range(len(sentences)))
+
+        chosen: List[Dict[str, Any]] = []
+        for i in order:
+            if len(chosen) == self.max_sentences:
+                break
+            signature = shingles(sentences[i]["text"])
+            if any(
+                jaccard(signature, other["shingles"]) >= self.duplicate_threshold
+                for other in chosen
+            ):
+                continue
+            chosen.append(dict(sentences[i], shingles=signature))
+
+        return self._render(chosen)
+
+    def score(self, question: str, documents: List[List[str]]) -> np.ndarray:
+        """
+        BM25 scores of tokenized documents against a question
+
+        Args:
+            question: Query text
+            documents: Tokenized documents
+
+        Returns:
+            Array with one score per document
+        """
+        return bm25_scores(query_terms(question), documents, self.k1, self.b)
+
+    def _sentences(self, search_results: Evidence) -> List[Dict[str, Any]]:
+        """Split each result's snippet into candidate sentences"""
+        sentences = []
+        for result in evidence_records(search_results):
+            snippet = result.snippet
+            for pattern in BOILERPLATE_PATTERNS:
+                snippet = pattern.sub("", snippet)
+            for text in SENTENCE_BOUNDARY.split(" ".join(snippet.split())):
+                text = text.strip(" -|·")
+                tokens = tokenize(text)
+                if len(tokens) < self.min_words:
+                    continue
+                if text[-1] not in ".!?":
+                    text += "."
+                sentences.append({"text": text, "tokens": tokens, "link": result.link})
+        return sentences
+
+    def _render(self, chosen: List[Dict[str, Any]]) -> str:
+        """Join sentences with numbered citations and list their sources"""
+        links: List[str] = []
+        parts = []
+        for sentence in chosen:
+            if sentence["link"] not in links:
+                links.append(sentence["link"])
+            parts.append(f"{sentence['text']} [{links.index(sentence['link']) + 1}]")
+
+        sources = "\n".join(f"[{n}] {link}" for n, link in enumerate(links, 1))
+        return f"{' '.join(parts)}\n\nSources:\n{sources}"
@@ -0,0 +1,201 @@
+"""
+Fast Rewriter - Deterministic, rule-based question -> search query rewriting
+Handles simple questions in microseconds so QueryAgent only calls Gemini when
+a confidence heuristic says the question is too complex
+"""
+
+import os
+import re
+from datetime import date
+from typing import Callable, List, Optional, Tuple
+
+# Filler and function words the LLM prompt would also drop
+STOPWORDS = frozenset("""
+a about above after again all am an and any are as at be been before being
+below between both but by can could did do does doing during each few for
+from further had has have having he her here hers him his i if in into is it
+its itself just me more most my myself no nor of off on once only or other
+our ours out over own please same she should so some such tell than that the
+their theirs them then there these they this those through to too under until
+up very was we were what when where which while who whom will with would you
+your yours know find show give explain info information anything something
+how why whats what's hows how's whos who's wheres where's
+""".split())
+
+# Words that imply the user wants recent results
+RECENCY_WORDS = frozenset(
+    [
+        "latest",
+        "recent",
+        "recently",
+        "newest",
+        "new",
+        "current",
+        "upcoming",
+        "now",
+        "today",
+    ]
+)
+# Phrases that pin results to the current month rather than just the year
+MONTH_PHRASES = ("this month", "this week", "today", "right now", "these days")
+YEAR_PHRASES = ("this year",)
+
+# Cues that the question needs real understanding, not keyword extraction
+COMPARISON_CUES = re.compile(
+    r"\b(vs|versus|compare|compared|comparison|difference|differences|better|worse|pros and cons)\b"
+)
+REASONING_CUES = re.compile(
+    r"\b(why|should|explain|impact|implications|cause|caused|would happen|what if)\b"
+)
+NEGATION_CUES = re.compile(r"\b(not|no|without|except|excluding|never)\b")
+YEAR_PATTERN = re.compile(r"\b(19|20)\d{2}\b")
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9][\w+#.'\-]*")
+
+MAX_KEYWORDS = 6
+
+
+class FastRewriter:
+    """
+    Rule-based rewriter: stopword removal, keyword extraction and recency terms
+    """
+
+    def __init__(
+        self, min_confidence: float = 0.7, today: Callable[[], date] = date.today
+    ):
+        """
+        Args:
+            min_confidence: Minimum confidence required to skip the LLM
+            today: Clock used for injecting the current month/year
+        """
+        self.min_confidence = min_confidence
+        self._today = today
+
+    @classmethod
+    def from_env(cls) -> Optional["FastRewriter"]:
+        """
+        Build a rewriter from QUERY_FAST_PATH_* environment variables
+
+        Returns:
+            Configured FastRewriter, or None when the fast path is disabled
+        """
+        if os.getenv("QUERY_FAST_PATH_ENABLED", "true").lower() in (
+            "0",
+            "false",
+            "no",
+            "off",
+        ):
+            return None
+        return cls(
+            min_confidence=float(os.getenv("QUERY_FAST_PATH_MIN_CONFIDENCE", 0.7))
+        )
+
+    def rewrite(self, question: str) -> Optional[str]:
+        """
+        Rewrite a question if the rules are confident enough
+
+        Args:
+            question: User's natural language question
+
+        Returns:
+            Search query, or None when the LLM should handle the question
+        """
+        query, confidence = self.analyze(question)
+        if query and confidence >= self.min_confidence:
+            return query
+        return None
+
+    def analyze(self, question: str) -> Tuple[str, float]:
+        """
+        Extract a keyword query and score how well rules can handle it
+
+        Args:
+            question: User's natural language question
+
+        Returns:
+            Tuple of (search query, confidence in [0, 1])
+        """
+        lowered = " ".join(question.lower().split())
+        tokens = [self._clean(token) for token in TOKEN_PATTERN.findall(question)]
+        tokens = [token for token in tokens if token]
+
+        recency = None
+        keywords: List[str] = []
+        # Recency words that open a capitalized name ("New York", "New Zealand")
+        name_words = 0
+        for index, token in enumerate(tokens):
+            word = token.lower()
+            if word in RECENCY_WORDS and self._starts_name(tokens, index):
+                name_words += 1
+                keywords.append(token)
+            elif word in RECENCY_WORDS:
+                recency = recency or "latest"
+            elif word not in STOPWORDS and word not in keywords:
+                keywords.append(token)
+
+        if not keywords:
+            return "", 0.0
+
+        # Drop words that only formed a recency phrase ("this month", "this year")
+        phrase_words = {"month", "week", "year", "days", "right"}
+        if any(phrase in lowered for phrase in MONTH_PHRASES + YEAR_PHRASES):
+            keywords = [k for k in keywords if k.lower() not in phrase_words]
+            recency = recency or "latest"
+
+        confidence = self._confidence(lowered, tokens, keywords)
+        if name_words:
+            # A name that reads like a rule word is easy to get wrong; let the LLM decide
+            confidence = max(0.0, confidence - 0.4)
+
+        parts = ([recency] if recency else []) + keywords
+        date_terms = self._date_terms(lowered, recency is not None)
+        query = " ".join(parts + date_terms)
+        return query, confidence
+
+    def _confidence(
+        self, lowered: str, tokens: List[str], keywords: List[str]
+    ) -> float:
+        """Heuristic confidence that keyword extraction preserves the intent"""
+        confidence = 1.0
+        if not keywords:
+            return 0.0
+        if len(keywords) > MAX_KEYWORDS:
+            confidence -= 0.4
+        if len(tokens) > 20:
+            confidence -= 0.3
+        if COMPARISON_CUES.search(lowered):
+            confidence -= 0.5
+        if REASONING_CUES.search(lowered):
+            confidence -= 0.4
+        if NEGATION_CUES.search(lowered):
+            confidence -= 0.3
+        # Several clauses or questions in one input
+        if lowered.count("?") > 1 or ";" in lowered or lowered.count(" and ") > 1:
+            confidence -= 0.2
+        return max(0.0, confidence)
+
+    def _date_terms(self, lowered: str, recent: bool) -> List[str]:
+        """Current month/year terms implied by the question"""
+        if YEAR_PATTERN.search(lowered):
+            return []
+
+        today = self._today()
+        if any(phrase in lowered for phrase in MONTH_PHRASES):
+            return [today.strftime("%B"), str(today.year)]
+        if recent or any(phrase in lowered for phrase in YEAR_PHRASES):
+            return [str(today.year)]
+        return []
+
+    def _starts_name(self, tokens: List[str], index: int) -> bool:
+        """Whether a capitalized token is followed by another, forming a name"""
+        return (
+            tokens[index][:1].isupper()
+            and index + 1 < len(tokens)
+            and tokens[index + 1][:1].isupper()
+        )
+
+    def _clean(self, token: str) -> str:
+        """Strip possessives and trailing punctuation from a token"""
+        token = token.rstrip(".-'")
+        if token.lower().endswith("'s"):
+            token = token[:-2]
+        return token
@@ -4,33 +4,83 @@ Uses Google Gemini 2.5 Flash Lite wrapped in LangChain for prompt templating
 """
 
 import os
-from typing import Dict, Any
-from langchain_google_genai import ChatGoogleGenerativeAI
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
 from langchain.prompts import PromptTemplate
 from langchain.schema import BaseOutputParser
+from langchain_core.runnables import RunnableLambda
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from agents.fast_rewriter import FastRewriter
+from agents.rewrite_cache import RewriteCache
+from tools.metrics import TokenUsageCallback
+from tools.model_router import DEFAULT_MODEL, ModelRouter, current_stage
+from tools.rate_limiter import UpstreamLimiter
+from tools.resilience import ResilientCaller
+from tools.tracing import span
 
 
 class SearchQueryParser(BaseOutputParser):
     """Custom parser to extract clean search query from LLM response"""
-    
+
     def parse(self, text: str) -> str:
         # Remove any extra formatting and return clean query
-        return text.strip().replace('"', '').replace('\n', ' ')
+        return text.strip().replace('"', "").replace("\n", " ")
+
+
+class SearchQueriesParser(BaseOutputParser):
+    """Parser that splits a multi-query LLM response into distinct queries"""
+
+    def parse(self, text: str) -> List[str]:
+        queries: List[str] = []
+        for line in text.splitlines():
+            # Models sometimes number or bullet the lines despite the instructions
+            query = (
+                re.sub(r"^\s*(?:\d+[.)]|[-*•])\s*", "", line).replace('"', "").strip()
+            )
+            if query and query.lower() not in (seen.lower() for seen in queries):
+                queries.append(query)
+        return queries
 
 
 class QueryAgent:
     """
     Agent that transforms user questions into optimized Google search queries
     """
-    
-    def __init__(self):
-        # Initialize Gemini LLM with LangChain wrapper
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-exp",  # Using Gemini 2.5 Flash Lite equivalent
-            google_api_key=os.getenv("GEMINI_API_KEY"),
-            temperature=0.3  # Lower temperature for more focused queries
+
+    def __init__(
+        self,
+        llm: Optional[Any] = None,
+        rewrite_cache: Optional[RewriteCache] = None,
+        fast_rewriter: Optional[FastRewriter] = None,
+        limiter: Optional[UpstreamLimiter] = None,
+        resilience: Optional[ResilientCaller] = None,
+        router: Optional[ModelRouter] = None,
+    ):
+        # Initialize Gemini LLM with LangChain wrapper (or reuse a shared client)
+        self.llm = (
+            llm
+            if llm is not None
+            else ChatGoogleGenerativeAI(
+                model=os.getenv("GEMINI_MODEL", DEFAULT_MODEL),
+                google_api_key=os.getenv("GEMINI_API_KEY"),
+                timeout=float(os.getenv("GEMINI_TIMEOUT", 60)),
+                # Retries happen in self.resilience (jittered, visible to the rate limiter)
+                max_retries=0,
+            )
         )
-        
+
+        # Per-agent sampling settings, applied per request so the client can be shared.
+        # Lower temperature for more focused queries
+        self.usage_callback = TokenUsageCallback("query_agent")
+        self.model = self.llm.bind(generation_config={"temperature": 0.3}).with_config(
+            callbacks=[self.usage_callback]
+        )
+
         # Define prompt template for query generation
         self.prompt_template = PromptTemplate(
             input_variables=["user_question"],
@@ -46,39 +96,449 @@ Rules:
 
 User Question: {user_question}
 
-Search Query:"""
+Search Query:""",
         )
-        
+
         # Create the chain with output parser
         self.parser = SearchQueryParser()
-        self.chain = self.prompt_template | self.llm | self.parser
-    
+        self.chain = self.prompt_template | self.model | self.parser
+
+        # Several diverse queries in one call, for multi-query search fan-out
+        self.expansion_template = PromptTemplate(
+            input_variables=["user_question", "count"],
+            template="""
+You are a search query optimizer. Write {count} different Google search queries that together find the best sources for the user's question.
+
+Rules:
+1. Keep each query concise (3-6 keywords)
+2. Put the single best query first
+3. Make the others diverse: cover different aspects of the question, or use synonyms and alternative phrasings
+4. Include time-related keywords if the question implies recency (like "recent", "latest", "new")
+5. Write one query per line, with no numbering or other text
+
+User Question: {user_question}
+
+Search Queries:""",
+        )
+        self.expansion_chain = (
+            self.expansion_template | self.model | SearchQueriesParser()
+        )
+
+        # Model tier per request, shared with the answer agent (MODEL_ROUTER_* settings)
+        self.router = router if router is not None else ModelRouter.from_env()
+        # (kind, tier, max output tokens) -> chain, built on first use by routed requests
+        self.routed_chains: Dict[Tuple[str, str, int], Any] = {}
+
+        # Gemini rate/concurrency limit shared with the answer agent (GEMINI_* settings)
+        self.limiter = (
+            limiter if limiter is not None else UpstreamLimiter.from_env("gemini")
+        )
+
+        # Hedging and retries for rewrite calls (HEDGE_* / RETRY_* settings)
+        self.resilience = (
+            resilience
+            if resilience is not None
+            else ResilientCaller.from_env("gemini.rewrite")
+        )
+
+        # Memoize rewrites so repeated questions skip the LLM round-trip
+        self.rewrite_cache = (
+            rewrite_cache if rewrite_cache is not None else RewriteCache.from_env()
+        )
+
+        # Multi-query expansions, kept apart from single rewrites (memory only)
+        self.expansion_cache = RewriteCache(
+            max_size=int(os.getenv("QUERY_REWRITE_CACHE_MAX_SIZE", 512)),
+            ttl=float(os.getenv("QUERY_REWRITE_CACHE_TTL", 3600)),
+        )
+
+        # Rule-based fast path tried before the LLM (None when disabled)
+        self.fast_rewriter = (
+            fast_rewriter if fast_rewriter is not None else FastRewriter.from_env()
+        )
+
+        # How often each rewrite path (cache, rules, llm) is taken
+        self.path_counts: Counter = Counter()
+        self._path_lock = threading.Lock()
+
+    def local_rewrite(self, question: str) -> Optional[str]:
+        """
+        Rewrite without the LLM: cached rewrite first, then the rule-based fast path
+
+        Args:
+            question: User's natural language question
+
+        Returns:
+            Search query, or None when the LLM is needed
+        """
+        cached_query = self.rewrite_cache.get(question)
+        if cached_query is not None:
+            self._count_path("cache")
+            return cached_query
+
+        if self.fast_rewriter is not None:
+            rule_query = self.fast_rewriter.rewrite(question)
+            if rule_query is not None:
+                self._count_path("rules")
+                return rule_query
+
+        return None
+
+    def _count_path(self, path: str) -> None:
+        with self._path_lock:
+            self.path_counts[path] += 1
+
     def __call__(self, input_data: str) -> Dict[str, Any]:
         """
         Process user question and return optimized search query
-        
+
+        Args:
+            input_data: User's natural language question
+
+        Returns:
+            Dict with content key containing the search query
+        """
+        local_query = self.local_rewrite(input_data)
+        if local_query is not None:
+            return {"content": local_query}
+
+        return self.llm_rewrite(input_data)
+
+    async def acall(self, input_data: str) -> Dict[str, Any]:
+        """
+        Async variant of __call__ using chain.ainvoke
+
+        Args:
+            input_data: User's natural language question
+
+        Returns:
+            Dict with content key containing the search query
+        """
+        local_query = self.local_rewrite(input_data)
+        if local_query is not None:
+            return {"content": local_query}
+
+        return await self.allm_rewrite(input_data)
+
+    def llm_rewrite(self, input_data: str) -> Dict[str, Any]:
+        """
+        Generate a search query with Gemini, skipping the local paths
+
         Args:
             input_data: User's natural language question
-            
+
         Returns:
             Dict with content key containing the search query
         """
+        self._count_path("llm")
         try:
             # Generate search query using the chain
-            search_query = self.chain.invoke({"user_question": input_data})
-            
-            return {
-                "content": search_query
-            }
-            
+            with span("gemini.rewrite", input_chars=len(input_data)) as current:
+                search_query = self._invoke({"user_question": input_data})
+                if current is not None:
+                    current.set(output_chars=len(search_query))
+            self.rewrite_cache.set(input_data, search_query)
+
+            return {"content": search_query}
+
+        except Exception as e:
+            return {"content": f"Error generating search query: {str(e)}"}
+
+    async def allm_rewrite(self, input_data: str) -> Dict[str, Any]:
+        """
+        Async variant of llm_rewrite
+
+        Args:
+            input_data: User's natural language question
+
+        Returns:
+            Dict with content key containing the search query
+        """
+        self._count_path("llm")
+        try:
+            with span("gemini.rewrite", input_chars=len(input_data)) as current:
+                search_query = await self._ainvoke({"user_question": input_data})
+                if current is not None:
+                    current.set(output_chars=len(search_query))
+            self.rewrite_cache.set(input_data, search_query)
+
+            return {"content": search_query}
+
+        except Exception as e:
+            return {"content": f"Error generating search query: {str(e)}"}
+
+    def expand(self, question: str, count: int) -> Dict[str, Any]:
+        """
+        Generate several diverse search queries for a question in one Gemini call
+
+        Args:
+            question: User's natural language question
+            count: Number of queries wanted
+
+        Returns:
+            Dict with content key containing the best query and queries key
+            containing up to count queries, best first (a single local
+            rewrite when Gemini fails)
+        """
+        cached = self.expansion_cache.get(question)
+        if cached is not None:
+            self._count_path("cache")
+            return self._expansion(cached.split("\n")[:count])
+
+        self._count_path("llm")
+        try:
+            with span(
+                "gemini.rewrite", input_chars=len(question), queries=count
+            ) as current:
+                queries = self._invoke(
+                    {"user_question": question, "count": count}, "expansion"
+                )
+                if current is not None:
+                    current.set(output_chars=sum(len(query) for query in queries))
+            return self._on_expansion(question, queries, count)
+
+        except Exception as e:
+            return self._on_expansion_error(question, e)
+
+    async def aexpand(self, question: str, count: int) -> Dict[str, Any]:
+        """
+        Async variant of expand
+
+        Args:
+            question: User's natural language question
+            count: Number of queries wanted
+
+        Returns:
+            Dict with content and queries keys
+        """
+        cached = self.expansion_cache.get(question)
+        if cached is not None:
+            self._count_path("cache")
+            return self._expansion(cached.split("\n")[:count])
+
+        self._count_path("llm")
+        try:
+            with span(
+                "gemini.rewrite", input_chars=len(question), queries=count
+            ) as current:
+                queries = await self._ainvoke(
+                    {"user_question": question, "count": count}, "expansion"
+                )
+                if current is not None:
+                    current.set(output_chars=sum(len(query) for query in queries))
+            return self._on_expansion(question, queries, count)
+
         except Exception as e:
-            return {
-                "content": f"Error generating search query: {str(e)}"
-            }
-    
+            return self._on_expansion_error(question, e)
+
+    def _on_expansion(
+        self, question: str, queries: List[str], count: int
+    ) -> Dict[str, Any]:
+        """Cache and return generated queries"""
+        if not queries:
+            raise ValueError("Gemini returned no search queries")
+        self.expansion_cache.set(question, "\n".join(queries))
+        # The best query doubles as the single rewrite for this question
+        self.rewrite_cache.set(question, queries[0])
+        return self._expansion(queries[:count])
+
+    def _on_expansion_error(self, question: str, error: Exception) -> Dict[str, Any]:
+        """Fall back to one locally rewritten query (or the question itself)"""
+        print(f"⚠️ Query expansion failed, searching a single query: {error}")
+        return self._expansion([self.local_rewrite(question) or question])
+
+    def _expansion(self, queries: List[str]) -> Dict[str, Any]:
+        return {"content": queries[0], "queries": queries}
+
+    def batch(
+        self, questions: List[str], max_concurrency: int = 8
+    ) -> List[Dict[str, Any]]:
+        """
+        Rewrite many questions, sending only cache misses to Gemini
+
+        Args:
+            questions: User questions
+            max_concurrency: Maximum parallel LLM requests
+
+        Returns:
+            List of dicts with content key, in input order
+        """
+        results, misses = self._batch_lookup(questions)
+        if misses:
+            outputs = self._limited_chain().batch(
+                [{"user_question": questions[i]} for i in misses],
+                config={"max_concurrency": max_concurrency},
+                return_exceptions=True,
+            )
+            self._batch_store(questions, misses, outputs, results)
+        return results
+
+    async def abatch(
+        self, questions: List[str], max_concurrency: int = 8
+    ) -> List[Dict[str, Any]]:
+        """
+        Async variant of batch
+
+        Args:
+            questions: User questions
+            max_concurrency: Maximum parallel LLM requests
+
+        Returns:
+            List of dicts with content key, in input order
+        """
+        results, misses = self._batch_lookup(questions)
+        if misses:
+            outputs = await self._limited_chain().abatch(
+                [{"user_question": questions[i]} for i in misses],
+                config={"max_concurrency": max_concurrency},
+                return_exceptions=True,
+            )
+            self._batch_store(questions, misses, outputs, results)
+        return results
+
+    def _invoke(self, inputs: Dict[str, Any], kind: str = "rewrite") -> Any:
+        """Run the rewrite (or expansion) chain, hedged and retried; every attempt is admitted by the Gemini limiter"""
+        chain, tier = self._chain(kind)
+
+        def attempt() -> Any:
+            with self.limiter.slot(kind):
+                start = time.perf_counter()
+                output = chain.invoke(inputs)
+            self._record_call(tier, start, inputs, output)
+            return output
+
+        return self.resilience.call(attempt)
+
+    async def _ainvoke(self, inputs: Dict[str, Any], kind: str = "rewrite") -> Any:
+        """Async variant of _invoke"""
+        chain, tier = self._chain(kind)
+
+        async def attempt() -> Any:
+            async with self.limiter.aslot(kind):
+                start = time.perf_counter()
+                output = await chain.ainvoke(inputs)
+            self._record_call(tier, start, inputs, output)
+            return output
+
+        return await self.resilience.acall(attempt)
+
+    def _chain(self, kind: str) -> Tuple[Any, str]:
+        """
+        Chain of a kind (rewrite or expansion) for the active route's rewrite stage, and its tier
+
+        Requests without a route use the default chains on the shared client;
+        expansions keep their full output length (they hold several queries).
+        """
+        stage = current_stage("rewrite")
+        if stage is None:
+            return (
+                self.expansion_chain if kind == "expansion" else self.chain
+            ), self.router.default_tier
+
+        key = (kind, stage.tier, stage.max_output_tokens)
+        chain = self.routed_chains.get(key)
+        if chain is None:
+            generation_config: Dict[str, Any] = {"temperature": 0.3}
+            if kind == "rewrite":
+                generation_config["max_output_tokens"] = stage.max_output_tokens
+            model = (
+                self.router.client(stage.tier, self.llm)
+                .bind(generation_config=generation_config)
+                .with_config(callbacks=[self.usage_callback])
+            )
+            if kind == "expansion":
+                chain = self.expansion_template | model | SearchQueriesParser()
+            else:
+                chain = self.prompt_template | model | self.parser
+            chain = self.routed_chains.setdefault(key, chain)
+        return chain, stage.tier
+
+    def _record_call(
+        self, tier: str, start: float, inputs: Dict[str, Any], output: Any
+    ) -> None:
+        """Report a finished Gemini call's latency and size to the router"""
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        output_chars = (
+            sum(len(query) for query in output)
+            if isinstance(output, list)
+            else len(output)
+        )
+        self.router.record(
+            "rewrite",
+            tier,
+            elapsed_ms,
+            sum(len(str(value)) for value in inputs.values()),
+            output_chars,
+        )
+
+    def _limited_chain(self) -> RunnableLambda:
+        """Chain whose batch calls go through the limiter one item at a time"""
+        return RunnableLambda(self._invoke, afunc=self._ainvoke)
+
+    def _batch_lookup(self, questions: List[str]) -> tuple:
+        """Serve cached/rule rewrites; return (results, indexes still to generate)"""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(questions)
+        misses = []
+        for i, question in enumerate(questions):
+            local_query = self.local_rewrite(question)
+            if local_query is not None:
+                results[i] = {"content": local_query}
+            else:
+                self._count_path("llm")
+                misses.append(i)
+        return results, misses
+
+    def _batch_store(
+        self, questions: List[str], misses: List[int], outputs: List[Any], results: List
+    ) -> None:
+        """Fill batch results from LLM outputs, caching successful rewrites"""
+        for i, output in zip(misses, outputs):
+            if isinstance(output, Exception):
+                results[i] = {
+                    "content": f"Error generating search query: {str(output)}"
+                }
+            else:
+                self.rewrite_cache.set(questions[i], output)
+                results[i] = {"content": output}
+
     def process(self, input_text: str) -> str:
         """
         Alternative method for direct processing
         """
         result = self.__call__(input_text)
-        return result["content"]
\ No newline at end of file
+        return result["content"]
+
+    async def aprocess(self, input_text: str) -> str:
+        """
+        Async variant of process
+        """
+        result = await self.acall(input_text)
+        return result["content"]
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """
+        Get rewrite cache counters
+
+        Returns:
+            Dict with exact hits, fuzzy hits and misses
+        """
+        return self.rewrite_cache.stats()
+
+    def path_stats(self) -> Dict[str, Any]:
+        """
+        Get how often each rewrite path was taken
+
+        Returns:
+            Dict with per-path counts and the share of rewrites that skipped Gemini
+        """
+        with self._path_lock:
+            counts = dict(self.path_counts)
+        total = sum(counts.values())
+        saved = counts.get("cache", 0) + counts.get("rules", 0)
+        return {
+            "cache": counts.get("cache", 0),
+            "rules": counts.get("rules", 0),
+            "llm": counts.get("llm", 0),
+            "llm_calls_saved": saved,
+            "llm_skip_rate": saved / total if total else 0.0,
+        }
@@ -0,0 +1,186 @@
+"""
+Rewrite Cache - Memoizes QueryAgent rewrites for repeated questions
+Exact matches are keyed on a canonicalized question; an optional fuzzy layer
+reuses the rewrite of a near-identical earlier question
+"""
+
+import os
+import string
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Optional
+
+from tools.cache import CacheBackend, MemoryCache, create_persistent_cache
+
+# Keep characters that change meaning in technical queries (C++, C#)
+_PUNCTUATION = "".join(c for c in string.punctuation if c not in "+#")
+_PUNCTUATION_TABLE = str.maketrans(_PUNCTUATION, " " * len(_PUNCTUATION))
+
+
+def canonicalize_question(question: str) -> str:
+    """
+    Canonicalize a question so trivial variants share a cache entry
+
+    Args:
+        question: Raw user question
+
+    Returns:
+        Lowercased question without punctuation and with collapsed whitespace
+    """
+    return " ".join(question.lower().translate(_PUNCTUATION_TABLE).split())
+
+
+def token_set_similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """
+    Jaccard similarity between two token sets
+
+    Args:
+        a: First token set
+        b: Second token set
+
+    Returns:
+        Similarity in [0, 1]
+    """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class RewriteCache:
+    """
+    Bounded cache of question -> search query rewrites
+    """
+
+    def __init__(
+        self,
+        max_size: int = 512,
+        ttl: float = 3600,
+        fuzzy_threshold: Optional[float] = None,
+        persistent: Optional[CacheBackend] = None,
+    ):
+        """
+        Args:
+            max_size: Maximum number of cached rewrites (LRU eviction)
+            ttl: Rewrite lifetime in seconds
+            fuzzy_threshold: Minimum token-set similarity for a fuzzy hit
+                (None disables the fuzzy layer)
+            persistent: Optional tier below memory that survives restarts
+        """
+        self.cache = MemoryCache(max_size=max_size, ttl=ttl)
+        self.persistent = persistent
+        self.fuzzy_threshold = fuzzy_threshold
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+        # Token sets of cached questions for the fuzzy layer, in LRU order
+        self._tokens: "OrderedDict[str, FrozenSet[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "RewriteCache":
+        """
+        Build a rewrite cache from QUERY_REWRITE_CACHE_* environment variables
+
+        Returns:
+            Configured RewriteCache
+        """
+        threshold = os.getenv("QUERY_REWRITE_FUZZY_THRESHOLD")
+        ttl = float(os.getenv("QUERY_REWRITE_CACHE_TTL", 3600))
+        return cls(
+            max_size=int(os.getenv("QUERY_REWRITE_CACHE_MAX_SIZE", 512)),
+            ttl=ttl,
+            fuzzy_threshold=float(threshold) if threshold else None,
+            persistent=create_persistent_cache("QUERY_REWRITE_CACHE", ttl),
+        )
+
+    def get(self, question: str) -> Optional[str]:
+        """
+        Look up a cached rewrite for a question
+
+        Args:
+            question: Raw user question
+
+        Returns:
+            Cached search query or None
+        """
+        key = canonicalize_question(question)
+        rewrite = self.cache.peek(key)
+        if rewrite is None and self.persistent is not None:
+            rewrite = self.persistent.peek(key)
+            if rewrite is not None:
+                # Promote into memory (and the fuzzy index)
+                self._remember(key, rewrite)
+        if rewrite is not None:
+            self.hits += 1
+            return rewrite
+
+        if self.fuzzy_threshold is not None:
+            match = self._closest(frozenset(key.split()))
+            rewrite = self.cache.peek(match) if match is not None else None
+            if rewrite is not None:
+                self.fuzzy_hits += 1
+                return rewrite
+
+        self.misses += 1
+        return None
+
+    def set(self, question: str, rewrite: str) -> None:
+        """
+        Store the rewrite for a question
+
+        Args:
+            question: Raw user question
+            rewrite: Generated search query
+        """
+        key = canonicalize_question(question)
+        self._remember(key, rewrite)
+        if self.persistent is not None:
+            self.persistent.set(key, rewrite)
+
+    def _remember(self, key: str, rewrite: str) -> None:
+        """Store a rewrite in memory and the fuzzy index"""
+        self.cache.set(key, rewrite)
+
+        if self.fuzzy_threshold is None:
+            return
+
+        with self._lock:
+            self._tokens[key] = frozenset(key.split())
+            self._tokens.move_to_end(key)
+            while len(self._tokens) > self.cache.max_size:
+                self._tokens.popitem(last=False)
+
+    def _closest(self, tokens: FrozenSet[str]) -> Optional[str]:
+        """Find the most similar cached question above the fuzzy threshold"""
+        best_key, best_score = None, self.fuzzy_threshold
+        with self._lock:
+            candidates = list(self._tokens.items())
+
+        for key, cached_tokens in candidates:
+            # Jaccard can't reach the threshold if the sizes differ too much
+            smaller, larger = sorted((len(tokens), len(cached_tokens)))
+            if not larger or smaller / larger < best_score:
+                continue
+
+            score = token_set_similarity(tokens, cached_tokens)
+            if score >= best_score:
+                best_key, best_score = key, score
+
+        return best_key
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get rewrite cache counters
+
+        Returns:
+            Dict with exact hits, fuzzy hits, misses and overall hit rate
+        """
+        total = self.hits + self.fuzzy_hits + self.misses
+        return {
+            "hits": self.hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "evictions": self.cache.evictions,
+            "hit_rate": (self.hits + self.fuzzy_hits) / total if total else 0.0,
+        }
@@ -0,0 +1,427 @@
+"""
+Deterministic stand-ins for Gemini, SerpAPI and the result pages
+Replay recorded fixtures with configurable latency distributions and error
+rates, and record how long each stage spent waiting on its backend
+"""
+
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from urllib.parse import unquote, urlsplit
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from tools.cache import normalize_query
+
+FIXTURES_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "fixtures", "recorded.json"
+)
+
+QUESTION_PATTERN = re.compile(r"(?:User Question|Original Question): (.*)")
+
+
+def load_fixtures(path: str = FIXTURES_PATH) -> Dict[str, Any]:
+    """
+    Load recorded questions, rewrites, answers and SerpAPI payloads
+
+    Args:
+        path: Fixture file
+
+    Returns:
+        Fixture dict with questions, rewrites, answers and serpapi keys
+    """
+    with open(path, encoding="utf-8") as f:
+        fixtures = json.load(f)
+    fixtures["serpapi"] = {
+        normalize_query(q): payload for q, payload in fixtures["serpapi"].items()
+    }
+    return fixtures
+
+
+class LatencyModel:
+    """
+    Log-normal latency with an injected error rate, seeded for reproducibility
+    """
+
+    def __init__(
+        self,
+        median_ms: float,
+        jitter: float = 0.35,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            median_ms: Median latency in milliseconds
+            jitter: Log-normal sigma (0 gives a constant latency)
+            error_rate: Probability that a call fails
+            seed: Random seed
+        """
+        self.median_ms = median_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> tuple:
+        """
+        Draw one call outcome
+
+        Returns:
+            Tuple of (latency in seconds, whether the call fails)
+        """
+        with self._lock:
+            latency = (
+                self.median_ms * math.exp(self._random.gauss(0, self.jitter))
+                if self.jitter
+                else self.median_ms
+            )
+            failed = self._random.random() < self.error_rate
+        return latency / 1000, failed
+
+
+class StageRecorder:
+    """
+    Thread-safe accumulator of time spent per stage
+    """
+
+    def __init__(self):
+        self._totals: Dict[str, float] = defaultdict(float)
+        self._calls: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._totals[stage] += seconds
+            self._calls[stage] += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._totals.clear()
+            self._calls.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get per-stage totals
+
+        Returns:
+            Dict of stage -> {"calls", "total_ms"}
+        """
+        with self._lock:
+            return {
+                stage: {
+                    "calls": self._calls[stage],
+                    "total_ms": self._totals[stage] * 1000,
+                }
+                for stage in sorted(self._totals)
+            }
+
+
+class FakeGeminiChat(BaseChatModel):
+    """
+    Chat model that answers QueryAgent and AnswerAgent prompts from fixtures
+    """
+
+    fixtures: Dict[str, Any]
+    rewrite_latency: Any
+    answer_latency: Any
+    recorder: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-gemini"
+
+    def _respond(self, messages: List[BaseMessage]) -> tuple:
+        """Pick the stage, response text and latency model for a prompt"""
+        prompt = str(messages[-1].content)
+        match = QUESTION_PATTERN.search(prompt)
+        question = match.group(1).strip() if match else ""
+
+        if "search query optimizer" in prompt:
+            text = self.fixtures["rewrites"].get(
+                question, normalize_query(question).rstrip("?")
+            )
+            return "rewrite", text, self.rewrite_latency
+        text = self.fixtures["answers"].get(
+            question, f"Based on the search results, here is an answer to: {question}"
+        )
+        return "answer", text, self.answer_latency
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        stage, text, latency = self._respond(messages)
+        delay, failed = latency.sample()
+        start = time.perf_counter()
+        time.sleep(delay)
+        self.recorder.add(stage, time.perf_counter() - start)
+        if failed:
+            raise RuntimeError(f"Injected Gemini {stage} error")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        stage, text, latency = self._respond(messages)
+        delay, failed = latency.sample()
+        start = time.perf_counter()
+        await asyncio.sleep(delay)
+        self.recorder.add(stage, time.perf_counter() - start)
+        if failed:
+            raise RuntimeError(f"Injected Gemini {stage} error")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        # The whole sampled latency is paid before the first token
+        result = self._generate(messages, stop, run_manager, **kwargs)
+        for word in result.generations[0].message.content.split(" "):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        result = await self._agenerate(messages, stop, run_manager, **kwargs)
+        for word in result.generations[0].message.content.split(" "):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+
+class FakeSerpAPI:
+    """
+    Replays recorded SerpAPI payloads for both the sync client and httpx
+    """
+
+    def __init__(
+        self,
+        fixtures: Dict[str, Any],
+        latency: LatencyModel,
+        recorder: StageRecorder,
+        link_base: Optional[str] = None,
+    ):
+        """
+        Args:
+            fixtures: Loaded fixtures
+            latency: SerpAPI latency model
+            recorder: Stage time accumulator
+            link_base: Rewrite result links onto this URL (a FakeWebServer)
+        """
+        self.fixtures = fixtures
+        self.latency = latency
+        self.recorder = recorder
+        self.link_base = link_base
+
+    def payload(self, query: str) -> Dict[str, Any]:
+        """Recorded payload for a query, or a synthetic one for unseen queries"""
+        payload = self._payload(query)
+        if not self.link_base:
+            return payload
+        slug = normalize_query(query).replace(" ", "-")
+        return {
+            **payload,
+            "organic_results": [
+                {**result, "link": f"{self.link_base}/{i}/{slug}"}
+                for i, result in enumerate(payload.get("organic_results", []), 1)
+            ],
+        }
+
+    def _payload(self, query: str) -> Dict[str, Any]:
+        recorded = self.fixtures["serpapi"].get(normalize_query(query))
+        if recorded is not None:
+            return recorded
+        return {
+            "organic_results": [
+                {
+                    "title": f"{query} - result {i}",
+                    "snippet": f"Result {i} discusses {query} with background and recent developments.",
+                    "link": f"https://example.com/{i}/{normalize_query(query).replace(' ', '-')}",
+                }
+                for i in range(1, 6)
+            ]
+        }
+
+    def google_search_class(self) -> type:
+        """
+        Build a drop-in replacement for serpapi.GoogleSearch
+
+        Returns:
+            Class with the GoogleSearch(params).get_dict() interface
+        """
+        fake = self
+
+        class FakeGoogleSearch:
+            def __init__(self, params: Dict[str, Any]):
+                self.params = params
+
+            def get_dict(self) -> Dict[str, Any]:
+                delay, failed = fake.latency.sample()
+                start = time.perf_counter()
+                time.sleep(delay)
+                fake.recorder.add("search", time.perf_counter() - start)
+                if failed:
+                    raise RuntimeError("Injected SerpAPI error")
+                return fake.payload(self.params["q"])
+
+        return FakeGoogleSearch
+
+    def transport(self) -> Any:
+        """
+        Build an httpx transport for SearchTool's async client
+
+        Returns:
+            httpx.MockTransport serving recorded payloads
+        """
+        import httpx
+
+        async def handler(request: "httpx.Request") -> "httpx.Response":
+            delay, failed = self.latency.sample()
+            start = time.perf_counter()
+            await asyncio.sleep(delay)
+            self.recorder.add("search", time.perf_counter() - start)
+            if failed:
+                return httpx.Response(500, json={"error": "Injected SerpAPI error"})
+            return httpx.Response(200, json=self.payload(request.url.params["q"]))
+
+        return httpx.MockTransport(handler)
+
+
+class FakeWebServer:
+    """
+    Local HTTP server standing in for the result pages
+
+    Serves synthetic article HTML (navigation, scripts, link lists and body
+    paragraphs mentioning the words of the request path) of a configurable
+    size, after a sampled time to first byte, in chunks like a real origin.
+    """
+
+    def __init__(
+        self,
+        latency: LatencyModel,
+        recorder: StageRecorder,
+        page_kb: int = 64,
+        chunk_size: int = 8192,
+    ):
+        """
+        Args:
+            latency: Time-to-first-byte model (failures answer 503)
+            recorder: Stage time accumulator
+            page_kb: Approximate page size in KiB
+            chunk_size: Bytes written per chunk
+        """
+        self.latency = latency
+        self.recorder = recorder
+        self.page_kb = page_kb
+        self.chunk_size = chunk_size
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of the running server"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def page(self, path: str) -> bytes:
+        """Synthetic HTML for a request path"""
+        topic = (
+            " ".join(unquote(urlsplit(path).path).strip("/").split("/")[-1].split("-"))
+            or "the topic"
+        )
+        head = (
+            f"<html><head><title>{topic}</title><script>var tracking = {{}};</script>"
+            "<style>body { margin: 0 }</style></head><body>"
+            "<nav><a href='/'>Home</a> <a href='/news'>News</a> <a href='/about'>About</a></nav>"
+        )
+        tail = "<footer>Copyright. All rights reserved. Privacy policy.</footer></body></html>"
+        parts = [head]
+        size = len(head) + len(tail)
+        i = 0
+        while size < self.page_kb * 1024:
+            i += 1
+            paragraph = (
+                f"<p>Section {i} explains {topic} in detail, covering how it works, where it is used "
+                f"and what changed recently. Readers comparing sources on {topic} will find the "
+                f"background here useful alongside the official documentation.</p>"
+                if i % 4
+                else f"<ul><li><a href='/related/{i}'>Related article {i}</a></li>"
+                f"<li><a href='/more/{i}'>More stories</a></li></ul>"
+            )
+            parts.append(paragraph)
+            size += len(paragraph)
+        parts.append(tail)
+        return "".join(parts).encode("utf-8")
+
+    def start(self) -> "FakeWebServer":
+        """Start serving on an ephemeral localhost port"""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                delay, failed = fake.latency.sample()
+                start = time.perf_counter()
+                time.sleep(delay)
+                fake.recorder.add("page", time.perf_counter() - start)
+                if failed:
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = fake.page(self.path)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    for offset in range(0, len(body), fake.chunk_size):
+                        self.wfile.write(body[offset : offset + fake.chunk_size])
+                except (BrokenPipeError, ConnectionResetError):
+                    # The fetcher hung up after its byte cap
+                    pass
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop the server"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,512 @@
+"""
+Offline Benchmark Suite - Measures the request paths without live API keys
+Runs WebSearchWorkflow (sync, async, batch) and the server's step-by-step path
+against fake Gemini and SerpAPI backends, and reports throughput, latency
+percentiles, per-stage time and allocations. With --deep, result links point
+at a local HTTP server and the page fetching stage is enabled
+
+Usage:
+    python -m benchmarks.run
+    python -m benchmarks.run --iterations 50 --paths sync,async --compare benchmarks/results/baseline.json
+    python -m benchmarks.run --deep --page-kb 256 --fetch-ms 200
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Add the project root to the path when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import (
+    FakeGeminiChat,
+    FakeSerpAPI,
+    FakeWebServer,
+    LatencyModel,
+    StageRecorder,
+    load_fixtures,
+)
+
+PATHS = ("sync", "step_by_step", "async", "batch")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Environment for a cold, self-contained run (caches off, dummy keys, Gemini
+# answers only so injected errors are not masked by the extractive fallback)
+COLD_ENV = {
+    "GEMINI_API_KEY": "benchmark",
+    "SERPAPI_KEY": "benchmark",
+    "SEARCH_CACHE_BACKEND": "none",
+    "ANSWER_CACHE_BACKEND": "none",
+    "QUERY_REWRITE_CACHE_MAX_SIZE": "0",
+    "CACHE_DIR": None,
+    "ANSWER_MODE": "llm",
+    "ANSWER_FALLBACK": "false",
+}
+
+
+def is_error(result: Dict[str, Any]) -> bool:
+    """Whether a response dict reports a failure anywhere in the pipeline"""
+    content = result.get("content", "")
+    return not result.get("metadata", {}).get("success", True) or content.startswith(
+        ("Error", "Answer generation failed", "Processing failed", "Workflow failed")
+    )
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile
+
+    Args:
+        samples: Values
+        pct: Percentile in [0, 100]
+
+    Returns:
+        The percentile value (0.0 for no samples)
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+@contextlib.contextmanager
+def benchmark_env(warm: bool, deep: bool = False) -> Iterator[None]:
+    """Apply the benchmark environment and restore the previous one afterwards"""
+    overrides = (
+        {"GEMINI_API_KEY": "benchmark", "SERPAPI_KEY": "benchmark"}
+        if warm
+        else dict(COLD_ENV)
+    )
+    overrides["PAGE_FETCH_ENABLED"] = "true" if deep else None
+    previous = {name: os.environ.get(name) for name in overrides}
+    try:
+        for name, value in overrides.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+class Harness:
+    """
+    Builds fresh components wired to the fake backends for each measured path
+    """
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.fixtures = load_fixtures()
+        self.recorder = StageRecorder()
+        scale = args.latency_scale
+
+        def model(median_ms: float, seed_offset: int) -> LatencyModel:
+            return LatencyModel(
+                median_ms * scale, args.jitter, args.error_rate, args.seed + seed_offset
+            )
+
+        self.llm = FakeGeminiChat(
+            fixtures=self.fixtures,
+            rewrite_latency=model(args.rewrite_ms, 1),
+            answer_latency=model(args.answer_ms, 2),
+            recorder=self.recorder,
+        )
+        self.serpapi = FakeSerpAPI(
+            self.fixtures, model(args.search_ms, 3), self.recorder
+        )
+        self.web: Optional[FakeWebServer] = None
+        if args.deep:
+            self.web = FakeWebServer(
+                model(args.fetch_ms, 4), self.recorder, args.page_kb
+            ).start()
+            self.serpapi.link_base = self.web.url
+
+    def close(self) -> None:
+        if self.web is not None:
+            self.web.stop()
+
+    def questions(self, count: int) -> List[str]:
+        recorded = self.fixtures["questions"]
+        return [recorded[i % len(recorded)] for i in range(count)]
+
+    def server(self) -> Any:
+        """A server on a fresh registry whose LLM and SerpAPI are fakes"""
+        from langflow.registry import ComponentRegistry
+        from server import MCPWebSearchServer
+
+        registry = ComponentRegistry(factories={"llm": lambda registry: self.llm})
+        registry.search_tool.transport = self.serpapi.transport()
+        return MCPWebSearchServer(registry=registry)
+
+    def runner(self, path: str) -> Callable[[List[str]], List[tuple]]:
+        """
+        Build a function that answers questions on one path
+
+        Returns:
+            Callable taking questions and returning (latency in seconds, result)
+            pairs
+        """
+        server = self.server()
+        workflow = server.workflow
+        concurrency = self.args.concurrency
+
+        def timed(call: Callable[[str], Any]) -> Callable[[List[str]], List[tuple]]:
+            def run(questions: List[str]) -> List[tuple]:
+                outcomes = []
+                for question in questions:
+                    start = time.perf_counter()
+                    result = call(question)
+                    outcomes.append((time.perf_counter() - start, result))
+                return outcomes
+
+            return run
+
+        if path == "sync":
+            return timed(workflow.run)
+        if path == "step_by_step":
+            return timed(server.process_step_by_step)
+
+        if path == "async":
+
+            def run_async(questions: List[str]) -> List[tuple]:
+                async def main() -> List[tuple]:
+                    slots = asyncio.Semaphore(concurrency)
+
+                    async def one(question: str) -> tuple:
+                        async with slots:
+                            start = time.perf_counter()
+                            result = await workflow.arun(question)
+                            return time.perf_counter() - start, result
+
+                    try:
+                        return list(await asyncio.gather(*(one(q) for q in questions)))
+                    finally:
+                        await workflow.search_tool.aclose()
+                        if workflow.page_fetcher is not None:
+                            await workflow.page_fetcher.aclose()
+
+                return asyncio.run(main())
+
+            return run_async
+
+        if path == "batch":
+
+            def run_batch(questions: List[str]) -> List[tuple]:
+                # Latency of a batch item is its completion time from the batch start
+                start = time.perf_counter()
+                return [
+                    (time.perf_counter() - start, result)
+                    for result in workflow.run_batch(questions, concurrency)
+                ]
+
+            return run_batch
+
+        raise ValueError(f"Unknown benchmark path: {path}")
+
+    def measure(self, path: str) -> Dict[str, Any]:
+        """
+        Benchmark one path
+
+        Returns:
+            Dict with throughput, latency percentiles, per-stage time and allocations
+        """
+        iterations = self.args.iterations
+        questions = self.questions(iterations)
+
+        with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+            run = self.runner(path)
+            run(self.questions(self.args.warmup))
+
+            self.recorder.reset()
+            start = time.perf_counter()
+            outcomes = run(questions)
+            elapsed = time.perf_counter() - start
+            stages = self.recorder.snapshot()
+
+            allocations = self._allocations(self.runner(path))
+
+        latencies_ms = [latency * 1000 for latency, _ in outcomes]
+        errors = sum(1 for _, result in outcomes if is_error(result))
+        mean_ms = statistics.mean(latencies_ms) if latencies_ms else 0.0
+        stage_ms = {
+            stage: {
+                "calls": totals["calls"],
+                "ms_per_request": totals["total_ms"] / iterations,
+            }
+            for stage, totals in stages.items()
+        }
+        backend_ms = sum(stage["ms_per_request"] for stage in stage_ms.values())
+        return {
+            "requests": iterations,
+            "elapsed_s": round(elapsed, 4),
+            "throughput_rps": round(iterations / elapsed, 3) if elapsed else 0.0,
+            "error_rate": round(errors / iterations, 4) if iterations else 0.0,
+            "latency_ms": {
+                "mean": round(mean_ms, 3),
+                "p50": round(percentile(latencies_ms, 50), 3),
+                "p95": round(percentile(latencies_ms, 95), 3),
+                "p99": round(percentile(latencies_ms, 99), 3),
+                "max": round(max(latencies_ms, default=0.0), 3),
+            },
+            "stages_ms": {
+                **{
+                    stage: round(values["ms_per_request"], 3)
+                    for stage, values in stage_ms.items()
+                },
+                # Time not spent waiting on a backend (only meaningful for sequential paths)
+                "overhead": (
+                    round(mean_ms - backend_ms, 3)
+                    if path in ("sync", "step_by_step")
+                    else None
+                ),
+            },
+            "allocations": allocations,
+        }
+
+    def _allocations(self, run: Callable[[List[str]], List[tuple]]) -> Dict[str, float]:
+        """Peak and retained traced memory for a short run"""
+        count = self.args.alloc_iterations
+        if not count:
+            return {}
+        questions = self.questions(count)
+        tracemalloc.start()
+        try:
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            run(questions)
+            after, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {
+            "requests": count,
+            "peak_kib": round((peak - before) / 1024, 1),
+            "retained_kib_per_request": round((after - before) / 1024 / count, 2),
+        }
+
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Run the selected benchmark paths
+
+    Args:
+        args: Parsed command-line options
+
+    Returns:
+        Report dict with configuration, environment and per-path results
+    """
+    import tools.search_tool as search_tool
+
+    paths = [p.strip() for p in args.paths.split(",") if p.strip()]
+    google_search = search_tool.GoogleSearch
+    with benchmark_env(args.warm, args.deep):
+        harness = Harness(args)
+        search_tool.GoogleSearch = harness.serpapi.google_search_class()
+        try:
+            results = {path: harness.measure(path) for path in paths}
+        finally:
+            search_tool.GoogleSearch = google_search
+            harness.close()
+
+    return {
+        "label": args.label,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "config": {
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "rewrite_ms": args.rewrite_ms,
+            "search_ms": args.search_ms,
+            "answer_ms": args.answer_ms,
+            "deep": args.deep,
+            "fetch_ms": args.fetch_ms if args.deep else None,
+            "page_kb": args.page_kb if args.deep else None,
+            "latency_scale": args.latency_scale,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+            "seed": args.seed,
+            "warm_caches": args.warm,
+        },
+        "results": results,
+    }
+
+
+def compare(
+    report: Dict[str, Any], baseline: Dict[str, Any], threshold: float
+) -> List[str]:
+    """
+    Compare a report with a baseline
+
+    Args:
+        report: Current report
+        baseline: Stored report
+        threshold: Allowed slowdown in percent before flagging a regression
+
+    Returns:
+        Human-readable regression messages (empty when within threshold)
+    """
+    regressions = []
+    for path, result in report["results"].items():
+        previous = baseline.get("results", {}).get(path)
+        if previous is None:
+            continue
+        for metric in ("p50", "p95", "p99"):
+            old, new = previous["latency_ms"][metric], result["latency_ms"][metric]
+            if old and (new - old) / old * 100 > threshold:
+                regressions.append(f"{path} {metric}: {old:.1f}ms -> {new:.1f}ms")
+        old, new = previous["throughput_rps"], result["throughput_rps"]
+        if old and (old - new) / old * 100 > threshold:
+            regressions.append(f"{path} throughput: {old:.2f} -> {new:.2f} req/s")
+    return regressions
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(
+        f"\n📊 Benchmark: {report['label']} ({report['config']['iterations']} requests per path)"
+    )
+    print(
+        f"{'path':<14}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        f"{'errors':>8}{'peak KiB':>10}  stages (ms/request)"
+    )
+    for path, result in report["results"].items():
+        latency = result["latency_ms"]
+        stages = ", ".join(
+            f"{name}={value}"
+            for name, value in result["stages_ms"].items()
+            if value is not None
+        )
+        peak = result["allocations"].get("peak_kib", "-")
+        print(
+            f"{path:<14}{result['throughput_rps']:>9.2f}{latency['p50']:>10.1f}"
+            f"{latency['p95']:>10.1f}{latency['p99']:>10.1f}{result['error_rate']:>8.0%}{peak:>10}  {stages}"
+        )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Offline benchmarks with fake Gemini and SerpAPI backends"
+    )
+    parser.add_argument(
+        "--paths",
+        default=",".join(PATHS),
+        help=f"Comma-separated paths ({', '.join(PATHS)})",
+    )
+    parser.add_argument(
+        "--iterations", type=int, default=20, help="Measured requests per path"
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=2, help="Unmeasured requests per path"
+    )
+    parser.add_argument(
+        "--alloc-iterations",
+        type=int,
+        default=5,
+        help="Requests traced for allocations (0 disables)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Concurrency for the async and batch paths",
+    )
+    parser.add_argument(
+        "--rewrite-ms", type=float, default=150, help="Median Gemini rewrite latency"
+    )
+    parser.add_argument(
+        "--answer-ms", type=float, default=300, help="Median Gemini answer latency"
+    )
+    parser.add_argument(
+        "--search-ms", type=float, default=250, help="Median SerpAPI latency"
+    )
+    parser.add_argument(
+        "--deep",
+        action="store_true",
+        help="Fetch result pages from a local HTTP server",
+    )
+    parser.add_argument(
+        "--fetch-ms",
+        type=float,
+        default=200,
+        help="Median time to first byte of a result page",
+    )
+    parser.add_argument(
+        "--page-kb", type=int, default=64, help="Size of each result page in KiB"
+    )
+    parser.add_argument(
+        "--latency-scale",
+        type=float,
+        default=1.0,
+        help="Multiplier for all latencies (0 measures overhead only)",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.35,
+        help="Log-normal sigma of backend latencies",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Probability of an injected backend error",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Random seed for latencies and errors"
+    )
+    parser.add_argument(
+        "--warm", action="store_true", help="Keep the configured caches enabled"
+    )
+    parser.add_argument("--label", default="latest", help="Report name")
+    parser.add_argument(
+        "--output", help="Report path (default: benchmarks/results/<label>.json)"
+    )
+    parser.add_argument("--compare", help="Baseline report to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=20.0, help="Regression threshold in percent"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    report = run_benchmarks(args)
+    print_report(report)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{args.label}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"❌ Regressions beyond {args.threshold:.0f}%:")
+            for regression in regressions:
+                print(f"   {regression}")
+            return 1
+        print(f"✅ No regressions beyond {args.threshold:.0f}% against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
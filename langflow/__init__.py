@@ -1 +1 @@
-# LangFlow package for workflow management
\ No newline at end of file
+# LangFlow package for workflow management
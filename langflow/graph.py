@@ -3,204 +3,1771 @@ LangGraph Workflow Manager
 Defines the transition logic between agents and tools in the MCP application
 """
 
-from typing import Dict, Any, TypedDict
-from langgraph.graph import StateGraph, END
-from agents.query_agent import QueryAgent
-from agents.answer_agent import AnswerAgent
-from tools.search_tool import SearchTool
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import os
+import queue
+import statistics
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, TypedDict
+
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langgraph.config import get_stream_writer
+from langgraph.graph import END, StateGraph
+
+from agents.answer_cache import AnswerCache
+from agents.fast_rewriter import STOPWORDS
+from agents.rewrite_cache import canonicalize_question, token_set_similarity
+from langflow.registry import ComponentRegistry, get_registry
+from tools import metrics, model_router, tracing
+from tools.cache import normalize_query
+from tools.context_compactor import ContextCompactor
+from tools.deadline import Deadline, DeadlineExpired, acall_within, call_within
+from tools.model_router import Route
+from tools.page_fetcher import PageFetcher
+from tools.passage_index import PassageIndex
+from tools.search_results import Evidence, SearchResult, render_results
+from tools.singleflight import SingleFlight
 
 
 class WorkflowState(TypedDict):
     """State object that flows through the workflow"""
+
     original_question: str
     search_query: str
+    search_queries: List[str]
+    fanout_stats: Dict[str, int]
+    # Result records flow between stages; search_results only carries text
+    # when there are none (an error or "No search results found.")
+    results: List[SearchResult]
     search_results: str
+    page_stats: Dict[str, Any]
+    passage_index: Dict[str, Any]
     final_answer: str
     current_step: str
+    speculation: str
+    context_stats: Dict[str, int]
+    answer_cache: Dict[str, Any]
+    answer_mode: str
+    answered_by: Dict[str, Any]
+    # Model tiers and modes picked for the question (None when not routed)
+    route: Optional[Route]
+    # Request deadline checked by every stage (None when unbounded)
+    deadline: Optional[Deadline]
+    # Answer chunks streamed so far, kept when the answer is cut
+    partial_answer: List[str]
+
+
+# Speculation outcomes where web_search is skipped
+SPECULATION_USED = ("hit", "deadline", "fallback")
+
+# Share of the time left before the request deadline each stage may use, so a
+# hung rewrite or search still leaves time for the stages after it
+STAGE_SHARES = {
+    "query_processing": 0.3,
+    "web_search": 0.6,
+    "page_fetching": 0.5,
+    "answer_generation": 1.0,
+}
+
+# Search results returned in place of an answer cut by the deadline
+PARTIAL_RESULTS = 3
 
 
 class WebSearchWorkflow:
     """
     LangGraph-based workflow that orchestrates the web search and answer process
     """
-    
-    def __init__(self):
-        # Initialize all agents and tools
-        self.query_agent = QueryAgent()
-        self.search_tool = SearchTool()
-        self.answer_agent = AnswerAgent()
-        
+
+    def __init__(
+        self,
+        registry: Optional[ComponentRegistry] = None,
+        speculative: Optional[bool] = None,
+        speculative_similarity: Optional[float] = None,
+        speculative_deadline_ms: Optional[float] = None,
+        compactor: Optional[ContextCompactor] = None,
+        answer_cache: Optional[AnswerCache] = None,
+        fanout: Optional[int] = None,
+        fanout_results: Optional[int] = None,
+        page_fetcher: Optional[PageFetcher] = None,
+        passage_index: Optional[PassageIndex] = None,
+        deadline_ms: Optional[float] = None,
+    ):
+        """
+        Args:
+            registry: Component registry (defaults to the shared one)
+            speculative: Search on the raw question while the rewrite runs
+                (defaults to SPECULATIVE_SEARCH)
+            speculative_similarity: Minimum rewrite/question similarity for
+                reusing the speculative results (SPECULATIVE_SIMILARITY)
+            speculative_deadline_ms: Rewrite wait after which the speculative
+                results are used regardless (SPECULATIVE_DEADLINE_MS)
+            compactor: Search result compactor (defaults to CONTEXT_* settings;
+                None when CONTEXT_COMPACTION_ENABLED is off)
+            answer_cache: Cache of answers per question and evidence
+                (defaults to ANSWER_CACHE_* settings)
+            fanout: Search queries generated per question; above 1 they are
+                searched in parallel and rank-fused (defaults to QUERY_FANOUT)
+            fanout_results: Results kept after fusion (QUERY_FANOUT_RESULTS)
+            page_fetcher: Fetches the top result pages for extra passages
+                (defaults to PAGE_FETCH_* settings; None when
+                PAGE_FETCH_ENABLED is off)
+            passage_index: Local index of retrieved evidence consulted before
+                web_search (defaults to PASSAGE_INDEX_* settings; None when
+                PASSAGE_INDEX_ENABLED is off)
+            deadline_ms: Default per-request deadline; stages still running
+                when it passes are cut and the best partial result is
+                returned (defaults to WORKFLOW_DEADLINE_MS; 0 for none)
+        """
+        # Resolve shared agents and tools from the component registry
+        self.registry = registry if registry is not None else get_registry()
+        self.query_agent = self.registry.query_agent
+        self.search_tool = self.registry.search_tool
+        self.answer_agent = self.registry.answer_agent
+
+        # Model tier per question and stage, shared with both agents (MODEL_ROUTER_* settings)
+        self.router = self.registry.get("model_router")
+
+        # Share one SerpAPI call between concurrent identical search queries
+        self.search_flight = SingleFlight("web_search")
+
+        # Opt-in speculative search on the raw question
+        if speculative is None:
+            speculative = os.getenv("SPECULATIVE_SEARCH", "false").lower() in (
+                "1",
+                "true",
+                "yes",
+                "on",
+            )
+        self.speculative = speculative
+        self.speculative_similarity = float(
+            speculative_similarity
+            if speculative_similarity is not None
+            else os.getenv("SPECULATIVE_SIMILARITY", 0.5)
+        )
+        self.speculative_deadline = (
+            float(
+                speculative_deadline_ms
+                if speculative_deadline_ms is not None
+                else os.getenv("SPECULATIVE_DEADLINE_MS", 1500)
+            )
+            / 1000
+        )
+        self.speculation_counts: Counter = Counter()
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._background: set = set()
+
+        # Dedupe and budget search results before they reach the answer prompt
+        self.compactor = (
+            compactor if compactor is not None else ContextCompactor.from_env()
+        )
+
+        # Opt-in multi-query search: N diverse queries, parallel searches, rank fusion
+        self.fanout = int(
+            fanout if fanout is not None else os.getenv("QUERY_FANOUT", 1)
+        )
+        self.fanout_results = int(
+            fanout_results
+            if fanout_results is not None
+            else os.getenv("QUERY_FANOUT_RESULTS", 8)
+        )
+
+        # Opt-in deep stage: read the top result pages, not just their snippets
+        self.page_fetcher = (
+            page_fetcher if page_fetcher is not None else PageFetcher.from_env()
+        )
+
+        # Opt-in local retrieval: answer repeat topics from evidence seen before
+        self.passage_index = (
+            passage_index if passage_index is not None else PassageIndex.from_env()
+        )
+
+        # Skip answer generation when the same question meets the same evidence
+        self.answer_cache = (
+            answer_cache if answer_cache is not None else AnswerCache.from_env()
+        )
+
+        # Bound worst-case latency: cut stages still running at the request deadline
+        self.deadline_ms = float(
+            deadline_ms
+            if deadline_ms is not None
+            else os.getenv("WORKFLOW_DEADLINE_MS", 0)
+        )
+        self.deadline_counts: Counter = Counter()
+        self._deadline_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+        # Recent time-to-first-token samples (ms) for streamed answers
+        self.ttft_samples: deque = deque(maxlen=1000)
+
         # Build the workflow graph
         self.workflow = self._build_workflow()
-    
+
+        # Export component counters (caches, rewrite paths, ...) on /metrics
+        metrics.track_component_stats(self)
+
+    @property
+    def tracer(self) -> tracing.Tracer:
+        """Process-wide tracer (looked up per call so set_tracer takes effect)"""
+        return tracing.get_tracer()
+
     def _build_workflow(self) -> StateGraph:
         """
         Build the LangGraph workflow with proper transitions
-        
+
         Returns:
             Compiled StateGraph workflow
         """
         # Create the state graph
         workflow = StateGraph(WorkflowState)
-        
-        # Add nodes for each step
-        workflow.add_node("query_processing", self._process_query)
-        workflow.add_node("web_search", self._perform_search)
-        workflow.add_node("answer_generation", self._generate_answer)
-        
+
+        # Add nodes for each step; each node has a sync body for invoke()
+        # and an async body for ainvoke(), timed into the stage histogram.
+        # Nodes that call upstreams also get the partial result used when
+        # the request deadline cuts them
+        workflow.add_node(
+            "query_processing",
+            self._timed_node(
+                "query_processing",
+                self._process_query,
+                self._aprocess_query,
+                self._cut_query,
+            ),
+        )
+        workflow.add_node(
+            "web_search",
+            self._timed_node(
+                "web_search",
+                self._perform_search,
+                self._aperform_search,
+                self._cut_search,
+            ),
+        )
+        if self.page_fetcher is not None:
+            workflow.add_node(
+                "page_fetching",
+                self._timed_node(
+                    "page_fetching",
+                    self._fetch_pages,
+                    self._afetch_pages,
+                    self._cut_pages,
+                ),
+            )
+        workflow.add_node(
+            "context_compaction",
+            self._timed_node("context_compaction", self._compact_context),
+        )
+        workflow.add_node(
+            "answer_generation",
+            self._timed_node(
+                "answer_generation",
+                self._generate_answer,
+                self._agenerate_answer,
+                self._cut_answer,
+            ),
+        )
+
         # Define the flow transitions
         workflow.set_entry_point("query_processing")
         workflow.add_edge("query_processing", "web_search")
-        workflow.add_edge("web_search", "answer_generation")
+        if self.page_fetcher is not None:
+            workflow.add_edge("web_search", "page_fetching")
+            workflow.add_edge("page_fetching", "context_compaction")
+        else:
+            workflow.add_edge("web_search", "context_compaction")
+        workflow.add_edge("context_compaction", "answer_generation")
         workflow.add_edge("answer_generation", END)
-        
+
         # Compile the workflow
         return workflow.compile()
-    
+
+    def _timed_node(
+        self, stage: str, func: Any, afunc: Any = None, on_cut: Any = None
+    ) -> RunnableLambda:
+        """
+        Wrap node bodies so each execution is observed in the stage histogram
+        and recorded as a span of the current trace
+
+        With on_cut, a request deadline bounds the node: a node starting
+        after the deadline is skipped, and one still running at the deadline
+        is cancelled (async) or abandoned to its worker thread (sync) once its
+        share of the remaining time (STAGE_SHARES) is used. Either way on_cut
+        builds the state from what the earlier stages produced.
+
+        Args:
+            stage: Node name used as the metric label
+            func: Sync node body
+            afunc: Optional async node body
+            on_cut: Optional partial-result handler for deadline cuts
+
+        Returns:
+            RunnableLambda for the graph node
+        """
+        share = STAGE_SHARES.get(stage, 1.0)
+
+        # functools.wraps keeps the signature, so bodies taking config still receive it
+        @functools.wraps(func)
+        def timed(state: WorkflowState, **kwargs: Any) -> WorkflowState:
+            # The agents pick their model tier from the active route
+            with metrics.observe_stage(stage), tracing.span(
+                stage
+            ), model_router.activate(state.get("route")):
+                start = time.perf_counter()
+                deadline = state.get("deadline")
+                if on_cut is None or deadline is None:
+                    result = func(state, **kwargs)
+                else:
+                    try:
+                        # A copy, so a body abandoned at the deadline cannot change the returned state
+                        result = call_within(
+                            deadline,
+                            stage,
+                            self._get_deadline_executor(),
+                            func,
+                            dict(state),
+                            share=share,
+                            **kwargs,
+                        )
+                    except DeadlineExpired:
+                        return self._on_cut(state, stage, on_cut, **kwargs)
+                # Cut stages would drag the router's latency estimates down
+                self.router.observe(stage, (time.perf_counter() - start) * 1000)
+                return result
+
+        if afunc is None:
+            return RunnableLambda(timed)
+
+        @functools.wraps(afunc)
+        async def atimed(state: WorkflowState, **kwargs: Any) -> WorkflowState:
+            with metrics.observe_stage(stage), tracing.span(
+                stage
+            ), model_router.activate(state.get("route")):
+                start = time.perf_counter()
+                deadline = state.get("deadline")
+                if on_cut is None or deadline is None:
+                    result = await afunc(state, **kwargs)
+                else:
+                    try:
+                        result = await acall_within(
+                            deadline, stage, afunc(dict(state), **kwargs), share
+                        )
+                    except DeadlineExpired:
+                        return self._on_cut(state, stage, on_cut, **kwargs)
+                self.router.observe(stage, (time.perf_counter() - start) * 1000)
+                return result
+
+        return RunnableLambda(timed, afunc=atimed)
+
     def _process_query(self, state: WorkflowState) -> WorkflowState:
         """
         Node function: Process user question into search query
-        
+
         Args:
             state: Current workflow state
-            
+
         Returns:
             Updated state with search query
         """
         try:
+            if self.fanout > 1 and not self._light(state):
+                result = self.query_agent.expand(
+                    state["original_question"], self.fanout
+                )
+                return self._on_queries(state, result["queries"])
+
+            if self.speculative:
+                return self._speculative_query(state)
+
             # Use query agent to generate search query
             result = self.query_agent(state["original_question"])
-            search_query = result["content"]
-            
-            # Update state
-            state["search_query"] = search_query
-            state["current_step"] = "query_processed"
-            
-            print(f"🔍 Generated search query: {search_query}")
-            
+            return self._on_query(state, result["content"])
+
+        except Exception as e:
+            return self._on_query_error(state, e)
+
+    async def _aprocess_query(self, state: WorkflowState) -> WorkflowState:
+        """
+        Async node function: Process user question into search query
+
+        Args:
+            state: Current workflow state
+
+        Returns:
+            Updated state with search query
+        """
+        try:
+            if self.fanout > 1 and not self._light(state):
+                result = await self.query_agent.aexpand(
+                    state["original_question"], self.fanout
+                )
+                return self._on_queries(state, result["queries"])
+
+            if self.speculative:
+                return await self._aspeculative_query(state)
+
+            result = await self.query_agent.acall(state["original_question"])
+            return self._on_query(state, result["content"])
+
+        except Exception as e:
+            return self._on_query_error(state, e)
+
+    def _speculative_query(self, state: WorkflowState) -> WorkflowState:
+        """
+        Rewrite the question while a search on the raw question runs in parallel
+
+        Args:
+            state: Current workflow state
+
+        Returns:
+            Updated state; search_results is already filled when the
+            speculative results were used
+        """
+        question = state["original_question"]
+
+        # Cached and rule-based rewrites are instant; speculating would only cost quota
+        local_query = self.query_agent.local_rewrite(question)
+        if local_query is not None:
+            return self._on_query(state, local_query)
+
+        executor = self._get_executor()
+        # Copy the context so the workers' spans land in this request's trace
+        speculative = executor.submit(
+            contextvars.copy_context().run, self._coalesced_search, question
+        )
+        rewrite = executor.submit(
+            contextvars.copy_context().run, self.query_agent.llm_rewrite, question
+        )
+
+        try:
+            search_query = rewrite.result(timeout=self.speculative_deadline)["content"]
+        except concurrent.futures.TimeoutError:
+            # The rewrite keeps running in the background and fills the rewrite cache
+            return self._use_speculation(
+                state, "deadline", question, speculative.result
+            )
+
+        return self._resolve_speculation(state, search_query, speculative.result)
+
+    async def _aspeculative_query(self, state: WorkflowState) -> WorkflowState:
+        """
+        Async variant of _speculative_query
+
+        Args:
+            state: Current workflow state
+
+        Returns:
+            Updated state
+        """
+        question = state["original_question"]
+
+        local_query = self.query_agent.local_rewrite(question)
+        if local_query is not None:
+            return self._on_query(state, local_query)
+
+        speculative = self._spawn(self._acoalesced_search(question))
+        rewrite = self._spawn(self.query_agent.allm_rewrite(question))
+
+        done, _ = await asyncio.wait({rewrite}, timeout=self.speculative_deadline)
+        if not done:
+            return self._use_speculation(state, "deadline", question, await speculative)
+
+        return self._resolve_speculation(
+            state, rewrite.result()["content"], await speculative
+        )
+
+    def _resolve_speculation(
+        self, state: WorkflowState, search_query: str, speculative: Any
+    ) -> WorkflowState:
+        """
+        Decide between the speculative results and a refined search
+
+        Args:
+            state: Current workflow state
+            search_query: Rewrite returned by the query agent
+            speculative: Speculative search result, or a callable returning it
+
+        Returns:
+            Updated state
+        """
+        question = state["original_question"]
+
+        if search_query.startswith("Error generating search query"):
+            return self._use_speculation(state, "fallback", question, speculative)
+
+        if self._rewrite_matches(question, search_query):
+            return self._use_speculation(state, "hit", search_query, speculative)
+
+        # Rewrite differs enough to be worth its own search
+        self.speculation_counts["miss"] += 1
+        state["speculation"] = "miss"
+        return self._on_query(state, search_query)
+
+    def _use_speculation(
+        self, state: WorkflowState, outcome: str, search_query: str, speculative: Any
+    ) -> WorkflowState:
+        """Record the speculative search results so web_search can be skipped"""
+        self.speculation_counts[outcome] += 1
+        state = self._on_query(state, search_query)
+        state["speculation"] = outcome
+
+        try:
+            result = speculative() if callable(speculative) else speculative
+            state = self._on_search(state, result)
         except Exception as e:
-            state["search_query"] = state["original_question"]  # Fallback
-            state["current_step"] = f"query_error: {str(e)}"
-            print(f"❌ Query processing error: {e}")
-        
+            state = self._on_search_error(state, e)
+
+        print(f"⚡ Using speculative search results ({outcome})")
+        return state
+
+    def _rewrite_matches(self, question: str, search_query: str) -> bool:
+        """Whether a rewrite is close enough to the raw question to reuse its results"""
+
+        def content_tokens(text: str) -> frozenset:
+            return frozenset(
+                token
+                for token in canonicalize_question(text).split()
+                if token not in STOPWORDS and len(token) > 1
+            )
+
+        similarity = token_set_similarity(
+            content_tokens(question), content_tokens(search_query)
+        )
+        return similarity >= self.speculative_similarity
+
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """Lazily create the thread pool used by sync speculation"""
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=int(os.getenv("SPECULATIVE_WORKERS", 16)),
+                thread_name_prefix="speculative",
+            )
+        return self._executor
+
+    def _get_deadline_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """Lazily create the thread pool that runs sync nodes under a deadline"""
+        if self._deadline_executor is None:
+            self._deadline_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=int(os.getenv("DEADLINE_WORKERS", 32)),
+                thread_name_prefix="deadline",
+            )
+        return self._deadline_executor
+
+    def _spawn(self, coro: Any) -> asyncio.Task:
+        """Start a task and keep a reference until it finishes"""
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    def _light(self, state: WorkflowState) -> bool:
+        """Whether the latency budget rules out the optional stages (fan-out, page fetching)"""
+        route = state.get("route")
+        return route is not None and route.light
+
+    def _on_query(self, state: WorkflowState, search_query: str) -> WorkflowState:
+        """Record a generated search query in the state"""
+        state["search_query"] = search_query
+        state["current_step"] = "query_processed"
+
+        print(f"🔍 Generated search query: {search_query}")
+        return state
+
+    def _on_queries(self, state: WorkflowState, queries: List[str]) -> WorkflowState:
+        """Record fan-out queries; the first one is also the search_query"""
+        state["search_queries"] = queries
+        if len(queries) > 1:
+            print(f"🔀 Fanning out to {len(queries)} search queries")
+        return self._on_query(state, queries[0])
+
+    def _on_query_error(self, state: WorkflowState, error: Exception) -> WorkflowState:
+        """Fall back to the raw question when query generation fails"""
+        state["search_query"] = state["original_question"]  # Fallback
+        state["current_step"] = f"query_error: {str(error)}"
+        print(f"❌ Query processing error: {error}")
         return state
-    
+
     def _perform_search(self, state: WorkflowState) -> WorkflowState:
         """
         Node function: Perform web search using the generated query
-        
+
         Args:
             state: Current workflow state
-            
+
         Returns:
             Updated state with search results
         """
+        if state.get("speculation") in SPECULATION_USED or self._lookup_passages(state):
+            return state
+
+        try:
+            if len(state.get("search_queries", [])) > 1:
+                return self._on_fanout(
+                    state, self._coalesced_fanout(state["search_queries"])
+                )
+
+            # Use search tool to get results (coalesced with identical in-flight queries)
+            result = self._coalesced_search(state["search_query"])
+            return self._on_search(state, result)
+
+        except Exception as e:
+            return self._on_search_error(state, e)
+
+    async def _aperform_search(self, state: WorkflowState) -> WorkflowState:
+        """
+        Async node function: Perform web search using the generated query
+
+        Args:
+            state: Current workflow state
+
+        Returns:
+            Updated state with search results
+        """
+        if state.get("speculation") in SPECULATION_USED or self._lookup_passages(state):
+            return state
+
+        try:
+            if len(state.get("search_queries", [])) > 1:
+                return self._on_fanout(
+                    state, await self._acoalesced_fanout(state["search_queries"])
+                )
+
+            result = await self._acoalesced_search(state["search_query"])
+            return self._on_search(state, result)
+
+        except Exception as e:
+            return self._on_search_error(state, e)
+
+    def _lookup_passages(self, state: WorkflowState) -> bool:
+        """
+        Serve the search from the passage index when it holds enough fresh evidence
+
+        Args:
+            state: Current workflow state with the search query
+
+        Returns:
+            True when the state now carries results from the index
+        """
+        if self.passage_index is None:
+            return False
+
+        try:
+            with tracing.span("passage_index.lookup") as current:
+                found = self.passage_index.lookup(state["search_query"])
+                if current is not None:
+                    current.set(hit=found is not None)
+        except Exception as e:
+            print(f"⚠️ Passage index lookup skipped: {e}")
+            return False
+        if found is None:
+            state["passage_index"] = {"hit": False}
+            return False
+
+        results, stats = found
+        state["passage_index"] = stats
+        print(f"📚 Answering from {stats['passages']} indexed passages (no web search)")
+        self._on_search(state, {"content": "", "results": results})
+        return True
+
+    def _index_evidence(self, state: WorkflowState) -> None:
+        """Add freshly retrieved results (with any page passages) to the passage index"""
+        if self.passage_index is None or state.get("passage_index", {}).get("hit"):
+            return
+        try:
+            state.setdefault("passage_index", {})["indexed"] = (
+                self.passage_index.add_results(state["results"])
+            )
+        except Exception as e:
+            # Indexing only speeds up later questions; never fail this one
+            print(f"⚠️ Passage indexing skipped: {e}")
+
+    def _coalesced_search(self, query: str) -> Dict[str, Any]:
+        """Run a search, sharing it with identical in-flight queries"""
+        result, _ = self.search_flight.do(
+            normalize_query(query), lambda: self.search_tool.fetch_results(query)
+        )
+        return result
+
+    async def _acoalesced_search(self, query: str) -> Dict[str, Any]:
+        """Async variant of _coalesced_search"""
+        result, _ = await self.search_flight.ado(
+            normalize_query(query), lambda: self.search_tool.afetch_results(query)
+        )
+        return result
+
+    def _coalesced_fanout(self, queries: List[str]) -> Dict[str, Any]:
+        """Search all fan-out queries in parallel and fuse them, shared with identical in-flight query sets"""
+        key = tuple(normalize_query(query) for query in queries)
+        result, _ = self.search_flight.do(
+            key, lambda: self.search_tool.multi_search(queries, self.fanout_results)
+        )
+        return result
+
+    async def _acoalesced_fanout(self, queries: List[str]) -> Dict[str, Any]:
+        """Async variant of _coalesced_fanout"""
+        key = tuple(normalize_query(query) for query in queries)
+        result, _ = await self.search_flight.ado(
+            key, lambda: self.search_tool.amulti_search(queries, self.fanout_results)
+        )
+        return result
+
+    def _on_fanout(self, state: WorkflowState, result: Dict[str, Any]) -> WorkflowState:
+        """Record fused fan-out results and their counts"""
+        state["fanout_stats"] = result["metadata"]
+        if result["metadata"]["failed"]:
+            print(
+                f"⚠️ {result['metadata']['failed']} of {result['metadata']['queries']} fan-out searches failed"
+            )
+        return self._on_search(state, result)
+
+    def _on_search(self, state: WorkflowState, result: Dict[str, Any]) -> WorkflowState:
+        """Record search result records (or the text standing in for them) in the state"""
+        state["results"] = result["results"]
+        state["search_results"] = result["content"]
+        state["current_step"] = "search_completed"
+
+        if result["results"]:
+            print(f"🌐 Retrieved {len(result['results'])} search results")
+        else:
+            print(f"🌐 No search results: {result['content']}")
+        return state
+
+    def _on_search_error(self, state: WorkflowState, error: Exception) -> WorkflowState:
+        """Record a search failure in the state"""
+        state["results"] = []
+        state["search_results"] = f"Search failed: {str(error)}"
+        state["current_step"] = f"search_error: {str(error)}"
+        print(f"❌ Search error: {error}")
+        return state
+
+    def _fetch_pages(self, state: WorkflowState) -> WorkflowState:
+        """
+        Node function: Fetch the top result pages and add their most relevant passages
+
+        Args:
+            state: Current workflow state with search results
+
+        Returns:
+            Updated state with passages appended to the result snippets
+        """
+        if (
+            self.page_fetcher is None
+            or state.get("passage_index", {}).get("hit")
+            or self._light(state)
+        ):
+            return state
+
         try:
-            # Use search tool to get results
-            result = self.search_tool(state["search_query"])
-            search_results = result["content"]
-            
-            # Update state
-            state["search_results"] = search_results
-            state["current_step"] = "search_completed"
-            
-            print(f"🌐 Retrieved search results ({len(search_results)} characters)")
-            
+            enriched, stats = self.page_fetcher.enrich(
+                state["results"], state["original_question"]
+            )
+            return self._on_pages(state, enriched, stats)
         except Exception as e:
-            state["search_results"] = f"Search failed: {str(e)}"
-            state["current_step"] = f"search_error: {str(e)}"
-            print(f"❌ Search error: {e}")
-        
+            return self._on_pages_error(state, e)
+
+    async def _afetch_pages(self, state: WorkflowState) -> WorkflowState:
+        """Async variant of _fetch_pages"""
+        if (
+            self.page_fetcher is None
+            or state.get("passage_index", {}).get("hit")
+            or self._light(state)
+        ):
+            return state
+
+        try:
+            enriched, stats = await self.page_fetcher.aenrich(
+                state["results"], state["original_question"]
+            )
+            return self._on_pages(state, enriched, stats)
+        except Exception as e:
+            return self._on_pages_error(state, e)
+
+    def _on_pages(
+        self, state: WorkflowState, enriched: List[SearchResult], stats: Dict[str, Any]
+    ) -> WorkflowState:
+        """Record the enriched search results in the state"""
+        state["results"] = enriched
+        state["page_stats"] = stats
+        if stats.get("passages"):
+            print(
+                f"📄 Added {stats['passages']} passages from {stats['fetched']} pages"
+            )
         return state
-    
-    def _generate_answer(self, state: WorkflowState) -> WorkflowState:
+
+    def _on_pages_error(self, state: WorkflowState, error: Exception) -> WorkflowState:
+        """Keep the snippet-only results when page fetching fails"""
+        # Page text is an enrichment; the snippets still answer the question
+        print(f"⚠️ Page fetching skipped: {error}")
+        return state
+
+    def _compact_context(self, state: WorkflowState) -> WorkflowState:
+        """
+        Node function: Remove duplicate and boilerplate snippets and trim to the token budget
+
+        Args:
+            state: Current workflow state with search results
+
+        Returns:
+            Updated state with compacted search results
+        """
+        # Index the full results; compaction only trims what this answer sees
+        self._index_evidence(state)
+        if self.compactor is None or not state["results"]:
+            # Errors and "no results" text pass through untouched
+            return state
+
+        try:
+            compacted, stats = self.compactor.compact_results(
+                state["results"], state["original_question"]
+            )
+            state["results"] = compacted
+            state["context_stats"] = stats
+            if stats["tokens_saved"]:
+                print(
+                    f"🗜️ Compacted search results (saved ~{stats['tokens_saved']} tokens)"
+                )
+        except Exception as e:
+            # Compaction is an optimization; answer from the full results instead
+            print(f"⚠️ Context compaction skipped: {e}")
+
+        return state
+
+    def _generate_answer(
+        self, state: WorkflowState, config: Optional[RunnableConfig] = None
+    ) -> WorkflowState:
         """
         Node function: Generate final answer from search results
-        
+
+        When the run was started by stream(), answer tokens are emitted to
+        the graph's custom stream as they arrive.
+
         Args:
             state: Current workflow state
-            
+            config: Runnable config (carries the stream_answer flag)
+
         Returns:
             Updated state with final answer
         """
         try:
+            cached = self._lookup_answer(state)
+            if cached is not None:
+                if self._streaming(config):
+                    get_stream_writer()({"type": "token", "content": cached})
+                return self._on_answer(state, cached)
+
+            if self._streaming(config):
+                write = get_stream_writer()
+                # Shared with the state copy so a deadline cut keeps what was streamed
+                chunks = state["partial_answer"]
+                info: Dict[str, Any] = {}
+                for chunk in self.answer_agent.stream(
+                    self._evidence(state),
+                    state["original_question"],
+                    state.get("answer_mode") or None,
+                    info,
+                ):
+                    if (
+                        state.get("deadline") is not None
+                        and state["deadline"].expired()
+                    ):
+                        # Stop reading (closing the Gemini stream) and never cache a truncated answer
+                        raise DeadlineExpired("answer_generation")
+                    chunks.append(chunk)
+                    write({"type": "token", "content": chunk})
+                state["answered_by"] = info
+                if info.get("error"):
+                    # Gemini failed mid-stream; the streamed text is not an answer
+                    return self._on_answer_error(state, RuntimeError(info["error"]))
+                return self._on_answer(state, "".join(chunks))
+
             # Use answer agent to synthesize results
             result = self.answer_agent(
-                state["search_results"], 
-                state["original_question"]
-            )
-            final_answer = result["content"]
-            
-            # Update state
-            state["final_answer"] = final_answer
-            state["current_step"] = "answer_generated"
-            
-            print(f"✅ Generated final answer ({len(final_answer)} characters)")
-            
+                self._evidence(state),
+                state["original_question"],
+                state.get("answer_mode") or None,
+            )
+            state["answered_by"] = result.get("metadata", {})
+            return self._on_answer(state, result["content"])
+
+        except DeadlineExpired:
+            raise
+        except Exception as e:
+            return self._on_answer_error(state, e)
+
+    async def _agenerate_answer(
+        self, state: WorkflowState, config: Optional[RunnableConfig] = None
+    ) -> WorkflowState:
+        """
+        Async node function: Generate final answer from search results
+
+        Args:
+            state: Current workflow state
+            config: Runnable config (carries the stream_answer flag)
+
+        Returns:
+            Updated state with final answer
+        """
+        try:
+            cached = self._lookup_answer(state)
+            if cached is not None:
+                if self._streaming(config):
+                    get_stream_writer()({"type": "token", "content": cached})
+                return self._on_answer(state, cached)
+
+            if self._streaming(config):
+                write = get_stream_writer()
+                # Shared with the state copy so a deadline cut keeps what was streamed
+                chunks = state["partial_answer"]
+                info: Dict[str, Any] = {}
+                async for chunk in self.answer_agent.astream(
+                    self._evidence(state),
+                    state["original_question"],
+                    state.get("answer_mode") or None,
+                    info,
+                ):
+                    if (
+                        state.get("deadline") is not None
+                        and state["deadline"].expired()
+                    ):
+                        # Stop reading (closing the Gemini stream) and never cache a truncated answer
+                        raise DeadlineExpired("answer_generation")
+                    chunks.append(chunk)
+                    write({"type": "token", "content": chunk})
+                state["answered_by"] = info
+                if info.get("error"):
+                    # Gemini failed mid-stream; the streamed text is not an answer
+                    return self._on_answer_error(state, RuntimeError(info["error"]))
+                return self._on_answer(state, "".join(chunks))
+
+            result = await self.answer_agent.acall(
+                self._evidence(state),
+                state["original_question"],
+                state.get("answer_mode") or None,
+            )
+            state["answered_by"] = result.get("metadata", {})
+            return self._on_answer(state, result["content"])
+
+        except DeadlineExpired:
+            raise
         except Exception as e:
-            state["final_answer"] = f"Answer generation failed: {str(e)}"
-            state["current_step"] = f"answer_error: {str(e)}"
-            print(f"❌ Answer generation error: {e}")
-        
+            return self._on_answer_error(state, e)
+
+    def _answer_group(self, state: WorkflowState) -> tuple:
+        """Key of the answers that can share one LLM batch: tier, output length and mode"""
+        route = state.get("route")
+        stage = route.stage("answer") if route is not None else None
+        tier = (stage.tier, stage.max_output_tokens) if stage is not None else None
+        return tier, state.get("answer_mode") or None
+
+    def _evidence(self, state: WorkflowState) -> Evidence:
+        """What the answer is generated from: the result records, or the text standing in for them"""
+        return state["results"] or state["search_results"]
+
+    def _streaming(self, config: Optional[RunnableConfig]) -> bool:
+        """Whether the current run asked for streamed answer tokens"""
+        return bool(config and config.get("configurable", {}).get("stream_answer"))
+
+    def _lookup_answer(self, state: WorkflowState) -> Optional[str]:
+        """
+        Find an answer generated earlier from the same question and evidence
+
+        Args:
+            state: Current workflow state with search results
+
+        Returns:
+            Cached answer, or None when it has to be generated
+        """
+        if self.answer_cache is None or not self.answer_cache.cacheable(
+            self._evidence(state)
+        ):
+            return None
+        # Extractive answers are cheaper to recompute than to cache
+        if state.get("answer_mode") == "extractive":
+            return None
+
+        cached = self.answer_cache.get(
+            state["original_question"], self._evidence(state)
+        )
+        if cached is None:
+            state["answer_cache"] = {"hit": False}
+            return None
+
+        answer, age = cached
+        state["answer_cache"] = {"hit": True, "age_seconds": round(age, 3)}
+        print(f"♻️ Reusing cached answer ({age:.0f}s old)")
+        return answer
+
+    def _on_answer(self, state: WorkflowState, final_answer: str) -> WorkflowState:
+        """Record the final answer in the state, caching freshly generated LLM answers"""
+        state["final_answer"] = final_answer
+        state["current_step"] = "answer_generated"
+
+        # A degraded extractive answer must not shadow the LLM answer once Gemini recovers
+        llm_answer = state.get("answered_by", {}).get("answer_mode", "llm") == "llm"
+        if state.get("answer_cache") == {"hit": False} and llm_answer:
+            self.answer_cache.set(
+                state["original_question"], self._evidence(state), final_answer
+            )
+
+        print(f"✅ Generated final answer ({len(final_answer)} characters)")
+        return state
+
+    def _on_answer_error(self, state: WorkflowState, error: Exception) -> WorkflowState:
+        """Record an answer generation failure in the state"""
+        state["final_answer"] = f"Answer generation failed: {str(error)}"
+        state["current_step"] = f"answer_error: {str(error)}"
+        print(f"❌ Answer generation error: {error}")
+        return state
+
+    def _on_cut(
+        self, state: WorkflowState, stage: str, on_cut: Any, **kwargs: Any
+    ) -> WorkflowState:
+        """Record a stage cut by the request deadline and fill in its partial result"""
+        deadline = state["deadline"]
+        if not deadline.cut_stages:
+            self.deadline_counts["cut_requests"] += 1
+        deadline.cut(stage)
+        self.deadline_counts[stage] += 1
+        print(f"⏱️ {stage} cut by the {deadline.deadline_ms:.0f} ms deadline")
+        return on_cut(state, **kwargs)
+
+    def _cut_query(self, state: WorkflowState) -> WorkflowState:
+        """Search on the raw question when the rewrite misses the deadline"""
+        state["search_queries"] = []
+        return self._on_query(state, state["original_question"])
+
+    def _cut_search(self, state: WorkflowState) -> WorkflowState:
+        """Record that no evidence arrived before the deadline"""
+        state["results"] = []
+        state["search_results"] = "Search cut by the request deadline"
+        state["current_step"] = "search_cut"
+        return state
+
+    def _cut_pages(self, state: WorkflowState) -> WorkflowState:
+        """Keep the snippet-only results when page fetching misses the deadline"""
         return state
-    
-    def run(self, user_question: str) -> Dict[str, Any]:
+
+    def _cut_answer(
+        self, state: WorkflowState, config: Optional[RunnableConfig] = None
+    ) -> WorkflowState:
+        """
+        Return the best partial answer when answer generation misses the deadline
+
+        Args:
+            state: Workflow state before answer generation
+            config: Runnable config (carries the stream_answer flag)
+
+        Returns:
+            State whose final answer is the text streamed so far, else the
+            top raw search snippets
+        """
+        streamed = "".join(state["partial_answer"])
+        if streamed:
+            final_answer = streamed
+        else:
+            if state["results"]:
+                final_answer = (
+                    "Answer generation timed out; top search results:\n\n"
+                    + render_results(state["results"], limit=PARTIAL_RESULTS)
+                )
+            else:
+                final_answer = f"Answer generation timed out ({state['search_results'] or 'no search results'})"
+            if self._streaming(config):
+                get_stream_writer()({"type": "token", "content": final_answer})
+
+        state["final_answer"] = final_answer
+        state["answered_by"] = {"answer_mode": "partial"}
+        state["current_step"] = "answer_cut"
+        return state
+
+    def run(
+        self,
+        user_question: str,
+        answer_mode: Optional[str] = None,
+        budget_ms: Optional[float] = None,
+        deadline_ms: Optional[float] = None,
+    ) -> Dict[str, Any]:
         """
         Execute the complete workflow for a user question
-        
+
+        Args:
+            user_question: The user's natural language question
+            answer_mode: "llm" or "extractive" (defaults to ANSWER_MODE)
+            budget_ms: End-to-end latency budget; the model router picks
+                faster tiers or lighter modes to meet it
+            deadline_ms: Hard limit; stages still running when it passes
+                are cut and metadata["deadline"] lists them (defaults to
+                WORKFLOW_DEADLINE_MS)
+
+        Returns:
+            Dict containing the final answer and workflow metadata
+        """
+        initial_state = self._initial_state(
+            user_question, answer_mode, budget_ms, deadline_ms
+        )
+
+        print(f"🚀 Starting workflow for question: {user_question}")
+
+        with metrics.track_workflow("run"), self.tracer.trace(
+            "run", question=user_question
+        ) as trace:
+            try:
+                # Run the workflow
+                final_state = self.workflow.invoke(initial_state)
+                result = self._build_result(final_state)
+
+            except Exception as e:
+                result = self._build_error(e)
+
+        return self._with_timings(result, trace)
+
+    async def arun(
+        self,
+        user_question: str,
+        answer_mode: Optional[str] = None,
+        budget_ms: Optional[float] = None,
+        deadline_ms: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Execute the complete workflow asynchronously
+
+        Every node awaits its network I/O, so one event loop can serve many
+        concurrent questions.
+
         Args:
             user_question: The user's natural language question
-            
+            answer_mode: "llm" or "extractive" (defaults to ANSWER_MODE)
+            budget_ms: End-to-end latency budget; the model router picks
+                faster tiers or lighter modes to meet it
+            deadline_ms: Hard limit; stages still running when it passes
+                are cut and metadata["deadline"] lists them (defaults to
+                WORKFLOW_DEADLINE_MS)
+
         Returns:
             Dict containing the final answer and workflow metadata
         """
-        # Initialize state
-        initial_state = WorkflowState(
+        initial_state = self._initial_state(
+            user_question, answer_mode, budget_ms, deadline_ms
+        )
+
+        print(f"🚀 Starting async workflow for question: {user_question}")
+
+        with metrics.track_workflow("arun"), self.tracer.trace(
+            "arun", question=user_question
+        ) as trace:
+            try:
+                final_state = await self.workflow.ainvoke(initial_state)
+                result = self._build_result(final_state)
+
+            except Exception as e:
+                result = self._build_error(e)
+
+        return self._with_timings(result, trace)
+
+    def stream(
+        self,
+        user_question: str,
+        answer_mode: Optional[str] = None,
+        budget_ms: Optional[float] = None,
+        deadline_ms: Optional[float] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Execute the workflow, streaming answer tokens as they are generated
+
+        Args:
+            user_question: The user's natural language question
+            answer_mode: "llm" or "extractive" (defaults to ANSWER_MODE)
+            budget_ms: End-to-end latency budget (see run)
+            deadline_ms: Hard limit (see run)
+
+        Yields:
+            {"type": "token", "content": chunk} events, then one
+            {"type": "result", ...} event shaped like run()'s return value
+            with metadata["time_to_first_token_ms"]
+        """
+        initial_state = self._initial_state(
+            user_question, answer_mode, budget_ms, deadline_ms
+        )
+        final_state = initial_state
+        start = time.perf_counter()
+        first_token_at = None
+
+        print(f"🚀 Starting streaming workflow for question: {user_question}")
+
+        # Only active while the graph produces events, not while the caller holds a token
+        trace = self.tracer.start("stream", question=user_question)
+        with metrics.track_workflow("stream"):
+            try:
+                for mode, payload in tracing.iterate(
+                    trace,
+                    self.workflow.stream(
+                        initial_state,
+                        config={"configurable": {"stream_answer": True}},
+                        stream_mode=["custom", "values"],
+                    ),
+                ):
+                    if mode == "custom":
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        yield payload
+                    else:
+                        final_state = payload
+                result = self._build_result(final_state)
+
+            except Exception as e:
+                result = self._build_error(e)
+
+        self.tracer.finish(trace)
+        yield self._stream_result(
+            self._with_timings(result, trace), start, first_token_at
+        )
+
+    async def astream(
+        self,
+        user_question: str,
+        answer_mode: Optional[str] = None,
+        budget_ms: Optional[float] = None,
+        deadline_ms: Optional[float] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Async variant of stream
+
+        Args:
+            user_question: The user's natural language question
+            answer_mode: "llm" or "extractive" (defaults to ANSWER_MODE)
+            budget_ms: End-to-end latency budget (see run)
+            deadline_ms: Hard limit (see run)
+
+        Yields:
+            Token events followed by one result event
+        """
+        initial_state = self._initial_state(
+            user_question, answer_mode, budget_ms, deadline_ms
+        )
+        final_state = initial_state
+        start = time.perf_counter()
+        first_token_at = None
+
+        print(f"🚀 Starting async streaming workflow for question: {user_question}")
+
+        trace = self.tracer.start("astream", question=user_question)
+        with metrics.track_workflow("astream"):
+            try:
+                async for mode, payload in tracing.aiterate(
+                    trace,
+                    self.workflow.astream(
+                        initial_state,
+                        config={"configurable": {"stream_answer": True}},
+                        stream_mode=["custom", "values"],
+                    ),
+                ):
+                    if mode == "custom":
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        yield payload
+                    else:
+                        final_state = payload
+                result = self._build_result(final_state)
+
+            except Exception as e:
+                result = self._build_error(e)
+
+        self.tracer.finish(trace)
+        yield self._stream_result(
+            self._with_timings(result, trace), start, first_token_at
+        )
+
+    def _with_timings(
+        self, result: Dict[str, Any], trace: Optional[tracing.Trace]
+    ) -> Dict[str, Any]:
+        """Attach a finished trace's timing breakdown to the result metadata"""
+        if trace is not None:
+            result["metadata"]["timings"] = trace.timings()
+        return result
+
+    def _stream_result(
+        self, result: Dict[str, Any], start: float, first_token_at: Optional[float]
+    ) -> Dict[str, Any]:
+        """Build the final stream event and record time to first token"""
+        ttft_ms = None
+        if first_token_at is not None:
+            ttft_ms = (first_token_at - start) * 1000
+            self.ttft_samples.append(ttft_ms)
+
+        result["metadata"]["time_to_first_token_ms"] = ttft_ms
+        return {"type": "result", **result}
+
+    def streaming_stats(self) -> Dict[str, Any]:
+        """
+        Get time-to-first-token statistics for recent streamed answers
+
+        Returns:
+            Dict with sample count and p50/p95 TTFT in milliseconds
+        """
+        samples = sorted(self.ttft_samples)
+        if not samples:
+            return {"count": 0, "p50_ms": None, "p95_ms": None}
+        return {
+            "count": len(samples),
+            "p50_ms": statistics.median(samples),
+            "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        }
+
+    async def arun_batch(
+        self, questions: List[str], max_concurrency: int = 8, batch_size: int = 0
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Answer many questions, pipelining the three stages across questions
+
+        Rewrites go to the LLM in chunks via abatch, searches fan out
+        concurrently, and ready answers are micro-batched. Results are yielded
+        in completion order; each carries metadata["batch_index"] and a
+        per-item error never fails the batch.
+
+        Args:
+            questions: User questions
+            max_concurrency: Maximum in-flight requests per stage
+            batch_size: LLM micro-batch size (defaults to max_concurrency)
+
+        Yields:
+            Result dicts in the same shape as run()
+        """
+        batch_size = batch_size or max_concurrency
+        search_slots = asyncio.Semaphore(max_concurrency)
+        answer_slots = asyncio.Semaphore(max_concurrency)
+        ready: asyncio.Queue = asyncio.Queue()
+        finished: asyncio.Queue = asyncio.Queue()
+        tasks = set()
+        tracer = self.tracer
+        # One trace per question; shared LLM batches are recorded in each
+        traces: Dict[int, Optional[tracing.Trace]] = {}
+        # When each question started waiting for a stage slot
+        enqueued: Dict[int, float] = {}
+
+        def spawn(coro) -> None:
+            task = asyncio.ensure_future(coro)
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        async def search(index: int, state: WorkflowState) -> None:
+            queued_at = time.perf_counter()
+            with tracer.activate(traces[index]):
+                async with search_slots:
+                    queue_wait_ms = (time.perf_counter() - queued_at) * 1000
+                    with metrics.observe_stage("web_search"), tracing.span(
+                        "web_search", queue_wait_ms=queue_wait_ms
+                    ):
+                        try:
+                            state = await self._aperform_search(state)
+                        except Exception as e:
+                            state = self._on_search_error(state, e)
+                if self.page_fetcher is not None:
+                    with metrics.observe_stage("page_fetching"), tracing.span(
+                        "page_fetching"
+                    ):
+                        state = await self._afetch_pages(state)
+                with metrics.observe_stage("context_compaction"), tracing.span(
+                    "context_compaction"
+                ):
+                    state = self._compact_context(state)
+            enqueued[index] = time.perf_counter()
+            await ready.put((index, state))
+
+        def record(index: int, name: str, started: float, **attributes: Any) -> None:
+            if traces[index] is not None:
+                traces[index].record(name, started, **attributes)
+
+        async def answer(chunk: List) -> None:
+            started = time.perf_counter()
+            misses = []
+            for index, state in chunk:
+                cached = self._lookup_answer(state)
+                if cached is None:
+                    misses.append((index, state))
+                    continue
+                record(
+                    index,
+                    "answer_generation",
+                    started,
+                    queue_wait_ms=(started - enqueued[index]) * 1000,
+                )
+                await finished.put((index, self._on_answer(state, cached)))
+                answer_slots.release()
+            if not misses:
+                return
+
+            # One LLM batch per model tier, output length and answer mode
+            groups: Dict[Any, List] = {}
+            for index, state in misses:
+                groups.setdefault(self._answer_group(state), []).append((index, state))
+            await asyncio.gather(
+                *(answer_group(started, group) for group in groups.values())
+            )
+
+        async def answer_group(started: float, group: List) -> None:
+            state = group[0][1]
+            try:
+                with model_router.activate(state.get("route")):
+                    results = await self.answer_agent.abatch(
+                        [
+                            (self._evidence(state), state["original_question"])
+                            for _, state in group
+                        ],
+                        max_concurrency,
+                        state.get("answer_mode") or None,
+                    )
+                for (index, state), result in zip(group, results):
+                    state["answered_by"] = result.get("metadata", {})
+                    await finished.put(
+                        (index, self._on_answer(state, result["content"]))
+                    )
+            except Exception as e:
+                for index, state in group:
+                    await finished.put((index, self._on_answer_error(state, e)))
+            finally:
+                for index, _ in group:
+                    record(index, "gemini.answer", started, batch_size=len(group))
+                    record(
+                        index,
+                        "answer_generation",
+                        started,
+                        queue_wait_ms=(started - enqueued[index]) * 1000,
+                    )
+                    answer_slots.release()
+
+        async def rewrite_stage() -> None:
+            for start in range(0, len(questions), batch_size):
+                chunk = questions[start : start + batch_size]
+                for offset, question in enumerate(chunk):
+                    traces[start + offset] = tracer.start(
+                        "batch", question=question, batch_index=start + offset
+                    )
+
+                started = time.perf_counter()
+                try:
+                    rewrites = await self.query_agent.abatch(chunk, max_concurrency)
+                except Exception as e:
+                    rewrites = [e] * len(chunk)
+
+                for offset, (question, rewrite) in enumerate(zip(chunk, rewrites)):
+                    # The chunk shares one abatch call, cache and rule hits included
+                    record(
+                        start + offset,
+                        "query_processing",
+                        started,
+                        batch_size=len(chunk),
+                    )
+                    # Batch items share the pipeline; per-question deadlines do not apply
+                    state = self._initial_state(question, deadline_ms=0)
+                    if isinstance(rewrite, Exception):
+                        state = self._on_query_error(state, rewrite)
+                    else:
+                        state = self._on_query(state, rewrite["content"])
+                    spawn(search(start + offset, state))
+
+        async def answer_stage() -> None:
+            remaining = len(questions)
+            while remaining:
+                await answer_slots.acquire()
+                chunk = [await ready.get()]
+                # Micro-batch whatever else is ready without waiting
+                while (
+                    len(chunk) < batch_size
+                    and not ready.empty()
+                    and not answer_slots.locked()
+                ):
+                    await answer_slots.acquire()
+                    chunk.append(ready.get_nowait())
+                remaining -= len(chunk)
+                spawn(answer(chunk))
+
+        print(f"🚀 Starting batch workflow for {len(questions)} questions")
+        spawn(rewrite_stage())
+        spawn(answer_stage())
+
+        try:
+            for _ in range(len(questions)):
+                index, state = await finished.get()
+                tracer.finish(traces[index])
+                result = self._with_timings(self._build_result(state), traces[index])
+                result["metadata"]["batch_index"] = index
+                yield result
+        finally:
+            for task in list(tasks):
+                task.cancel()
+
+    def run_batch(
+        self, questions: List[str], max_concurrency: int = 8, batch_size: int = 0
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Synchronous wrapper around arun_batch
+
+        The pipeline runs on an event loop in a background thread; results
+        are yielded in completion order as they arrive.
+
+        Args:
+            questions: User questions
+            max_concurrency: Maximum in-flight requests per stage
+            batch_size: LLM micro-batch size (defaults to max_concurrency)
+
+        Yields:
+            Result dicts in the same shape as run()
+        """
+        results: queue.Queue = queue.Queue()
+        done = object()
+
+        async def drain() -> None:
+            try:
+                async for result in self.arun_batch(
+                    questions, max_concurrency, batch_size
+                ):
+                    results.put(result)
+            except BaseException as e:
+                results.put(e)
+            finally:
+                await self.search_tool.aclose()
+                if self.page_fetcher is not None:
+                    await self.page_fetcher.aclose()
+                results.put(done)
+
+        worker = threading.Thread(target=asyncio.run, args=(drain(),), daemon=True)
+        worker.start()
+
+        while True:
+            item = results.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+        worker.join()
+
+    def _initial_state(
+        self,
+        user_question: str,
+        answer_mode: Optional[str] = None,
+        budget_ms: Optional[float] = None,
+        deadline_ms: Optional[float] = None,
+    ) -> WorkflowState:
+        """Create the initial state for a question, with its model route and deadline"""
+        deadline = Deadline.start(
+            deadline_ms if deadline_ms is not None else self.deadline_ms
+        )
+        if deadline is not None:
+            self.deadline_counts["requests"] += 1
+        optional_stages = ("page_fetching",) if self.page_fetcher is not None else ()
+        route = self.router.route(user_question, budget_ms, optional_stages)
+        if route is not None and route.answer_mode and not answer_mode:
+            print(
+                f"⏱️ Budget of {route.budget_ms:.0f} ms leaves no time for Gemini; answering extractively"
+            )
+        return WorkflowState(
             original_question=user_question,
             search_query="",
+            search_queries=[],
+            fanout_stats={},
+            results=[],
             search_results="",
+            page_stats={},
+            passage_index={},
             final_answer="",
-            current_step="initialized"
+            current_step="initialized",
+            speculation="",
+            context_stats={},
+            answer_cache={},
+            # An explicit answer mode wins over the one the budget asks for
+            answer_mode=answer_mode
+            or (route.answer_mode if route is not None else None)
+            or "",
+            answered_by={},
+            route=route,
+            deadline=deadline,
+            partial_answer=[],
         )
-        
-        print(f"🚀 Starting workflow for question: {user_question}")
-        
-        try:
-            # Run the workflow
-            final_state = self.workflow.invoke(initial_state)
-            
-            return {
-                "content": final_state["final_answer"],
-                "metadata": {
-                    "search_query": final_state["search_query"],
-                    "current_step": final_state["current_step"],
-                    "success": "error" not in final_state["current_step"]
-                }
-            }
-            
-        except Exception as e:
-            print(f"❌ Workflow execution error: {e}")
-            return {
-                "content": f"Workflow failed: {str(e)}",
-                "metadata": {
-                    "search_query": "",
-                    "current_step": f"workflow_error: {str(e)}",
-                    "success": False
-                }
+
+    def _build_result(self, final_state: WorkflowState) -> Dict[str, Any]:
+        """Convert the final workflow state into the response dict"""
+        metadata = {
+            "search_query": final_state["search_query"],
+            "current_step": final_state["current_step"],
+            "success": "error" not in final_state["current_step"],
+        }
+        if len(final_state.get("search_queries", [])) > 1:
+            metadata["search_queries"] = final_state["search_queries"]
+            metadata["fanout"] = final_state["fanout_stats"]
+        if final_state.get("speculation"):
+            metadata["speculation"] = final_state["speculation"]
+        if final_state.get("page_stats"):
+            metadata["pages"] = final_state["page_stats"]
+        if final_state.get("passage_index"):
+            metadata["passage_index"] = final_state["passage_index"]
+        if final_state.get("context_stats"):
+            metadata["context"] = final_state["context_stats"]
+        if final_state.get("answer_cache"):
+            metadata["answer_cache"] = {
+                **final_state["answer_cache"],
+                "hit_rate": self.answer_cache.stats()["hit_rate"],
             }
-    
-    def get_workflow_status(self) -> Dict[str, str]:
+        if final_state.get("route") is not None:
+            metadata["route"] = final_state["route"].to_dict()
+        if final_state.get("deadline") is not None:
+            metadata["deadline"] = final_state["deadline"].to_dict()
+        if final_state.get("answered_by"):
+            metadata["answer_mode"] = final_state["answered_by"]["answer_mode"]
+            if final_state["answered_by"].get("fallback_reason"):
+                metadata["answer_fallback"] = final_state["answered_by"][
+                    "fallback_reason"
+                ]
+
+        return {"content": final_state["final_answer"], "metadata": metadata}
+
+    def _build_error(self, error: Exception) -> Dict[str, Any]:
+        """Build the response dict for a failed workflow execution"""
+        print(f"❌ Workflow execution error: {error}")
+        return {
+            "content": f"Workflow failed: {str(error)}",
+            "metadata": {
+                "search_query": "",
+                "current_step": f"workflow_error: {str(error)}",
+                "success": False,
+            },
+        }
+
+    def coalescing_stats(self) -> Dict[str, Any]:
+        """
+        Get counters for coalesced search calls
+
+        Returns:
+            Dict with executions and coalesced callers for the web_search stage
+        """
+        return self.search_flight.stats()
+
+    def compaction_stats(self) -> Dict[str, Any]:
+        """
+        Get cumulative context compaction counters
+
+        Returns:
+            Dict with tokens before/after compaction and tokens saved
+            (empty when compaction is disabled)
+        """
+        return self.compactor.stats() if self.compactor is not None else {}
+
+    def answer_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get answer cache hit/miss counters
+
+        Returns:
+            Dict with cache statistics (empty when the answer cache is disabled)
+        """
+        return self.answer_cache.stats() if self.answer_cache is not None else {}
+
+    def passage_index_stats(self) -> Dict[str, Any]:
+        """
+        Get passage index size and lookup counters
+
+        Returns:
+            Dict with passages, lookups, hits, misses and hit_rate (empty
+            when the passage index is disabled)
+        """
+        return self.passage_index.stats() if self.passage_index is not None else {}
+
+    def speculation_stats(self) -> Dict[str, Any]:
+        """
+        Get speculative search outcomes
+
+        Returns:
+            Dict with hit / deadline / fallback / miss counts and the share of
+            speculative runs whose results were used
+        """
+        counts = {
+            outcome: self.speculation_counts.get(outcome, 0)
+            for outcome in SPECULATION_USED + ("miss",)
+        }
+        total = sum(counts.values())
+        used = total - counts["miss"]
+        counts["used_rate"] = used / total if total else 0.0
+        return counts
+
+    def resilience_stats(self) -> Dict[str, Any]:
+        """
+        Get hedge and retry counters for each upstream call
+
+        Returns:
+            Dict of call name (gemini.rewrite, serpapi, gemini.answer) to
+            calls, hedges, hedge_wins, retries and their rates
+        """
+        callers = (
+            self.query_agent.resilience,
+            self.search_tool.resilience,
+            self.answer_agent.resilience,
+        )
+        return {caller.name: caller.stats() for caller in callers}
+
+    def router_stats(self) -> Dict[str, Any]:
+        """
+        Get model routing decisions and per-tier latency and cost
+
+        Returns:
+            Dict with routes per complexity level, latency budget outcomes,
+            total cost_usd and per-tier calls, tokens, cost and latency
+        """
+        return self.router.stats()
+
+    def deadline_stats(self) -> Dict[str, Any]:
+        """
+        Get request deadline outcomes
+
+        Returns:
+            Dict with the default deadline_ms, requests run under a deadline,
+            cut_requests (those that returned a partial result) and cuts per stage
+        """
+        stages = [
+            stage
+            for stage in self.deadline_counts
+            if stage not in ("requests", "cut_requests")
+        ]
+        return {
+            "deadline_ms": self.deadline_ms or None,
+            "requests": self.deadline_counts["requests"],
+            "cut_requests": self.deadline_counts["cut_requests"],
+            "cuts": {stage: self.deadline_counts[stage] for stage in stages},
+        }
+
+    def answer_mode_stats(self) -> Dict[str, Any]:
+        """
+        Get how answers were produced
+
+        Returns:
+            Dict with llm / extractive answer counts, extractive fallbacks by
+            reason (breaker_open, llm_error) and the answer circuit breaker state
+        """
+        return self.answer_agent.mode_stats()
+
+    def get_workflow_status(self) -> Dict[str, Any]:
         """
         Get information about the workflow configuration
-        
+
         Returns:
-            Dict with workflow status information
+            Dict with workflow status information (nodes and tools as
+            currently built, optional stages included)
         """
+        optional_tools = (
+            ("ContextCompactor", self.compactor),
+            ("PageFetcher", self.page_fetcher),
+            ("PassageIndex", self.passage_index),
+        )
         return {
             "workflow_type": "LangGraph StateGraph",
-            "nodes": ["query_processing", "web_search", "answer_generation"],
+            # Read from the compiled graph so optional nodes (page_fetching) are listed
+            "nodes": [
+                node for node in self.workflow.nodes if not node.startswith("__")
+            ],
             "entry_point": "query_processing",
             "agents": ["QueryAgent", "AnswerAgent"],
-            "tools": ["SearchTool"],
-            "status": "ready"
-        }
\ No newline at end of file
+            "tools": ["SearchTool"]
+            + [name for name, tool in optional_tools if tool is not None],
+            "status": "ready",
+        }
@@ -0,0 +1,196 @@
+"""
+Component Registry - One shared instance of each agent, tool and client
+The server, workflow and CLI all resolve components from here, so caches,
+connection pools and counters are unified instead of duplicated
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from tools.model_router import DEFAULT_MODEL
+
+
+def _gemini_client(model: str) -> Any:
+    """Build a Gemini chat model client for one model"""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model=model,
+        google_api_key=os.getenv("GEMINI_API_KEY"),
+        timeout=float(os.getenv("GEMINI_TIMEOUT", 60)),
+        # Retries happen in the agents (jittered, visible to the rate limiter)
+        max_retries=0,
+    )
+
+
+def _create_llm(registry: "ComponentRegistry") -> Any:
+    """Build the shared Gemini chat model (one gRPC client for all agents)"""
+    return _gemini_client(os.getenv("GEMINI_MODEL", DEFAULT_MODEL))
+
+
+def _create_model_router(registry: "ComponentRegistry") -> Any:
+    """Per-request model tiers shared by both agents; other tiers get their own client"""
+    from tools.model_router import ModelRouter
+
+    return ModelRouter.from_env(client_factory=_gemini_client)
+
+
+def _create_gemini_limiter(registry: "ComponentRegistry") -> Any:
+    """Rate/concurrency limit shared by every Gemini caller"""
+    from tools.rate_limiter import UpstreamLimiter
+
+    return UpstreamLimiter.from_env("gemini")
+
+
+def _create_serpapi_limiter(registry: "ComponentRegistry") -> Any:
+    from tools.rate_limiter import UpstreamLimiter
+
+    return UpstreamLimiter.from_env("serpapi")
+
+
+def _create_query_agent(registry: "ComponentRegistry") -> Any:
+    from agents.query_agent import QueryAgent
+
+    return QueryAgent(
+        llm=registry.llm,
+        limiter=registry.get("gemini_limiter"),
+        router=registry.get("model_router"),
+    )
+
+
+def _create_search_tool(registry: "ComponentRegistry") -> Any:
+    from tools.search_tool import SearchTool
+
+    return SearchTool(limiter=registry.get("serpapi_limiter"))
+
+
+def _create_answer_agent(registry: "ComponentRegistry") -> Any:
+    from agents.answer_agent import AnswerAgent
+
+    return AnswerAgent(
+        llm=registry.llm,
+        limiter=registry.get("gemini_limiter"),
+        router=registry.get("model_router"),
+    )
+
+
+def _create_workflow(registry: "ComponentRegistry") -> Any:
+    from langflow.graph import WebSearchWorkflow
+
+    return WebSearchWorkflow(registry=registry)
+
+
+class ComponentRegistry:
+    """
+    Lazily constructs and caches one instance per named component
+    """
+
+    default_factories: Dict[str, Callable[["ComponentRegistry"], Any]] = {
+        "llm": _create_llm,
+        "gemini_limiter": _create_gemini_limiter,
+        "serpapi_limiter": _create_serpapi_limiter,
+        "model_router": _create_model_router,
+        "query_agent": _create_query_agent,
+        "search_tool": _create_search_tool,
+        "answer_agent": _create_answer_agent,
+        "workflow": _create_workflow,
+    }
+
+    def __init__(
+        self,
+        factories: Optional[Dict[str, Callable[["ComponentRegistry"], Any]]] = None,
+    ):
+        self._factories = {**self.default_factories, **(factories or {})}
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def get(self, name: str) -> Any:
+        """
+        Get a component, constructing it on first use
+
+        Args:
+            name: Component name (llm, gemini_limiter, serpapi_limiter, model_router,
+                query_agent, search_tool, answer_agent, workflow)
+
+        Returns:
+            The shared component instance
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            if name not in self._instances:
+                if name not in self._factories:
+                    raise KeyError(f"Unknown component: {name}")
+                self._instances[name] = self._factories[name](self)
+            return self._instances[name]
+
+    def register(self, name: str, instance: Any) -> None:
+        """
+        Use a pre-built instance for a component (e.g. fakes in tests)
+
+        Args:
+            name: Component name
+            instance: Instance to share
+        """
+        with self._lock:
+            self._instances[name] = instance
+
+    def loaded(self) -> Dict[str, str]:
+        """
+        Get the components constructed so far
+
+        Returns:
+            Dict of component name to class name
+        """
+        return {
+            name: type(instance).__name__ for name, instance in self._instances.items()
+        }
+
+    @property
+    def llm(self) -> Any:
+        return self.get("llm")
+
+    @property
+    def query_agent(self) -> Any:
+        return self.get("query_agent")
+
+    @property
+    def search_tool(self) -> Any:
+        return self.get("search_tool")
+
+    @property
+    def answer_agent(self) -> Any:
+        return self.get("answer_agent")
+
+    @property
+    def workflow(self) -> Any:
+        return self.get("workflow")
+
+
+_registry: Optional[ComponentRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ComponentRegistry:
+    """
+    Get the process-wide component registry
+
+    Returns:
+        The shared ComponentRegistry
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ComponentRegistry()
+    return _registry
+
+
+def reset_registry() -> None:
+    """Drop the process-wide registry so the next get_registry() starts fresh"""
+    global _registry
+    with _registry_lock:
+        _registry = None
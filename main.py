@@ -3,51 +3,142 @@ Command Line Interface for MCP Web Search Answer
 Interactive CLI for testing the web search and answer functionality
 """
 
+import argparse
+import json
 import sys
-from server import MCPWebSearchServer
+import time
+
+from server import get_server
+
+
+def run_batch(input_path: str, output_path: str, concurrency: int):
+    """
+    Answer every question in a file (one per line) and write JSON lines
+
+    Args:
+        input_path: Text file with one question per line
+        output_path: Destination JSONL file
+        concurrency: Maximum in-flight requests per stage
+    """
+    with open(input_path, "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+
+    server = get_server()
+    start = time.perf_counter()
+
+    with open(output_path, "w", encoding="utf-8") as out:
+        for count, result in enumerate(
+            server.process_questions(questions, max_concurrency=concurrency), 1
+        ):
+            index = result["metadata"]["batch_index"]
+            out.write(json.dumps({"question": questions[index], **result}) + "\n")
+            print(f"📦 {count}/{len(questions)} done")
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"✅ Answered {len(questions)} questions in {elapsed:.1f}s "
+        f"({len(questions) / elapsed if elapsed else 0:.2f} questions/s) → {output_path}"
+    )
 
 
 def main():
     """
     Interactive CLI for the MCP Web Search Answer application
     """
+    parser = argparse.ArgumentParser(description="MCP Web Search Answer CLI")
+    parser.add_argument(
+        "--batch", metavar="FILE", help="answer every question in FILE (one per line)"
+    )
+    parser.add_argument(
+        "--output", default="answers.jsonl", help="JSONL output file for --batch"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="maximum in-flight requests for --batch",
+    )
+    parser.add_argument(
+        "--answer-mode",
+        choices=["llm", "extractive"],
+        default=None,
+        help="answer with Gemini or extractively from the search snippets (default: ANSWER_MODE)",
+    )
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=None,
+        help="latency budget per question; faster models or lighter modes are used to meet it",
+    )
+    parser.add_argument(
+        "--deadline-ms",
+        type=float,
+        default=None,
+        help="hard time limit per question; slower stages are cut and a partial answer is shown "
+        "(default: WORKFLOW_DEADLINE_MS)",
+    )
+    args = parser.parse_args()
+
+    if args.batch:
+        run_batch(args.batch, args.output, args.concurrency)
+        return
+
     print("🌟 MCP Web Search Answer - Interactive CLI")
     print("=" * 50)
     print("Ask any question and get AI-powered answers from web search!")
     print("Type 'quit', 'exit', or 'q' to stop.")
     print("=" * 50)
-    
+
     try:
         # Initialize the server
-        server = MCPWebSearchServer()
+        server = get_server()
         print("✅ Server initialized successfully!\n")
-        
+
         while True:
             # Get user input
             try:
                 question = input("🤔 Your question: ").strip()
-                
+
                 # Check for exit commands
-                if question.lower() in ['quit', 'exit', 'q', '']:
+                if question.lower() in ["quit", "exit", "q", ""]:
                     print("👋 Goodbye!")
                     break
-                
+
                 print("\n🔄 Processing your question...")
                 print("-" * 30)
-                
-                # Process the question
-                result = server.process_question(question)
-                
+
+                # Process the question, printing answer tokens as they arrive
+                result = {}
+                answer_started = False
+                for event in server.stream_question(
+                    question, args.answer_mode, args.budget_ms, args.deadline_ms
+                ):
+                    if event["type"] == "token":
+                        if not answer_started:
+                            print("💡 Answer: ", end="", flush=True)
+                            answer_started = True
+                        print(event["content"], end="", flush=True)
+                    else:
+                        result = event
+
                 # Display the answer
-                print(f"💡 Answer: {result['content']}")
-                
+                if answer_started:
+                    print()
+                else:
+                    print(f"💡 Answer: {result['content']}")
+
                 # Display metadata if available
-                if 'metadata' in result and result['metadata'].get('success'):
-                    search_query = result['metadata'].get('search_query', 'N/A')
+                if "metadata" in result and result["metadata"].get("success"):
+                    search_query = result["metadata"].get("search_query", "N/A")
                     print(f"🔍 Search query used: {search_query}")
-                
+                    cut_stages = (
+                        result["metadata"].get("deadline", {}).get("cut_stages")
+                    )
+                    if cut_stages:
+                        print(f"⏱️ Cut by the deadline: {', '.join(cut_stages)}")
+
                 print("\n" + "=" * 50)
-                
+
             except KeyboardInterrupt:
                 print("\n👋 Goodbye!")
                 break
@@ -55,7 +146,7 @@ def main():
                 print(f"❌ Error processing question: {e}")
                 print("Please try again with a different question.\n")
                 continue
-    
+
     except Exception as e:
         print(f"❌ Failed to initialize server: {e}")
         print("Please check your .env file and ensure all API keys are set correctly.")
@@ -63,4 +154,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -3,118 +3,340 @@ FastMCP Server - Main application entry point
 Orchestrates the web search and answer workflow using MCP framework
 """
 
-import os
 import asyncio
-from typing import Dict, Any
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+import copy
+import os
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
 
-# Import MCP components
-try:
-    from mcp.server.fastmcp import FastMCP
-except ImportError:
-    print("⚠️  FastMCP not available, using alternative implementation")
-    FastMCP = None
+from agents.rewrite_cache import canonicalize_question
 
-# Import our agents and tools
-from agents.query_agent import QueryAgent
-from agents.answer_agent import AnswerAgent
-from tools.search_tool import SearchTool
-from langflow.graph import WebSearchWorkflow
+# Import shared components. Importing this module is deliberately cheap:
+# LangChain, LangGraph, SerpAPI and FastMCP load when the server is created.
+from langflow.registry import ComponentRegistry, get_registry
+from tools import tracing
+from tools.singleflight import SingleFlight
 
 
 class MCPWebSearchServer:
     """
     Main server class that handles web search and answer generation
     """
-    
-    def __init__(self):
-        # Validate environment variables
+
+    def __init__(self, registry: Optional[ComponentRegistry] = None):
+        # Load environment variables and validate them
+        from dotenv import load_dotenv
+
+        load_dotenv()
         self._validate_environment()
-        
-        # Initialize components
-        self.query_agent = QueryAgent()
-        self.search_tool = SearchTool()
-        self.answer_agent = AnswerAgent()
-        self.workflow = WebSearchWorkflow()
-        
+
+        # Resolve components from the shared registry so the FastMCP
+        # participants are the same objects that serve requests
+        self.registry = registry if registry is not None else get_registry()
+        self.workflow = self.registry.workflow
+        self.query_agent = self.registry.query_agent
+        self.search_tool = self.registry.search_tool
+        self.answer_agent = self.registry.answer_agent
+
+        # Coalesce concurrent identical questions into one workflow execution
+        self.request_flight = SingleFlight("process_question")
+
+        # Request metrics, served on /metrics when METRICS_PORT is set
+        from tools import metrics
+
+        self.metrics = metrics
+        metrics.start_metrics_server()
+
         print("✅ MCP Web Search Server initialized successfully")
-    
+
     def _validate_environment(self):
         """Validate that required environment variables are set"""
         required_vars = ["GEMINI_API_KEY", "SERPAPI_KEY"]
         missing_vars = []
-        
+
         for var in required_vars:
             if not os.getenv(var) or os.getenv(var) == f"your_{var.lower()}":
                 missing_vars.append(var)
-        
+
         if missing_vars:
             print(f"❌ Missing environment variables: {', '.join(missing_vars)}")
             print("Please update your .env file with valid API keys")
             raise ValueError(f"Missing required environment variables: {missing_vars}")
-    
-    def process_question(self, user_question: str) -> Dict[str, Any]:
+
+    def process_question(
+        self,
+        user_question: str,
+        answer_mode: Optional[str] = None,
+        budget_ms: Optional[float] = None,
+        deadline_ms: Optional[float] = None,
+    ) -> Dict[str, Any]:
         """
         Process a user question through the complete workflow
-        
+
         Args:
             user_question: The user's natural language question
-            
+            answer_mode: "llm" or "extractive" (no-LLM, lowest latency);
+                defaults to ANSWER_MODE
+            budget_ms: End-to-end latency budget; faster model tiers or
+                lighter modes are chosen to meet it
+            deadline_ms: Hard limit; stages still running when it passes are
+                cut and a partial result is returned (defaults to
+                WORKFLOW_DEADLINE_MS)
+
         Returns:
             Dict with the final answer and metadata
         """
         print(f"\n📝 Processing question: {user_question}")
-        
-        # Use LangGraph workflow for orchestration
-        result = self.workflow.run(user_question)
-        
+
+        with self.metrics.track_request("process_question") as request:
+            # Use LangGraph workflow for orchestration
+            result, shared = self.request_flight.do(
+                (
+                    canonicalize_question(user_question),
+                    answer_mode or "",
+                    budget_ms or 0,
+                    deadline_ms or 0,
+                ),
+                lambda: self.workflow.run(
+                    user_question, answer_mode, budget_ms, deadline_ms
+                ),
+            )
+
+            return request.record(self._mark_coalesced(result) if shared else result)
+
+    async def aprocess_question(
+        self,
+        user_question: str,
+        answer_mode: Optional[str] = None,
+        budget_ms: Optional[float] = None,
+        deadline_ms: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Process a user question through the async workflow
+
+        Runs without blocking a thread on network I/O, so many questions
+        can be served concurrently from one event loop.
+
+        Args:
+            user_question: The user's natural language question
+            answer_mode: "llm" or "extractive" (defaults to ANSWER_MODE)
+            budget_ms: End-to-end latency budget (see process_question)
+            deadline_ms: Hard limit (see process_question)
+
+        Returns:
+            Dict with the final answer and metadata
+        """
+        print(f"\n📝 Processing question (async): {user_question}")
+
+        with self.metrics.track_request("process_question") as request:
+            result, shared = await self.request_flight.ado(
+                (
+                    canonicalize_question(user_question),
+                    answer_mode or "",
+                    budget_ms or 0,
+                    deadline_ms or 0,
+                ),
+                lambda: self.workflow.arun(
+                    user_question, answer_mode, budget_ms, deadline_ms
+                ),
+            )
+
+            return request.record(self._mark_coalesced(result) if shared else result)
+
+    def stream_question(
+        self,
+        user_question: str,
+        answer_mode: Optional[str] = None,
+        budget_ms: Optional[float] = None,
+        deadline_ms: Optional[float] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Process a question, streaming the answer as it is generated
+
+        Args:
+            user_question: The user's natural language question
+            answer_mode: "llm" or "extractive" (defaults to ANSWER_MODE)
+            budget_ms: End-to-end latency budget (see process_question)
+            deadline_ms: Hard limit (see process_question)
+
+        Returns:
+            Iterator of {"type": "token", "content": ...} events followed by a
+            final {"type": "result", "content": ..., "metadata": ...} event
+        """
+        print(f"\n📝 Streaming question: {user_question}")
+        return self._tracked_stream(
+            self.workflow.stream(user_question, answer_mode, budget_ms, deadline_ms)
+        )
+
+    def astream_question(
+        self,
+        user_question: str,
+        answer_mode: Optional[str] = None,
+        budget_ms: Optional[float] = None,
+        deadline_ms: Optional[float] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Async variant of stream_question
+
+        Args:
+            user_question: The user's natural language question
+            answer_mode: "llm" or "extractive" (defaults to ANSWER_MODE)
+            budget_ms: End-to-end latency budget (see process_question)
+            deadline_ms: Hard limit (see process_question)
+
+        Returns:
+            Async iterator of token events followed by a result event
+        """
+        print(f"\n📝 Streaming question (async): {user_question}")
+        return self._atracked_stream(
+            self.workflow.astream(user_question, answer_mode, budget_ms, deadline_ms)
+        )
+
+    def _tracked_stream(
+        self, events: Iterator[Dict[str, Any]]
+    ) -> Iterator[Dict[str, Any]]:
+        """Record a streamed request once its result event has been produced"""
+        with self.metrics.track_request("stream_question") as request:
+            for event in events:
+                if event["type"] == "result":
+                    request.record(event)
+                yield event
+
+    async def _atracked_stream(
+        self, events: AsyncIterator[Dict[str, Any]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Async variant of _tracked_stream"""
+        with self.metrics.track_request("stream_question") as request:
+            async for event in events:
+                if event["type"] == "result":
+                    request.record(event)
+                yield event
+
+    def process_questions(
+        self, questions: List[str], max_concurrency: int = 8
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Process many questions with bounded concurrency
+
+        Stages are pipelined across questions and LLM calls are batched.
+        Results stream back in completion order with metadata["batch_index"]
+        pointing at the input position; per-item errors don't fail the batch.
+
+        Args:
+            questions: User questions
+            max_concurrency: Maximum in-flight requests per stage
+
+        Returns:
+            Iterator of result dicts
+        """
+        print(
+            f"\n📚 Processing batch of {len(questions)} questions (concurrency={max_concurrency})"
+        )
+        return self.workflow.run_batch(questions, max_concurrency=max_concurrency)
+
+    def aprocess_questions(
+        self, questions: List[str], max_concurrency: int = 8
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Async variant of process_questions
+
+        Args:
+            questions: User questions
+            max_concurrency: Maximum in-flight requests per stage
+
+        Returns:
+            Async iterator of result dicts
+        """
+        print(
+            f"\n📚 Processing batch of {len(questions)} questions (async, concurrency={max_concurrency})"
+        )
+        return self.workflow.arun_batch(questions, max_concurrency=max_concurrency)
+
+    def _mark_coalesced(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy a shared result and flag it as coalesced for this caller"""
+        result = copy.deepcopy(result)
+        result.setdefault("metadata", {})["coalesced"] = True
         return result
-    
+
+    def coalescing_stats(self) -> Dict[str, Any]:
+        """
+        Get counters for coalesced requests
+
+        Returns:
+            Dict with request-level and search-level coalescing counters
+        """
+        return {
+            "requests": self.request_flight.stats(),
+            "searches": self.workflow.coalescing_stats(),
+        }
+
+    async def aclose(self) -> None:
+        """Release pooled async HTTP connections"""
+        await self.search_tool.aclose()
+        if self.workflow.page_fetcher is not None:
+            await self.workflow.page_fetcher.aclose()
+
     def process_step_by_step(self, user_question: str) -> Dict[str, Any]:
         """
         Alternative method that processes each step individually
         Useful for debugging or when LangGraph is not available
-        
+
         Args:
             user_question: The user's natural language question
-            
+
         Returns:
             Dict with the final answer and step-by-step results
         """
         print(f"\n🔧 Processing step-by-step: {user_question}")
-        
+
+        with self.metrics.track_request("process_step_by_step") as request:
+            with tracing.get_tracer().trace(
+                "step_by_step", question=user_question
+            ) as trace:
+                result = self._step_by_step(user_question)
+            if trace is not None:
+                result["metadata"]["timings"] = trace.timings()
+            return request.record(result)
+
+    def _step_by_step(self, user_question: str) -> Dict[str, Any]:
+        """Run the three steps directly, timing and tracing each like the workflow nodes"""
         try:
             # Step 1: Generate search query
             print("Step 1: Generating search query...")
-            query_result = self.query_agent(user_question)
+            with self.metrics.observe_stage("query_processing"), tracing.span(
+                "query_processing"
+            ):
+                query_result = self.query_agent(user_question)
             search_query = query_result["content"]
             print(f"🔍 Search query: {search_query}")
-            
+
             # Step 2: Perform web search
             print("Step 2: Performing web search...")
-            search_result = self.search_tool(search_query)
+            with self.metrics.observe_stage("web_search"), tracing.span("web_search"):
+                search_result = self.search_tool(search_query)
             search_results = search_result["content"]
             print(f"🌐 Found {len(search_results)} characters of results")
-            
+
             # Step 3: Generate final answer
             print("Step 3: Generating answer...")
-            answer_result = self.answer_agent(search_results, user_question)
+            with self.metrics.observe_stage("answer_generation"), tracing.span(
+                "answer_generation"
+            ):
+                answer_result = self.answer_agent(search_results, user_question)
             final_answer = answer_result["content"]
             print(f"✅ Generated answer: {final_answer[:100]}...")
-            
+
             return {
                 "content": final_answer,
                 "metadata": {
                     "search_query": search_query,
                     "search_results_length": len(search_results),
+                    "answer_mode": answer_result["metadata"]["answer_mode"],
                     "processing_method": "step_by_step",
-                    "success": True
-                }
+                    "success": True,
+                },
             }
-            
+
         except Exception as e:
             print(f"❌ Step-by-step processing error: {e}")
             return {
@@ -122,16 +344,62 @@ class MCPWebSearchServer:
                 "metadata": {
                     "processing_method": "step_by_step",
                     "success": False,
-                    "error": str(e)
-                }
+                    "error": str(e),
+                },
             }
 
 
-# Initialize the server
-server = MCPWebSearchServer()
+_server: Optional[MCPWebSearchServer] = None
+_app: Any = None
+_app_created = False
+_factory_lock = threading.Lock()
+
+
+def create_server(registry: Optional[ComponentRegistry] = None) -> MCPWebSearchServer:
+    """
+    Factory for a new server instance
+
+    Args:
+        registry: Component registry to use (defaults to the shared one)
+
+    Returns:
+        Initialized MCPWebSearchServer
+    """
+    return MCPWebSearchServer(registry=registry)
+
+
+def get_server() -> MCPWebSearchServer:
+    """
+    Get the process-wide server, creating it on first use
+
+    Returns:
+        Shared MCPWebSearchServer
+    """
+    global _server
+    if _server is None:
+        with _factory_lock:
+            if _server is None:
+                _server = create_server()
+    return _server
+
+
+def create_app(server: MCPWebSearchServer) -> Any:
+    """
+    Build the FastMCP application for a server (if FastMCP is available)
+
+    Args:
+        server: Server whose components become the MCP participants
+
+    Returns:
+        FastMCP application or None
+    """
+    # Import MCP components
+    try:
+        from mcp.server.fastmcp import FastMCP
+    except ImportError:
+        print("⚠️  FastMCP not available, using alternative implementation")
+        return None
 
-# FastMCP integration (if available)
-if FastMCP:
     try:
         app = FastMCP.from_file(
             __name__,
@@ -140,14 +408,39 @@ if FastMCP:
                 "query_agent": server.query_agent,
                 "search_tool": server.search_tool,
                 "answer_agent": server.answer_agent,
-            }
+            },
         )
         print("✅ FastMCP application created successfully")
+        return app
     except Exception as e:
         print(f"⚠️  FastMCP setup failed: {e}")
-        app = None
-else:
-    app = None
+        return None
+
+
+def get_app() -> Any:
+    """
+    Get the process-wide FastMCP application, creating it on first use
+
+    Returns:
+        FastMCP application or None
+    """
+    global _app, _app_created
+    if not _app_created:
+        server = get_server()
+        with _factory_lock:
+            if not _app_created:
+                _app = create_app(server)
+                _app_created = True
+    return _app
+
+
+def __getattr__(name: str) -> Any:
+    """Keep `server.server` / `server.app` working, built on first access"""
+    if name == "server":
+        return get_server()
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def main():
@@ -156,30 +449,34 @@ def main():
     """
     print("🌟 MCP Web Search Answer Application")
     print("=" * 50)
-    
+
+    server = get_server()
+
     # Test questions
     test_questions = [
         "What's new with OpenAI this month?",
         "Latest developments in AI safety research",
-        "Recent updates to Python programming language"
+        "Recent updates to Python programming language",
     ]
-    
+
     for question in test_questions:
         print(f"\n🤔 Question: {question}")
         print("-" * 30)
-        
+
         # Process using LangGraph workflow
         try:
             result = server.process_question(question)
             print(f"💡 Answer: {result['content']}")
-            
-            if 'metadata' in result:
-                print(f"🔍 Search Query Used: {result['metadata'].get('search_query', 'N/A')}")
+
+            if "metadata" in result:
+                print(
+                    f"🔍 Search Query Used: {result['metadata'].get('search_query', 'N/A')}"
+                )
                 print(f"✅ Success: {result['metadata'].get('success', False)}")
-        
+
         except Exception as e:
             print(f"❌ Error: {e}")
-            
+
             # Fallback to step-by-step processing
             print("🔄 Trying step-by-step processing...")
             try:
@@ -187,9 +484,9 @@ def main():
                 print(f"💡 Answer: {result['content']}")
             except Exception as e2:
                 print(f"❌ Step-by-step also failed: {e2}")
-        
+
         print("\n" + "=" * 50)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -2,17 +2,20 @@
 Setup script for MCP Web Search Answer
 """
 
-from setuptools import setup, find_packages
 import os
 
+from setuptools import find_packages, setup
+
 # Read the contents of README file
 this_directory = os.path.abspath(os.path.dirname(__file__))
-with open(os.path.join(this_directory, 'README.md'), encoding='utf-8') as f:
+with open(os.path.join(this_directory, "README.md"), encoding="utf-8") as f:
     long_description = f.read()
 
 # Read requirements
-with open('requirements.txt') as f:
-    requirements = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+with open("requirements.txt") as f:
+    requirements = [
+        line.strip() for line in f if line.strip() and not line.startswith("#")
+    ]
 
 setup(
     name="mcp-web-search-answer",
@@ -71,4 +74,4 @@ setup(
         "Source": "https://github.com/yourusername/mcp_web_search_answer",
         "Documentation": "https://github.com/yourusername/mcp_web_search_answer#readme",
     },
-)
\ No newline at end of file
+)
@@ -1 +1 @@
-# Tests package
\ No newline at end of file
+# Tests package
@@ -0,0 +1,109 @@
+"""
+Shared test fixtures: offline stand-ins for Gemini chains and SerpAPI
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeChain:
+    """Stand-in for a LangChain chain returning a fixed response"""
+
+    def __init__(self, response="fake response", delay=0.0):
+        self.response = response
+        self.delay = delay
+        self.calls = 0
+
+    def _respond(self, inputs):
+        self.calls += 1
+        return self.response(inputs) if callable(self.response) else self.response
+
+    def invoke(self, inputs, config=None):
+        return self._respond(inputs)
+
+    async def ainvoke(self, inputs, config=None):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self._respond(inputs)
+
+    def stream(self, inputs, config=None):
+        for token in self._respond(inputs).split(" "):
+            yield token + " "
+
+    async def astream(self, inputs, config=None):
+        for token in self._respond(inputs).split(" "):
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield token + " "
+
+    def batch(self, inputs, config=None, return_exceptions=False):
+        return [self.invoke(i) for i in inputs]
+
+    async def abatch(self, inputs, config=None, return_exceptions=False):
+        return await asyncio.gather(*(self.ainvoke(i) for i in inputs))
+
+
+def fake_serpapi_results(query):
+    """Deterministic SerpAPI payload for a query"""
+    return {
+        "organic_results": [
+            {
+                "title": f"{query} result {i}",
+                "snippet": f"Snippet {i} about {query}.",
+                "link": f"https://example.com/{i}",
+            }
+            for i in range(1, 6)
+        ]
+    }
+
+
+@pytest.fixture
+def api_keys(monkeypatch):
+    """Dummy API keys so agents and tools can be constructed offline"""
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    monkeypatch.setenv("SERPAPI_KEY", "test")
+
+
+@pytest.fixture
+def offline_workflow(api_keys, monkeypatch):
+    """WebSearchWorkflow wired to fake chains and a fake SerpAPI"""
+    pytest.importorskip("langgraph")
+    httpx = pytest.importorskip("httpx")
+    import tools.search_tool as search_tool
+    from langflow.graph import WebSearchWorkflow
+    from langflow.registry import ComponentRegistry
+
+    class FakeGoogleSearch:
+        calls = 0
+
+        def __init__(self, params):
+            self.params = params
+
+        def get_dict(self):
+            FakeGoogleSearch.calls += 1
+            return fake_serpapi_results(self.params["q"])
+
+    monkeypatch.setattr(search_tool, "GoogleSearch", FakeGoogleSearch)
+    # Exercise the LLM rewrite path; the rule-based fast path has its own tests
+    monkeypatch.setenv("QUERY_FAST_PATH_ENABLED", "false")
+    # Exercise answer generation; the answer cache has its own tests
+    monkeypatch.setenv("ANSWER_CACHE_BACKEND", "none")
+
+    workflow = WebSearchWorkflow(registry=ComponentRegistry())
+    workflow.query_agent.chain = FakeChain(
+        lambda inputs: inputs["user_question"].lower()
+    )
+    workflow.answer_agent.chain = FakeChain("fake answer")
+    workflow.answer_agent.stream_chain = FakeChain("  streamed fake answer")
+
+    def handler(request):
+        return httpx.Response(200, json=fake_serpapi_results(request.url.params["q"]))
+
+    workflow.search_tool.transport = httpx.MockTransport(handler)
+    return workflow
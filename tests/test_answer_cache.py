@@ -0,0 +1,102 @@
+"""
+Test the answer cache keyed on question plus search-result fingerprint
+"""
+
+import asyncio
+
+from agents.answer_cache import AnswerCache, evidence_fingerprint
+from tests.conftest import FakeChain, fake_serpapi_results
+from tools.cache import MemoryCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+RESULTS = "Search Results:\n\n1. Title\n   Snippet one.\n   Source: https://a.example"
+
+
+def test_fingerprint_tracks_urls_and_snippets():
+    """Any change to a URL or snippet changes the fingerprint"""
+    assert evidence_fingerprint(RESULTS) == evidence_fingerprint(
+        RESULTS.replace("Title", "Other title")
+    )
+    assert evidence_fingerprint(RESULTS) != evidence_fingerprint(
+        RESULTS.replace("one", "two")
+    )
+    assert evidence_fingerprint(RESULTS) != evidence_fingerprint(
+        RESULTS.replace("a.example", "b.example")
+    )
+
+
+def test_hit_reports_age_and_misses_on_new_evidence():
+    """Same question and evidence hit; changed evidence misses"""
+    clock = FakeClock()
+    cache = AnswerCache(MemoryCache(), clock=clock)
+    cache.set("What is MCP?", RESULTS, "MCP is a protocol.")
+    clock.now += 42
+
+    assert cache.get("what is mcp", RESULTS) == ("MCP is a protocol.", 42)
+    assert cache.get("What is MCP?", RESULTS.replace("one", "two")) is None
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_errors_are_not_cached():
+    """Failed searches and failed answers never populate the cache"""
+    cache = AnswerCache(MemoryCache())
+    cache.set("q", "Error performing search: boom", "answer")
+    cache.set("q", RESULTS, "Error generating answer: boom")
+
+    assert len(cache.backend) == 0
+
+
+def test_workflow_skips_answer_generation_for_unchanged_evidence(offline_workflow):
+    """The second run is served from the cache and reports its age"""
+    offline_workflow.answer_cache = AnswerCache(MemoryCache())
+
+    first = offline_workflow.run("What is MCP?")
+    second = asyncio.run(offline_workflow.arun("what is MCP"))
+
+    assert first["metadata"]["answer_cache"] == {"hit": False, "hit_rate": 0.0}
+    assert second["content"] == first["content"]
+    assert second["metadata"]["answer_cache"]["hit"] is True
+    assert second["metadata"]["answer_cache"]["age_seconds"] >= 0
+    assert second["metadata"]["answer_cache"]["hit_rate"] == 0.5
+    assert offline_workflow.answer_agent.chain.calls == 1
+
+
+def test_workflow_regenerates_when_results_change(offline_workflow, monkeypatch):
+    """A changed search result invalidates the cached answer"""
+    import tools.search_tool as search_tool
+
+    offline_workflow.answer_cache = AnswerCache(MemoryCache())
+    offline_workflow.search_tool.cache = None
+    offline_workflow.run("What is MCP?")
+
+    class ChangedSearch(search_tool.GoogleSearch):
+        def get_dict(self):
+            results = fake_serpapi_results(self.params["q"])
+            results["organic_results"][0]["snippet"] = "Breaking: updated snippet."
+            return results
+
+    monkeypatch.setattr(search_tool, "GoogleSearch", ChangedSearch)
+    result = offline_workflow.run("What is MCP?")
+
+    assert result["metadata"]["answer_cache"]["hit"] is False
+    assert offline_workflow.answer_agent.chain.calls == 2
+
+
+def test_streaming_emits_cached_answer(offline_workflow):
+    """A cache hit streams the whole answer as one token"""
+    offline_workflow.answer_cache = AnswerCache(MemoryCache())
+    offline_workflow.answer_agent.stream_chain = FakeChain("streamed answer")
+    list(offline_workflow.stream("What is MCP?"))
+
+    events = list(offline_workflow.stream("What is MCP?"))
+
+    assert [e["type"] for e in events] == ["token", "result"]
+    assert events[-1]["content"] == "streamed answer "
@@ -0,0 +1,42 @@
+"""
+Test the asyncio execution path through WebSearchWorkflow
+"""
+
+import asyncio
+import time
+
+from tests.conftest import FakeChain
+
+
+def test_sync_and_async_paths_agree(offline_workflow):
+    """run() and arun() produce the same result"""
+    sync_result = offline_workflow.run("What is MCP?")
+    async_result = asyncio.run(offline_workflow.arun("What is MCP?"))
+
+    # Per-request timings naturally differ between runs
+    sync_result["metadata"].pop("timings")
+    async_result["metadata"].pop("timings")
+    assert sync_result == async_result
+    assert async_result["content"] == "fake answer"
+    assert async_result["metadata"]["search_query"] == "what is mcp?"
+    assert async_result["metadata"]["success"] is True
+
+
+def test_arun_serves_questions_concurrently(offline_workflow):
+    """Concurrent arun() calls overlap their LLM waits on one event loop"""
+    offline_workflow.query_agent.chain = FakeChain(
+        lambda inputs: inputs["user_question"], delay=0.1
+    )
+    offline_workflow.answer_agent.chain = FakeChain("fake answer", delay=0.1)
+
+    async def run_all():
+        questions = [f"question {i}" for i in range(50)]
+        return await asyncio.gather(*(offline_workflow.arun(q) for q in questions))
+
+    start = time.perf_counter()
+    results = asyncio.run(run_all())
+    elapsed = time.perf_counter() - start
+
+    assert all(r["metadata"]["success"] for r in results)
+    # 50 sequential runs would take >= 10s
+    assert elapsed < 3
@@ -0,0 +1,68 @@
+"""
+Test the batch question API
+"""
+
+import asyncio
+import time
+
+from tests.conftest import FakeChain
+
+
+def test_run_batch_returns_every_question(offline_workflow):
+    """Every question gets a result tagged with its input position"""
+    questions = [f"Question {i}?" for i in range(20)]
+
+    results = list(offline_workflow.run_batch(questions, max_concurrency=4))
+
+    assert sorted(r["metadata"]["batch_index"] for r in results) == list(range(20))
+    assert all(r["content"] == "fake answer" for r in results)
+    for result in results:
+        question = questions[result["metadata"]["batch_index"]]
+        assert result["metadata"]["search_query"] == question.lower()
+
+
+def test_batch_item_errors_do_not_fail_batch(offline_workflow):
+    """A failing item is reported in place while the rest succeed"""
+    answer_batch = offline_workflow.answer_agent.abatch
+
+    async def flaky_answers(items, max_concurrency=8, mode=None):
+        if any("bad" in question for _, question in items):
+            raise RuntimeError("answer exploded")
+        return await answer_batch(items, max_concurrency, mode)
+
+    offline_workflow.answer_agent.abatch = flaky_answers
+
+    results = list(
+        offline_workflow.run_batch(["good one", "bad one", "good two"], batch_size=1)
+    )
+
+    by_index = {r["metadata"]["batch_index"]: r for r in results}
+    assert by_index[1]["metadata"]["success"] is False
+    assert "answer exploded" in by_index[1]["content"]
+    assert by_index[0]["metadata"]["success"] is True
+    assert by_index[2]["metadata"]["success"] is True
+
+
+def test_batch_throughput_scales_with_concurrency(offline_workflow):
+    """Higher concurrency limits shorten a latency-bound batch"""
+    offline_workflow.query_agent.chain = FakeChain(
+        lambda inputs: inputs["user_question"], delay=0.05
+    )
+    offline_workflow.answer_agent.chain = FakeChain("fake answer", delay=0.05)
+
+    async def timed(concurrency, offset):
+        questions = [f"question {offset + i}" for i in range(32)]
+        start = time.perf_counter()
+        results = [
+            r
+            async for r in offline_workflow.arun_batch(
+                questions, max_concurrency=concurrency
+            )
+        ]
+        assert len(results) == 32
+        return time.perf_counter() - start
+
+    slow = asyncio.run(timed(1, 0))
+    fast = asyncio.run(timed(16, 100))
+
+    assert fast < slow / 4
@@ -0,0 +1,100 @@
+"""
+Test the offline benchmark suite and its fake backends
+"""
+
+import json
+import os
+
+import pytest
+
+
+def test_percentile_nearest_rank():
+    from benchmarks.run import percentile
+
+    samples = list(range(1, 101))
+    assert percentile(samples, 50) == 50
+    assert percentile(samples, 95) == 95
+    assert percentile(samples, 99) == 99
+    assert percentile([], 50) == 0.0
+
+
+def test_latency_model_is_reproducible():
+    from benchmarks.fakes import LatencyModel
+
+    first = [LatencyModel(100, seed=7).sample() for _ in range(3)]
+    second = [LatencyModel(100, seed=7).sample() for _ in range(3)]
+    assert first == second
+    assert LatencyModel(100, jitter=0).sample() == (0.1, False)
+    assert LatencyModel(0, error_rate=1.0).sample()[1] is True
+
+
+def test_benchmark_reports_every_path(tmp_path):
+    """A zero-latency run covers all paths and stores a comparable report"""
+    pytest.importorskip("langgraph")
+    pytest.importorskip("httpx")
+    from benchmarks.run import PATHS, compare, main
+
+    output = tmp_path / "report.json"
+    exit_code = main(
+        [
+            "--iterations",
+            "3",
+            "--warmup",
+            "0",
+            "--alloc-iterations",
+            "1",
+            "--latency-scale",
+            "0",
+            "--output",
+            str(output),
+        ]
+    )
+
+    report = json.loads(output.read_text())
+    assert exit_code == 0
+    assert set(report["results"]) == set(PATHS)
+    for result in report["results"].values():
+        assert result["requests"] == 3
+        assert result["throughput_rps"] > 0
+        assert result["error_rate"] == 0
+        assert set(result["latency_ms"]) >= {"p50", "p95", "p99"}
+        assert "search" in result["stages_ms"]
+        assert result["allocations"]["peak_kib"] > 0
+
+    slower = json.loads(output.read_text())
+    slower["results"]["sync"]["latency_ms"]["p95"] *= 2
+    assert compare(slower, report, threshold=20) == [
+        f"sync p95: {report['results']['sync']['latency_ms']['p95']:.1f}ms -> "
+        f"{slower['results']['sync']['latency_ms']['p95']:.1f}ms"
+    ]
+    assert os.environ.get("SEARCH_CACHE_BACKEND") != "none"
+
+
+def test_injected_errors_surface_in_results(tmp_path):
+    """With every backend failing, the workflow still returns error results"""
+    pytest.importorskip("langgraph")
+    from benchmarks.run import main
+
+    output = tmp_path / "report.json"
+    assert (
+        main(
+            [
+                "--paths",
+                "sync",
+                "--iterations",
+                "2",
+                "--warmup",
+                "0",
+                "--alloc-iterations",
+                "0",
+                "--latency-scale",
+                "0",
+                "--error-rate",
+                "1",
+                "--output",
+                str(output),
+            ]
+        )
+        == 0
+    )
+    assert json.loads(output.read_text())["results"]["sync"]["error_rate"] == 1.0
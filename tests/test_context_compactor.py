@@ -0,0 +1,127 @@
+"""
+Test snippet deduplication and token-budgeted context compaction
+"""
+
+from tests.conftest import FakeChain
+from tools.context_compactor import ContextCompactor, estimate_tokens
+
+
+def formatted(results):
+    """Render (title, snippet, link) tuples like SearchTool._format_results"""
+    text = "Search Results:\n\n"
+    for i, (title, snippet, link) in enumerate(results, 1):
+        text += f"{i}. {title}\n   {snippet}\n   Source: {link}\n\n"
+    return text.strip()
+
+
+SYNDICATED = "OpenAI announced a new reasoning model on Tuesday, promising faster responses for developers"
+
+RESULTS = formatted(
+    [
+        ("OpenAI unveils new model", SYNDICATED + ". Read more", "https://a.example"),
+        ("OpenAI launches model - Wire", SYNDICATED + " ...", "https://b.example"),
+        (
+            "Python 3.14 released",
+            "The Python team shipped 3.14 with free-threading improvements.",
+            "https://c.example",
+        ),
+        (
+            "Reasoning model pricing",
+            "Pricing for the OpenAI reasoning model starts at $2 per million tokens.",
+            "https://d.example",
+        ),
+    ]
+)
+
+
+def test_near_duplicates_and_boilerplate_removed():
+    """Syndicated snippets collapse to one and furniture text is stripped"""
+    compacted, stats = ContextCompactor(token_budget=0).compact(
+        RESULTS, "new OpenAI model"
+    )
+
+    assert stats["duplicates_removed"] == 1
+    assert stats["tokens_saved"] > 0
+    assert "https://b.example" not in compacted
+    assert "Read more" not in compacted
+    assert compacted.startswith("Search Results:\n\n1. OpenAI unveils new model")
+    assert "3. Reasoning model pricing" in compacted
+
+
+def test_sentences_mentioning_calls_to_action_survive():
+    """Only trailing call-to-action fragments are furniture, not sentences that use the words"""
+    results = formatted(
+        [
+            (
+                "Rate outlook",
+                "Analysts expect to see more rate cuts in 2025, the report said.",
+                "https://a.example",
+            ),
+            (
+                "Sleep study",
+                "Students learn more effectively when sleep is adequate. Learn more »",
+                "https://b.example",
+            ),
+            (
+                "Transit pass",
+                "Residents must sign up for the new transit pass before March. Subscribe now!",
+                "https://c.example",
+            ),
+        ]
+    )
+
+    compacted, _ = ContextCompactor(token_budget=0).compact(
+        results, "rate cuts sleep transit"
+    )
+
+    assert (
+        "Analysts expect to see more rate cuts in 2025, the report said." in compacted
+    )
+    assert "Students learn more effectively when sleep is adequate." in compacted
+    assert "Residents must sign up for the new transit pass before March." in compacted
+    assert "Learn more »" not in compacted
+    assert "Subscribe now" not in compacted
+
+
+def test_budget_keeps_most_relevant_results():
+    """Under a tight budget the off-topic result is dropped first"""
+    compactor = ContextCompactor(token_budget=80)
+
+    compacted, stats = compactor.compact(
+        RESULTS, "What does the OpenAI reasoning model cost?"
+    )
+
+    assert estimate_tokens(compacted) <= compactor.token_budget
+    assert "Python 3.14" not in compacted
+    assert "Pricing for the OpenAI reasoning model" in compacted
+    assert stats["results_trimmed"] >= 1
+
+
+def test_errors_pass_through():
+    """Non-result text is left alone"""
+    compactor = ContextCompactor()
+
+    assert (
+        compactor.compact("No search results found.", "q")[0]
+        == "No search results found."
+    )
+    assert (
+        compactor.compact("Error performing search: boom", "q")[0]
+        == "Error performing search: boom"
+    )
+    assert compactor.stats()["requests"] == 2
+
+
+def test_workflow_reports_tokens_saved(offline_workflow):
+    """Compaction stats appear in run() metadata and cumulative counters"""
+    seen = []
+    offline_workflow.answer_agent.chain = FakeChain(
+        lambda inputs: seen.append(inputs) or "fake answer"
+    )
+
+    result = offline_workflow.run("What is MCP?")
+
+    context = result["metadata"]["context"]
+    assert context["tokens_after"] <= context["tokens_before"]
+    assert "Snippet 5 about what is mcp?" in str(seen[0])
+    assert offline_workflow.compaction_stats()["requests"] == 1
@@ -0,0 +1,104 @@
+"""
+Test per-request deadlines, stage cuts and partial results
+"""
+
+import asyncio
+import threading
+import time
+
+from tests.conftest import FakeChain
+from tools.deadline import Deadline
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_deadline_tracks_remaining_time_and_cut_stages():
+    clock = FakeClock()
+    deadline = Deadline(500, clock=clock)
+
+    clock.now += 0.2
+    assert round(deadline.remaining(), 3) == 0.3 and not deadline.expired()
+    clock.now += 0.3
+    deadline.cut("answer_generation")
+    deadline.cut("answer_generation")
+
+    assert deadline.expired() and deadline.remaining() == 0
+    assert deadline.to_dict() == {
+        "deadline_ms": 500.0,
+        "elapsed_ms": 500.0,
+        "cut_stages": ["answer_generation"],
+    }
+    assert Deadline.start(None) is None and Deadline.start(0) is None
+
+
+def test_hung_answer_returns_raw_snippets_on_time(offline_workflow):
+    release = threading.Event()
+    offline_workflow.answer_agent.chain = FakeChain(
+        lambda inputs: release.wait(5) and "late answer"
+    )
+
+    try:
+        start = time.perf_counter()
+        result = offline_workflow.run("What is MCP?", deadline_ms=300)
+        elapsed = time.perf_counter() - start
+    finally:
+        release.set()
+
+    assert elapsed < 1.5
+    assert result["content"].startswith(
+        "Answer generation timed out; top search results:"
+    )
+    assert "Source: https://example.com/3" in result["content"]
+    assert "https://example.com/4" not in result["content"]
+    assert result["metadata"]["deadline"]["cut_stages"] == ["answer_generation"]
+    assert result["metadata"]["answer_mode"] == "partial"
+    assert offline_workflow.deadline_stats()["cuts"] == {"answer_generation": 1}
+
+
+def test_hung_rewrite_is_cancelled_and_the_raw_question_searched(offline_workflow):
+    offline_workflow.query_agent.chain = FakeChain("never used", delay=5)
+
+    start = time.perf_counter()
+    result = asyncio.run(offline_workflow.arun("What is MCP?", deadline_ms=1000))
+
+    assert time.perf_counter() - start < 1.5
+    assert result["metadata"]["search_query"] == "What is MCP?"
+    assert result["metadata"]["deadline"]["cut_stages"] == ["query_processing"]
+    # The rewrite only gets a share of the deadline; search and answer still run
+    assert result["content"] == "fake answer"
+    assert offline_workflow.deadline_stats()["cut_requests"] == 1
+
+
+def test_streamed_answer_keeps_tokens_sent_before_the_cut(offline_workflow):
+    offline_workflow.answer_agent.stream_chain = FakeChain(
+        "one two three four five six", delay=0.3
+    )
+
+    async def collect():
+        return [
+            event
+            async for event in offline_workflow.astream(
+                "What is MCP?", deadline_ms=1000
+            )
+        ]
+
+    events = asyncio.run(collect())
+    tokens = [event["content"] for event in events if event["type"] == "token"]
+
+    assert 0 < len(tokens) < 6
+    assert events[-1]["content"] == "".join(tokens)
+    assert events[-1]["metadata"]["deadline"]["cut_stages"] == ["answer_generation"]
+
+
+def test_runs_without_a_deadline_are_unbounded(offline_workflow):
+    result = offline_workflow.run("What is MCP?")
+
+    assert result["content"] == "fake answer"
+    assert "deadline" not in result["metadata"]
+    assert offline_workflow.deadline_stats()["requests"] == 0
@@ -0,0 +1,180 @@
+"""
+Test the extractive answer mode, the answer circuit breaker and the LLM fallback
+"""
+
+import asyncio
+
+import pytest
+
+from agents.extractive_answerer import NO_ANSWER, ExtractiveAnswerer
+from tools.circuit_breaker import CircuitBreaker
+
+
+def format_results(*results):
+    lines = ["Search Results:", ""]
+    for rank, (title, snippet, link) in enumerate(results, 1):
+        lines += [f"{rank}. {title}", f"   {snippet}", f"   Source: {link}", ""]
+    return "\n".join(lines)
+
+
+RESULTS = format_results(
+    (
+        "Python release history",
+        "Python is a popular language. Python 3.12 was released in October 2023 with faster comprehensions.",
+        "https://example.com/history",
+    ),
+    (
+        "Snakes of the world",
+        "The python is a large snake found in Africa and Asia. Click here to subscribe.",
+        "https://example.com/snakes",
+    ),
+    (
+        "Python 3.12 notes",
+        "The 3.12 release was published in October 2023 by the core team.",
+        "https://example.com/notes",
+    ),
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FailingChain:
+    calls = 0
+
+    def invoke(self, inputs, config=None):
+        FailingChain.calls += 1
+        raise RuntimeError("503 Service Unavailable")
+
+    async def ainvoke(self, inputs, config=None):
+        return self.invoke(inputs)
+
+    def stream(self, inputs, config=None):
+        raise RuntimeError("503 Service Unavailable")
+        yield
+
+
+def test_ranks_relevant_sentences_with_citations():
+    answer = ExtractiveAnswerer(max_sentences=2).answer(
+        RESULTS, "When was Python 3.12 released?"
+    )
+
+    body, sources = answer.split("\n\nSources:\n")
+    assert body.startswith("Python 3.12 was released in October 2023")
+    assert "[1]" in body and "[2]" in body
+    assert "snake" not in body
+    assert sources.splitlines() == [
+        "[1] https://example.com/history",
+        "[2] https://example.com/notes",
+    ]
+
+
+def test_unmatched_question_falls_back_to_top_result():
+    answer = ExtractiveAnswerer(max_sentences=1).answer(RESULTS, "zzz qqq")
+    assert answer.startswith("Python is a popular language. [1]")
+
+    assert (
+        ExtractiveAnswerer().answer("Search error: quota exceeded", "anything")
+        == NO_ANSWER
+    )
+
+
+def test_sentences_using_call_to_action_words_are_kept():
+    """'see more' inside a sentence is evidence; only the trailing link text is dropped"""
+    results = format_results(
+        (
+            "Rate outlook",
+            "Analysts see more rate cuts coming in 2025 as inflation cools. See more »",
+            "https://example.com/rates",
+        ),
+    )
+
+    answer = ExtractiveAnswerer(max_sentences=2).answer(
+        results, "Will there be more rate cuts in 2025?"
+    )
+
+    assert answer.startswith(
+        "Analysts see more rate cuts coming in 2025 as inflation cools. [1]"
+    )
+    assert "»" not in answer
+
+
+def test_breaker_opens_on_failures_and_recovers_after_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(
+        "test", failure_ratio=0.5, min_calls=4, open_seconds=10, clock=clock
+    )
+
+    for _ in range(2):
+        breaker.record_success(0.1)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.stats()["state"] == "open"
+    assert not breaker.allow()
+
+    clock.now = 10
+    assert breaker.allow()
+    # Only one probe at a time while half-open
+    assert not breaker.allow()
+    breaker.record_success(0.1)
+    assert breaker.stats()["state"] == "closed"
+    assert breaker.stats()["opened"] == 1
+
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker("test", min_calls=2, latency_threshold_ms=100)
+    breaker.record_success(0.5)
+    breaker.record_success(0.5)
+    assert breaker.stats()["state"] == "open"
+
+
+def test_explicit_extractive_mode_skips_gemini(offline_workflow):
+    result = offline_workflow.run("What is MCP?", answer_mode="extractive")
+
+    assert result["metadata"]["answer_mode"] == "extractive"
+    assert "answer_fallback" not in result["metadata"]
+    assert "Sources:\n[1] https://example.com/" in result["content"]
+    assert offline_workflow.answer_agent.chain.calls == 0
+
+
+def test_llm_error_falls_back_to_extractive(offline_workflow):
+    offline_workflow.answer_agent.chain = FailingChain()
+    offline_workflow.answer_agent.resilience.max_attempts = 1
+
+    result = asyncio.run(offline_workflow.arun("What is MCP?"))
+
+    assert result["metadata"]["answer_mode"] == "extractive"
+    assert result["metadata"]["answer_fallback"] == "llm_error"
+    assert result["content"].startswith("Snippet 1 about")
+
+
+def test_open_breaker_routes_around_gemini(offline_workflow):
+    agent = offline_workflow.answer_agent
+    agent.chain = FailingChain()
+    agent.stream_chain = FailingChain()
+    agent.resilience.max_attempts = 1
+    agent.breaker = CircuitBreaker("gemini.answer", min_calls=2)
+    FailingChain.calls = 0
+
+    for question in ("first question", "second question", "third question"):
+        offline_workflow.run(question)
+    assert FailingChain.calls == 2
+
+    events = list(offline_workflow.stream("fourth question"))
+    result = events[-1]
+    assert result["metadata"]["answer_fallback"] == "breaker_open"
+    assert [e["content"] for e in events[:-1]] == [result["content"]]
+    assert offline_workflow.answer_mode_stats()["fallbacks"] == {
+        "llm_error": 2,
+        "breaker_open": 2,
+    }
+
+
+def test_unknown_mode_is_rejected(offline_workflow):
+    with pytest.raises(ValueError):
+        offline_workflow.answer_agent.select_mode("fastest")
@@ -0,0 +1,152 @@
+"""
+Test multi-query fan-out: query expansion, parallel searches and reciprocal-rank fusion
+"""
+
+import asyncio
+import time
+
+from tools.rank_fusion import canonical_url, reciprocal_rank_fusion
+from tools.search_results import SearchResult
+
+QUERIES = ["model context protocol", "mcp specification", "mcp servers tools"]
+
+
+def result(link, title="title"):
+    return SearchResult(title, "snippet", link)
+
+
+def test_canonical_url_ignores_presentation_differences():
+    assert (
+        canonical_url("https://www.Example.com/docs/?utm_source=x&b=2&a=1#intro")
+        == "example.com/docs?a=1&b=2"
+    )
+    assert canonical_url("http://example.com/docs") == canonical_url(
+        "https://example.com/docs/"
+    )
+    assert canonical_url("https://example.com/a") != canonical_url(
+        "https://example.com/b"
+    )
+
+
+def test_rrf_rewards_results_found_by_several_queries():
+    fused = reciprocal_rank_fusion(
+        [
+            [result("https://a.com"), result("https://b.com"), result("https://c.com")],
+            [result("https://www.c.com/"), result("https://d.com")],
+            [result("https://c.com?utm_medium=email"), result("https://b.com")],
+        ]
+    )
+
+    # c.com keeps the record from its best (first-place) appearance
+    assert [r.link for r in fused] == [
+        "https://www.c.com/",
+        "https://b.com",
+        "https://a.com",
+        "https://d.com",
+    ]
+    assert (
+        len(
+            reciprocal_rank_fusion(
+                [[result("https://a.com")], [result("https://b.com")]], limit=1
+            )
+        )
+        == 1
+    )
+
+
+def test_query_expansion_parses_and_caches(offline_workflow):
+    from agents.query_agent import SearchQueriesParser
+    from tests.conftest import FakeChain
+
+    assert SearchQueriesParser().parse(
+        '1. "mcp spec"\n- MCP spec\n\n* mcp servers'
+    ) == ["mcp spec", "mcp servers"]
+
+    agent = offline_workflow.query_agent
+    agent.expansion_chain = FakeChain(QUERIES + ["extra query"])
+
+    assert agent.expand("What is MCP?", 3) == {
+        "content": QUERIES[0],
+        "queries": QUERIES,
+    }
+    assert agent.expand("what is mcp", 3)["queries"] == QUERIES
+    assert agent.expansion_chain.calls == 1
+    # The best query also serves single-query rewrites
+    assert agent("What is MCP?")["content"] == QUERIES[0]
+
+
+def test_fanout_searches_in_parallel_and_fuses(offline_workflow):
+    import httpx
+
+    from tests.conftest import FakeChain, fake_serpapi_results
+
+    offline_workflow.fanout = 3
+    offline_workflow.query_agent.expansion_chain = FakeChain(QUERIES)
+    searched = []
+
+    async def handler(request):
+        searched.append(request.url.params["q"])
+        await asyncio.sleep(0.2)
+        return httpx.Response(200, json=fake_serpapi_results(request.url.params["q"]))
+
+    offline_workflow.search_tool.transport = httpx.MockTransport(handler)
+
+    start = time.perf_counter()
+    result = asyncio.run(offline_workflow.arun("What is MCP?"))
+    elapsed = time.perf_counter() - start
+
+    assert sorted(searched) == sorted(QUERIES)
+    assert elapsed < 0.5
+    assert result["metadata"]["search_queries"] == QUERIES
+    # Every query returns example.com/1-5, so fusion leaves five unique results
+    assert result["metadata"]["fanout"] == {
+        "queries": 3,
+        "failed": 0,
+        "results": 15,
+        "unique": 5,
+    }
+    assert result["content"] == "fake answer"
+
+
+def test_failed_fanout_search_is_skipped(offline_workflow, monkeypatch):
+    import tools.search_tool as search_tool
+    from tests.conftest import FakeChain
+
+    offline_workflow.fanout = 3
+    offline_workflow.query_agent.expansion_chain = FakeChain(QUERIES)
+    offline_workflow.search_tool.resilience.max_attempts = 1
+    working = search_tool.GoogleSearch
+
+    class PartlyFailingSearch(working):
+        def get_dict(self):
+            if self.params["q"] == QUERIES[1]:
+                raise ConnectionError("connection reset")
+            return super().get_dict()
+
+    monkeypatch.setattr(search_tool, "GoogleSearch", PartlyFailingSearch)
+    result = offline_workflow.run("What is MCP?")
+
+    assert result["metadata"]["fanout"]["failed"] == 1
+    assert result["metadata"]["fanout"]["results"] == 10
+    assert result["metadata"]["success"]
+
+
+def test_expansion_failure_falls_back_to_single_query(offline_workflow):
+    class BrokenChain:
+        def invoke(self, inputs, config=None):
+            raise ValueError("bad response")
+
+    offline_workflow.fanout = 3
+    offline_workflow.query_agent.expansion_chain = BrokenChain()
+
+    result = offline_workflow.run("What is MCP?")
+
+    assert "search_queries" not in result["metadata"]
+    assert result["metadata"]["search_query"] == "What is MCP?"
+    assert result["content"] == "fake answer"
+
+
+def test_fanout_disabled_by_default(offline_workflow):
+    assert offline_workflow.fanout == 1
+    result = offline_workflow.run("What is MCP?")
+    assert "fanout" not in result["metadata"]
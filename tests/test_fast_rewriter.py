@@ -0,0 +1,82 @@
+"""
+Test the rule-based fast-path query rewriter
+"""
+
+from datetime import date
+
+import pytest
+
+from agents.fast_rewriter import FastRewriter
+from agents.rewrite_cache import RewriteCache
+from tests.conftest import FakeChain
+
+
+def fixed_today():
+    return date(2025, 7, 15)
+
+
+@pytest.mark.parametrize(
+    "question, expected",
+    [
+        ("What's new with OpenAI this month?", "latest OpenAI July 2025"),
+        (
+            "Latest developments in AI safety research",
+            "latest developments AI safety research 2025",
+        ),
+        ("Tell me about the Eiffel Tower", "Eiffel Tower"),
+        ("How to install Python 3.12 on Mac", "install Python 3.12 Mac"),
+        ("Python releases in 2024", "Python releases 2024"),
+    ],
+)
+def test_simple_questions_take_the_fast_path(question, expected):
+    """Simple questions are rewritten locally"""
+    assert FastRewriter(today=fixed_today).rewrite(question) == expected
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "Compare React vs Vue for large enterprise apps",
+        "Why did the stock market crash in 2008?",
+        "Which laptops are good for gaming but not expensive and light and quiet?",
+    ],
+)
+def test_complex_questions_defer_to_llm(question):
+    """Comparison, reasoning and multi-constraint questions go to Gemini"""
+    assert FastRewriter(today=fixed_today).rewrite(question) is None
+
+
+@pytest.mark.parametrize(
+    "question, expected",
+    [
+        ("What is the population of New York?", "population New York"),
+        ("New Zealand capital city", "New Zealand capital city"),
+        ("Weather in New Delhi", "Weather New Delhi"),
+    ],
+)
+def test_names_starting_with_recency_words_are_kept(question, expected):
+    """A place name starting with New is not a recency cue, and such names go to the LLM"""
+    rewriter = FastRewriter(today=fixed_today)
+
+    assert rewriter.analyze(question)[0] == expected
+    assert rewriter.rewrite(question) is None
+
+
+def test_query_agent_reports_paths(api_keys):
+    """QueryAgent counts cache, rule and LLM rewrites"""
+    pytest.importorskip("langchain_google_genai")
+    from agents.query_agent import QueryAgent
+
+    agent = QueryAgent(
+        rewrite_cache=RewriteCache(), fast_rewriter=FastRewriter(today=fixed_today)
+    )
+    agent.chain = FakeChain("react vue comparison")
+
+    assert agent("Tell me about the Eiffel Tower")["content"] == "Eiffel Tower"
+    assert agent("Compare React vs Vue")["content"] == "react vue comparison"
+    assert agent("Compare React vs Vue")["content"] == "react vue comparison"
+
+    stats = agent.path_stats()
+    assert (stats["rules"], stats["llm"], stats["cache"]) == (1, 1, 1)
+    assert stats["llm_calls_saved"] == 2
+    assert agent.chain.calls == 1
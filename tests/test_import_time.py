@@ -0,0 +1,74 @@
+"""
+Guard the cold-start cost of importing the server module
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Generous default so shared CI runners don't flake; tighten locally via env
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", 500))
+
+HEAVY_MODULES = [
+    "langchain",
+    "langchain_core",
+    "langchain_google_genai",
+    "langgraph",
+    "serpapi",
+    "mcp",
+    "httpx",
+    "redis",
+]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import server, main
+elapsed_ms = (time.perf_counter() - start) * 1000
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"elapsed_ms": elapsed_ms, "heavy": heavy}}))
+"""
+
+
+def _probe_import():
+    """Import server/main in a fresh interpreter without API keys"""
+    env = {
+        k: v
+        for k, v in os.environ.items()
+        if k not in ("GEMINI_API_KEY", "SERPAPI_KEY")
+    }
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE.format(heavy=HEAVY_MODULES)],
+        cwd=PROJECT_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def test_import_has_no_side_effects():
+    """Importing server neither needs API keys nor loads heavy dependencies"""
+    result = _probe_import()
+
+    assert result["heavy"] == []
+
+
+@pytest.mark.skipif(
+    os.getenv("SKIP_IMPORT_BENCHMARK") == "1", reason="import benchmark disabled"
+)
+def test_import_time_budget():
+    """Importing server and main stays within the cold-start budget"""
+    # Best of three to smooth out filesystem cache noise
+    elapsed_ms = min(_probe_import()["elapsed_ms"] for _ in range(3))
+
+    assert (
+        elapsed_ms < IMPORT_BUDGET_MS
+    ), f"import took {elapsed_ms:.0f}ms (budget {IMPORT_BUDGET_MS:.0f}ms)"
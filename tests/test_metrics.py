@@ -0,0 +1,123 @@
+"""
+Test Prometheus instrumentation and the /metrics endpoint
+"""
+
+import socket
+import urllib.request
+
+import pytest
+
+prometheus_client = pytest.importorskip("prometheus_client")
+
+from prometheus_client import REGISTRY
+
+from tools import metrics
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_workflow_records_stage_and_serpapi_metrics(offline_workflow):
+    """Each node lands in the stage histogram; network searches are counted"""
+    stages = (
+        "query_processing",
+        "web_search",
+        "context_compaction",
+        "answer_generation",
+    )
+    before = {
+        stage: sample("mcp_stage_duration_seconds_count", stage=stage)
+        for stage in stages
+    }
+    searches = sample("mcp_serpapi_calls_total", status="success")
+    runs = sample("mcp_workflow_duration_seconds_count", method="run")
+
+    offline_workflow.run("What is MCP?")
+    offline_workflow.run("What is MCP?")
+
+    for stage in stages:
+        assert (
+            sample("mcp_stage_duration_seconds_count", stage=stage) - before[stage] == 2
+        )
+    # The second search is served from the result cache
+    assert sample("mcp_serpapi_calls_total", status="success") - searches == 1
+    assert sample("mcp_workflow_duration_seconds_count", method="run") - runs == 2
+    assert sample("mcp_workflow_in_flight", method="run") == 0
+
+
+def test_component_counters_are_collected(offline_workflow):
+    """Cache hit/miss counters come from the components' stats()"""
+    offline_workflow.run("What is MCP?")
+    offline_workflow.run("What is MCP?")
+
+    assert sample("mcp_cache_hits_total", cache="search") >= 1
+    assert sample("mcp_cache_misses_total", cache="search") >= 1
+    assert sample("mcp_query_rewrites_total", path="llm") >= 1
+
+
+def test_token_usage_callback_counts_tokens():
+    """Token counts fall back to estimates when the model reports no usage"""
+    from langchain_core.language_models import FakeListChatModel
+
+    model = FakeListChatModel(responses=["a fairly short answer"]).with_config(
+        callbacks=[metrics.TokenUsageCallback("test_agent")]
+    )
+    before = sample("mcp_llm_tokens_total", agent="test_agent", direction="output")
+
+    model.invoke("A prompt that is long enough to count as several tokens")
+
+    assert sample("mcp_llm_calls_total", agent="test_agent", status="success") >= 1
+    assert (
+        sample("mcp_llm_tokens_total", agent="test_agent", direction="output") - before
+        > 0
+    )
+    assert sample("mcp_llm_tokens_total", agent="test_agent", direction="input") > 0
+
+
+def test_server_requests_and_metrics_endpoint(offline_workflow, monkeypatch):
+    """Server requests feed the alerting metrics, served over HTTP"""
+    from server import MCPWebSearchServer
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    monkeypatch.setenv("METRICS_PORT", str(port))
+    monkeypatch.setenv("METRICS_ADDR", "127.0.0.1")
+    monkeypatch.setattr(metrics, "_http_started", False)
+
+    server = MCPWebSearchServer(registry=offline_workflow.registry)
+    before = sample("http_requests_total", endpoint="process_question", status="200")
+    server.process_question("What is MCP?")
+    server.process_step_by_step("What is MCP?")
+
+    assert (
+        sample("http_requests_total", endpoint="process_question", status="200")
+        - before
+        == 1
+    )
+    assert (
+        sample("http_request_duration_seconds_count", endpoint="process_step_by_step")
+        >= 1
+    )
+
+    body = (
+        urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5)
+        .read()
+        .decode()
+    )
+    assert "http_request_duration_seconds_bucket" in body
+    assert 'mcp_stage_duration_seconds_bucket{le="0.005",stage="web_search"}' in body
+
+
+def test_failed_requests_count_as_500():
+    """A result with success=False is reported with status 500"""
+    before = sample("http_requests_total", endpoint="test_endpoint", status="500")
+
+    with metrics.track_request("test_endpoint") as request:
+        request.record({"content": "Workflow failed", "metadata": {"success": False}})
+
+    assert (
+        sample("http_requests_total", endpoint="test_endpoint", status="500") - before
+        == 1
+    )
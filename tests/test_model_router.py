@@ -0,0 +1,123 @@
+"""
+Test complexity-based model routing and per-request latency budgets
+"""
+
+import asyncio
+
+from tests.conftest import FakeChain
+from tools.model_router import ModelRouter, classify
+
+
+def test_classify_scores_length_entities_and_cues():
+    assert classify("What is MCP?")["level"] == "simple"
+    assert (
+        classify("Compare OpenAI GPT-4 and Anthropic Claude 3 for coding tasks")[
+            "comparison"
+        ]
+        is True
+    )
+
+    complex_question = classify(
+        "Why did Nvidia stock rise after the 2024 earnings report and how did AMD respond?"
+    )
+    assert complex_question["level"] == "complex"
+    assert complex_question["multi_hop"] is True
+    assert complex_question["entities"] == 3
+
+
+def test_routes_follow_complexity_when_enabled():
+    assert ModelRouter().route("What is MCP?") is None
+
+    router = ModelRouter(enabled=True)
+    simple = router.route("What is MCP?")
+    hard = router.route(
+        "Why did Nvidia stock rise after the 2024 earnings report and how did AMD respond?"
+    )
+
+    assert simple.to_dict()["tiers"] == {"rewrite": "fast", "answer": "fast"}
+    assert simple.stage("answer").max_output_tokens == 256
+    assert hard.stage("answer").tier == "deep"
+    assert hard.stage("answer").model == "gemini-2.5-flash"
+    assert router.stats()["routes"] == {"simple": 1, "moderate": 0, "complex": 1}
+
+
+def test_budget_downgrades_the_slowest_stage_first():
+    router = ModelRouter()
+    # Priors: search 800 + standard rewrite 400 + standard answer 1000 = 2200 ms
+    route = router.route("What is MCP?", budget_ms=2000)
+
+    assert route.to_dict()["tiers"] == {"rewrite": "standard", "answer": "fast"}
+    assert route.estimate_ms == 1800
+    assert route.answer_mode is None and not route.light
+
+
+def test_tight_budget_skips_optional_stages_then_answers_extractively():
+    router = ModelRouter()
+
+    light = router.route(
+        "What is MCP?", budget_ms=1700, optional_stages=("page_fetching",)
+    )
+    assert light.light and light.answer_mode is None
+
+    extractive = router.route(
+        "What is MCP?", budget_ms=500, optional_stages=("page_fetching",)
+    )
+    assert extractive.light and extractive.answer_mode == "extractive"
+    assert router.stats()["extractive"] == 1
+
+
+def test_observed_latency_and_cost_are_tracked_per_tier():
+    router = ModelRouter(alpha=0.5, prices={"fast": (1.0, 2.0)})
+    router.record("answer", "fast", 200, input_chars=4000, output_chars=400)
+    router.record("answer", "fast", 400)
+    router.observe("web_search", 100)
+
+    assert router.latency("answer", "fast") == 300
+    assert router.latency("web_search") == 100
+    fast = router.stats()["tiers"]["fast"]
+    assert fast["calls"] == 2
+    assert (fast["input_tokens"], fast["output_tokens"]) == (1000, 100)
+    assert fast["cost_usd"] == round((1000 * 1.0 + 100 * 2.0) / 1_000_000, 6)
+    assert fast["latency_ms"] == {"answer": 300}
+    # Observed latency replaces the prior in budget planning
+    assert (
+        router.route("What is MCP?", budget_ms=1000).to_dict()["tiers"]["answer"]
+        == "fast"
+    )
+
+
+def test_workflow_uses_routed_tiers(offline_workflow):
+    router = offline_workflow.router
+    router.enabled = True
+    offline_workflow.query_agent.routed_chains[("rewrite", "fast", 32)] = FakeChain(
+        lambda inputs: inputs["user_question"]
+    )
+    offline_workflow.answer_agent.routed_chains[("chain", "fast", 256)] = FakeChain(
+        "fast answer"
+    )
+
+    result = offline_workflow.run("What is MCP?")
+    async_result = asyncio.run(offline_workflow.arun("Who is Ada?"))
+
+    for outcome in (result, async_result):
+        assert outcome["content"] == "fast answer"
+        assert outcome["metadata"]["route"]["tiers"] == {
+            "rewrite": "fast",
+            "answer": "fast",
+        }
+    assert offline_workflow.answer_agent.chain.calls == 0
+    assert offline_workflow.router_stats()["tiers"]["fast"]["calls"] == 4
+
+
+def test_budget_too_small_for_gemini_answers_extractively(offline_workflow):
+    offline_workflow.query_agent.routed_chains[("rewrite", "fast", 32)] = FakeChain(
+        lambda inputs: inputs["user_question"]
+    )
+    result = offline_workflow.run("What is MCP?", budget_ms=1)
+
+    assert result["metadata"]["route"]["tiers"]["rewrite"] == "fast"
+    assert result["metadata"]["route"]["answer_mode"] == "extractive"
+    assert result["metadata"]["answer_mode"] == "extractive"
+    assert offline_workflow.answer_agent.chain.calls == 0
+    # Without a budget (and with routing off) nothing is routed
+    assert "route" not in offline_workflow.run("What is MCP?")["metadata"]
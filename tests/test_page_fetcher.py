@@ -0,0 +1,236 @@
+"""
+Test deep page fetching: main-text extraction, byte/time caps, concurrency and enrichment
+"""
+
+import asyncio
+import time
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from tools.page_fetcher import MainTextExtractor, Page, PageFetcher
+from tools.search_results import SearchResult, parse_results
+
+ARTICLE = (
+    "<html><head><title>MCP</title><script>var noise = 'tracking code here';</script></head><body>"
+    "<nav><a href='/'>Home</a> Products Pricing Documentation Blog Careers Contact</nav>"
+    "<article><h1>Model Context Protocol</h1>"
+    "<p>The Model Context Protocol is an open standard that connects language models to tools and data.</p>"
+    "<ul><li><a href='/a'>Related one</a> <a href='/b'>Related two</a> <a href='/c'>Related three</a> more</li></ul>"
+    "<p>Servers expose resources, prompts and tools over JSON-RPC so any compatible client can use them.</p>"
+    "</article><footer>Copyright 2024 Example Inc. All rights reserved. Privacy policy and terms.</footer>"
+    "</body></html>"
+)
+
+RESULTS = (
+    "Search Results:\n\n"
+    "1. MCP overview\n   Short snippet.\n   Source: https://docs.example.com/mcp\n\n"
+    "2. Unrelated\n   Another snippet.\n   Source: https://other.example.org/page\n\n"
+)
+
+
+def html_response(body, chunk_size=64, delay=0.0):
+    """Streamed HTML response served in chunks"""
+    data = body.encode("utf-8")
+
+    async def chunks():
+        for offset in range(0, len(data), chunk_size):
+            if delay:
+                await asyncio.sleep(delay)
+            yield data[offset : offset + chunk_size]
+
+    return httpx.Response(
+        200, headers={"content-type": "text/html; charset=utf-8"}, content=chunks()
+    )
+
+
+def test_extractor_keeps_content_and_drops_page_furniture():
+    extractor = MainTextExtractor()
+    # Chunk boundaries fall mid-tag and mid-word
+    for offset in range(0, len(ARTICLE), 17):
+        extractor.feed(ARTICLE[offset : offset + 17])
+    extractor.close()
+
+    assert extractor.paragraphs == [
+        "The Model Context Protocol is an open standard that connects language models to tools and data.",
+        "Servers expose resources, prompts and tools over JSON-RPC so any compatible client can use them.",
+    ]
+
+
+def test_enrich_appends_relevant_passages_to_their_result():
+    async def handler(request):
+        if request.url.host == "docs.example.com":
+            return html_response(ARTICLE)
+        return html_response(
+            "<p>Recipes for a quick weeknight dinner with pasta, garlic and fresh basil leaves.</p>"
+        )
+
+    fetcher = PageFetcher(transport=httpx.MockTransport(handler))
+    results = parse_results(RESULTS)
+    enriched, stats = asyncio.run(
+        fetcher.aenrich(results, "What tools do MCP servers expose?")
+    )
+
+    first, second = enriched
+    assert first.snippet.startswith("Short snippet. ")
+    assert "Servers expose resources, prompts and tools" in first.snippet
+    assert (first.title, first.link) == ("MCP overview", "https://docs.example.com/mcp")
+    # Records are copied, never changed in place
+    assert results[0].snippet == "Short snippet."
+    assert second == SearchResult(
+        "Unrelated", "Another snippet.", "https://other.example.org/page", 2
+    )
+    assert stats["pages"] == 2 and stats["fetched"] == 2 and stats["failed"] == 0
+    assert stats["passages"] >= 1
+
+
+def test_byte_cap_stops_reading_large_pages():
+    served = []
+    filler = (
+        "<p>" + "Context protocol servers and clients exchange messages. " * 20 + "</p>"
+    )
+
+    async def handler(request):
+        body = "<html><body>" + filler * 500 + "</body></html>"
+
+        async def chunks():
+            data = body.encode("utf-8")
+            for offset in range(0, len(data), 1024):
+                served.append(1024)
+                yield data[offset : offset + 1024]
+
+        return httpx.Response(
+            200, headers={"content-type": "text/html"}, content=chunks()
+        )
+
+    fetcher = PageFetcher(max_bytes=8 * 1024, transport=httpx.MockTransport(handler))
+    pages = asyncio.run(fetcher.afetch(["https://big.example.com/"]))
+
+    assert pages[0].truncated
+    assert pages[0].bytes == 8 * 1024
+    assert sum(served) < 16 * 1024
+    assert pages[0].paragraphs
+
+
+def test_timeout_keeps_partial_text():
+    async def handler(request):
+        return html_response(
+            ARTICLE + "<p>" + "late " * 2000 + "</p>", chunk_size=128, delay=0.02
+        )
+
+    fetcher = PageFetcher(timeout=0.2, transport=httpx.MockTransport(handler))
+    start = time.perf_counter()
+    pages = asyncio.run(fetcher.afetch(["https://slow.example.com/"]))
+
+    assert time.perf_counter() - start < 0.5
+    assert pages[0].error == "timeout"
+    assert pages[0].paragraphs[0].startswith("The Model Context Protocol")
+
+
+def test_fetches_run_concurrently_with_per_host_limit():
+    in_flight = {"now": 0, "max": 0}
+
+    async def handler(request):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.2)
+        in_flight["now"] -= 1
+        return html_response(ARTICLE)
+
+    fetcher = PageFetcher(per_host=2, transport=httpx.MockTransport(handler))
+    start = time.perf_counter()
+    asyncio.run(
+        fetcher.afetch(
+            [
+                "https://a.example.com/",
+                "https://b.example.com/",
+                "https://c.example.com/",
+            ]
+        )
+    )
+    # Latency is bounded by the slowest fetch, not the sum
+    assert time.perf_counter() - start < 0.4
+
+    in_flight["max"] = 0
+    asyncio.run(fetcher.afetch([f"https://same.example.com/{i}" for i in range(4)]))
+    assert in_flight["max"] == 2
+
+
+def test_sync_fetch_is_bounded_by_the_timeout():
+    def handler(request):
+        if request.url.host == "slow.example.com":
+            time.sleep(0.5)
+        return httpx.Response(
+            200, headers={"content-type": "text/html"}, content=ARTICLE.encode("utf-8")
+        )
+
+    fetcher = PageFetcher(timeout=0.2, sync_transport=httpx.MockTransport(handler))
+    start = time.perf_counter()
+    pages = fetcher.fetch(["https://fast.example.com/", "https://slow.example.com/"])
+
+    assert time.perf_counter() - start < 0.4
+    assert len(pages[0].paragraphs) == 2
+    assert pages[1].error == "timeout"
+
+
+def test_host_slot_timeout_is_recorded_as_a_failed_page():
+    fetcher = PageFetcher(
+        per_host=1,
+        sync_transport=httpx.MockTransport(lambda request: html_response(ARTICLE)),
+    )
+    page = Page("https://busy.example.com/b", fetcher.max_text_chars)
+
+    # Another fetch holds the only slot for the host until after the deadline
+    with fetcher._host_slot("https://busy.example.com/a", time.monotonic() + 1):
+        fetcher._fetch_into(page, time.monotonic() + 0.05)
+
+    assert page.error == "no free connection slot for busy.example.com"
+    assert page.elapsed_ms >= 40
+
+
+def test_workflow_adds_page_passages(offline_workflow):
+    def sync_handler(request):
+        return httpx.Response(
+            200, headers={"content-type": "text/html"}, content=ARTICLE.encode("utf-8")
+        )
+
+    async def handler(request):
+        return html_response(ARTICLE)
+
+    offline_workflow.page_fetcher = PageFetcher(
+        top_k=2,
+        transport=httpx.MockTransport(handler),
+        sync_transport=httpx.MockTransport(sync_handler),
+    )
+    offline_workflow.workflow = offline_workflow._build_workflow()
+    prompts = []
+    offline_workflow.answer_agent.chain.response = (
+        lambda inputs: prompts.append(inputs["search_results"]) or "fake answer"
+    )
+
+    result = offline_workflow.run("What tools do MCP servers expose?")
+    async_result = asyncio.run(
+        offline_workflow.arun("What tools do MCP servers expose?")
+    )
+
+    for outcome in (result, async_result):
+        assert outcome["metadata"]["pages"]["pages"] == 2
+        assert outcome["metadata"]["pages"]["fetched"] == 2
+        assert outcome["content"] == "fake answer"
+    assert "Servers expose resources" in prompts[0]
+    status = offline_workflow.get_workflow_status()
+    assert status["nodes"] == [
+        "query_processing",
+        "web_search",
+        "page_fetching",
+        "context_compaction",
+        "answer_generation",
+    ]
+    assert "PageFetcher" in status["tools"]
+
+
+def test_page_fetching_disabled_by_default(offline_workflow):
+    assert offline_workflow.page_fetcher is None
+    assert "page_fetching" not in offline_workflow.get_workflow_status()["nodes"]
+    assert "pages" not in offline_workflow.run("What is MCP?")["metadata"]
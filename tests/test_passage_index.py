@@ -0,0 +1,126 @@
+"""
+Test the local passage index over previously retrieved evidence
+"""
+
+import asyncio
+
+import numpy as np
+
+from tools.passage_index import PassageIndex
+from tools.search_results import parse_results
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+RESULTS = parse_results(
+    "Search Results:\n\n"
+    "1. MCP spec\n"
+    "   The Model Context Protocol connects language models to external tools.\n"
+    "   Source: https://spec.example.com/\n\n"
+    "2. MCP servers\n"
+    "   MCP servers expose tools, prompts and resources to language models.\n"
+    "   Source: https://servers.example.com/\n\n"
+    "3. MCP clients\n"
+    "   Clients of the Model Context Protocol discover tools at runtime.\n"
+    "   Source: https://clients.example.com/\n\n"
+    "4. Pasta\n   Boil the pasta in salted water for ten minutes.\n   Source: https://food.example.com/"
+)
+
+
+def test_lookup_serves_fresh_matching_passages():
+    index = PassageIndex(min_passages=3, clock=FakeClock())
+    assert index.add_results(RESULTS) == 4
+
+    # Only two passages mention all of the terms
+    assert index.lookup("language models tools") is None
+
+    results, stats = index.lookup("tools")
+    assert [result.position for result in results] == [1, 2, 3]
+    assert "https://food.example.com/" not in {result.link for result in results}
+    assert stats == {"hit": True, "passages": 3, "results": 3, "oldest_s": 0.0}
+
+
+def test_search_ranks_by_bm25_and_reports_coverage():
+    index = PassageIndex(min_passages=2, min_coverage=1.0)
+    index.add_results(RESULTS)
+
+    ranked = index.search("language models tools")
+    qualifying = {p["link"] for p in ranked if p["qualifies"]}
+    assert qualifying == {"https://spec.example.com/", "https://servers.example.com/"}
+    assert ranked[-1]["link"] == "https://clients.example.com/"
+    assert ranked[-1]["coverage"] == round(1 / 3, 4)
+    assert index.lookup("language models tools")[1]["results"] == 2
+    assert index.lookup("pasta tools") is None
+    assert index.stats() == {
+        "passages": 4,
+        "lookups": 2,
+        "hits": 1,
+        "misses": 1,
+        "hit_rate": 0.5,
+    }
+
+
+def test_stale_passages_do_not_count():
+    clock = FakeClock()
+    index = PassageIndex(max_age=60, min_passages=1, clock=clock)
+    index.add_results(RESULTS)
+    assert index.lookup("pasta water") is not None
+
+    clock.now += 61
+    assert index.lookup("pasta water") is None
+    # Seeing the same evidence again refreshes it instead of duplicating it
+    index.add_results(RESULTS)
+    assert len(index) == 4
+    assert index.lookup("pasta water")[1]["oldest_s"] == 0.0
+
+
+def test_index_is_bounded_and_evicts_postings():
+    index = PassageIndex(max_passages=2, min_passages=1)
+    for i in range(5):
+        index.add(f"passage number {i} mentions topic{i}", f"https://example.com/{i}")
+
+    assert len(index) == 2
+    assert index.search("topic0") == []
+    assert [p["link"] for p in index.search("topic4")] == ["https://example.com/4"]
+    assert "topic0" not in index._postings
+
+
+def test_dense_vectors_are_memory_mapped():
+    index = PassageIndex(dense_dims=64, min_passages=1, min_similarity=0.3)
+    index.add_results(RESULTS)
+
+    assert isinstance(index._vectors, np.memmap)
+    best = index.search("boil pasta in salted water")[0]
+    assert best["link"] == "https://food.example.com/"
+    assert best["similarity"] > 0.3 and best["qualifies"]
+
+
+def test_workflow_answers_repeat_topic_without_searching(offline_workflow):
+    import tools.search_tool as search_tool
+
+    offline_workflow.passage_index = PassageIndex(min_passages=3)
+    search = search_tool.GoogleSearch
+    first = offline_workflow.run("What is MCP?")
+    calls = search.calls
+
+    second = offline_workflow.run("Tell me about MCP")
+    third = asyncio.run(offline_workflow.arun("MCP?"))
+
+    assert first["metadata"]["passage_index"] == {"hit": False, "indexed": 5}
+    assert search.calls == calls
+    for result in (second, third):
+        assert result["metadata"]["passage_index"]["hit"] is True
+        assert result["metadata"]["passage_index"]["results"] == 5
+        assert result["content"] == "fake answer"
+    assert offline_workflow.passage_index_stats()["hits"] == 2
+
+
+def test_passage_index_disabled_by_default(offline_workflow):
+    assert offline_workflow.passage_index is None
+    assert "passage_index" not in offline_workflow.run("What is MCP?")["metadata"]
@@ -0,0 +1,99 @@
+"""
+Test the persistent SQLite cache tier
+"""
+
+import os
+import subprocess
+import sys
+
+from agents.rewrite_cache import RewriteCache
+from tools.cache import MemoryCache, SQLiteCache, TieredCache, create_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_survive_reopening(tmp_path):
+    """A new instance on the same file sees earlier entries"""
+    path = str(tmp_path / "cache.sqlite3")
+    SQLiteCache(path).set("k", {"organic_results": [1, 2]})
+
+    reopened = SQLiteCache(path)
+
+    assert reopened.get("k") == {"organic_results": [1, 2]}
+    assert reopened.stats()["backend"] == "sqlite"
+
+
+def test_ttl_and_size_cap(tmp_path):
+    """Expired entries disappear and the least recently used go first"""
+    clock = FakeClock()
+    cache = SQLiteCache(
+        str(tmp_path / "cache.sqlite3"), max_size=2, ttl=10, clock=clock
+    )
+    cache.set("a", 1)
+    clock.now += 1
+    cache.set("b", 2)
+    clock.now += 1
+    cache.get("a")
+    clock.now += 1
+    cache.set("c", 3)
+
+    assert cache.compact() == 1
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    clock.now += 60
+    assert cache.get("c") is None
+
+
+def test_shared_between_processes(tmp_path):
+    """Another process can write entries this process reads"""
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SQLiteCache(path)
+    code = f"from tools.cache import SQLiteCache; SQLiteCache({path!r}).set('from-child', 'hello')"
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=project_root)
+
+    assert cache.get("from-child") == "hello"
+
+
+def test_tiered_cache_promotes_persistent_hits(tmp_path):
+    """A cold memory tier is filled from the persistent tier"""
+    path = str(tmp_path / "cache.sqlite3")
+    TieredCache([MemoryCache(), SQLiteCache(path)]).set("k", "v")
+
+    restarted = TieredCache([MemoryCache(), SQLiteCache(path)])
+
+    assert restarted.get("k") == "v"
+    assert restarted.layers[0].peek("k") == "v"
+    assert restarted.stats()["lower_tier_hits"] == 1
+    assert restarted.stats()["backend"] == "memory+sqlite"
+
+
+def test_create_cache_adds_persistent_tier(tmp_path, monkeypatch):
+    """CACHE_DIR places a SQLite tier below the configured backend"""
+    assert isinstance(create_cache(backend="memory"), MemoryCache)
+
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path))
+    cache = create_cache(backend="memory")
+
+    assert isinstance(cache, TieredCache)
+    assert (tmp_path / "search_cache.sqlite3").exists()
+    assert isinstance(create_cache(backend="sqlite"), SQLiteCache)
+    assert create_cache(backend="none") is None
+
+
+def test_rewrite_cache_warm_after_restart(tmp_path, monkeypatch):
+    """Rewrites stored before a restart are served without the LLM"""
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path))
+    RewriteCache.from_env().set("What's new with OpenAI?", "openai news 2025")
+
+    restarted = RewriteCache.from_env()
+
+    assert restarted.get("what's new with openai") == "openai news 2025"
+    assert restarted.stats()["hits"] == 1
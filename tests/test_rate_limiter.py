@@ -0,0 +1,214 @@
+"""
+Test the token bucket, the AIMD concurrency limiter and their use by the agents and tools
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from tools.rate_limiter import (
+    AdaptiveLimiter,
+    RateLimitExceeded,
+    TokenBucket,
+    UpstreamLimiter,
+    is_overload_error,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_spaces_requests_after_burst():
+    """Once the burst is spent, each token is due 1/rate seconds after the last"""
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, burst=2, clock=clock)
+
+    assert bucket._reserve(None) == 0
+    assert bucket._reserve(None) == 0
+    assert bucket._reserve(None) == pytest.approx(0.1)
+    assert bucket._reserve(None) == pytest.approx(0.2)
+
+    clock.now = 1.0
+    assert bucket._reserve(None) == 0
+
+
+def test_token_bucket_rejects_waits_beyond_timeout():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, burst=1, clock=clock)
+    bucket._reserve(None)
+
+    with pytest.raises(RateLimitExceeded):
+        bucket.acquire(timeout=0.5)
+    # The rejected request did not consume a token
+    clock.now = 1.0
+    assert bucket._reserve(None) == 0
+
+
+def test_adaptive_limiter_backs_off_on_overload_and_grows_on_success():
+    """Multiplicative decrease on 429/5xx, additive increase on healthy calls"""
+    limiter = AdaptiveLimiter(initial=8, min_limit=1, max_limit=10)
+
+    limiter.acquire()
+    limiter.release(0.1, overloaded=True)
+    assert limiter.stats()["limit"] == 4
+
+    for _ in range(40):
+        limiter.acquire()
+        limiter.release(0.1)
+    assert 4 < limiter.stats()["limit"] <= 10
+
+
+def test_adaptive_limiter_backs_off_on_latency_growth():
+    limiter = AdaptiveLimiter(initial=8, latency_tolerance=2.0)
+    for latency in (0.1, 0.1, 0.1):
+        limiter.acquire()
+        limiter.release(latency)
+
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release(1.0)
+
+    assert limiter.stats()["limit"] < 8
+    assert limiter.stats()["backoffs"] >= 1
+
+
+def test_mixed_latency_traffic_keeps_its_limit():
+    """Fast rewrites and slow answers sharing one limiter are not mistaken for congestion"""
+    clock = FakeClock()
+    limiter = AdaptiveLimiter(initial=8, max_limit=16, clock=clock)
+
+    for i in range(400):
+        kind, latency = ("rewrite", 0.4) if i % 2 else ("answer", 2.5)
+        latency *= 1 + 0.1 * (i % 3)
+        limiter.acquire()
+        clock.now += latency
+        limiter.release(latency, kind=kind)
+
+    stats = limiter.stats()
+    assert stats["backoffs"] == 0
+    assert stats["limit"] >= 8
+    assert set(stats["baseline_ms"]) == {"rewrite", "answer"}
+
+
+def test_streamed_calls_are_judged_by_time_to_first_token():
+    limiter = UpstreamLimiter("test", concurrency=AdaptiveLimiter(initial=8))
+
+    with limiter.slot("answer") as permit:
+        permit.first_token()
+        time.sleep(0.05)
+
+    assert limiter.stats()["latency_ms"]["answer"] < 40
+
+
+def test_queued_request_gets_released_slot():
+    """Requests over the limit wait in order instead of failing"""
+    limiter = AdaptiveLimiter(initial=1, max_limit=1)
+    limiter.acquire()
+    admitted = threading.Event()
+
+    def waiter():
+        limiter.acquire(timeout=5)
+        admitted.set()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    time.sleep(0.05)
+    assert not admitted.is_set()
+    assert limiter.stats()["queued_now"] == 1
+
+    limiter.release(0.01)
+    thread.join(2)
+    assert admitted.is_set()
+    assert limiter.stats()["in_flight"] == 1
+
+
+def test_queue_timeout_and_queue_bound():
+    limiter = AdaptiveLimiter(initial=1, max_limit=1, max_queue=1)
+    limiter.acquire()
+
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire(timeout=0.05)
+    assert limiter.stats()["queued_now"] == 0
+
+    async def overflow():
+        queued = asyncio.ensure_future(limiter.aacquire(timeout=1))
+        await asyncio.sleep(0.01)
+        with pytest.raises(RateLimitExceeded):
+            await limiter.aacquire(timeout=1)
+        limiter.release()
+        await queued
+
+    asyncio.run(overflow())
+    assert limiter.stats()["in_flight"] == 1
+
+
+def test_upstream_slot_classifies_errors():
+    """Overload errors shrink the limit; other failures leave it alone"""
+    limiter = UpstreamLimiter("test", concurrency=AdaptiveLimiter(initial=8))
+
+    with pytest.raises(ValueError):
+        with limiter.slot():
+            raise ValueError("bad request")
+    assert limiter.stats()["limit"] == 8
+
+    with pytest.raises(RuntimeError):
+        with limiter.slot():
+            raise RuntimeError("429 Resource has been exhausted (e.g. check quota).")
+    assert limiter.stats()["limit"] == 4
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_is_overload_error():
+    class ResourceExhausted(Exception):
+        pass
+
+    assert is_overload_error(ResourceExhausted("quota"))
+    assert is_overload_error(RuntimeError("HTTP 503 Service Unavailable"))
+    assert not is_overload_error(ValueError("invalid api key"))
+    assert not is_overload_error(RateLimitExceeded("queue full"))
+
+
+def test_agents_and_search_share_registry_limiters(offline_workflow):
+    """Gemini calls from both agents go through one limiter; SerpAPI has its own"""
+    registry = offline_workflow.registry
+    gemini = registry.get("gemini_limiter")
+    assert offline_workflow.query_agent.limiter is gemini
+    assert offline_workflow.answer_agent.limiter is gemini
+    assert offline_workflow.search_tool.limiter is registry.get("serpapi_limiter")
+
+    offline_workflow.run("What is MCP?")
+    asyncio.run(offline_workflow.arun("What is LangGraph?"))
+
+    assert gemini.stats()["admitted"] == 4
+    assert gemini.stats()["in_flight"] == 0
+    assert registry.get("serpapi_limiter").stats()["admitted"] == 2
+
+
+def test_saturated_limiter_queues_instead_of_failing(offline_workflow):
+    """With a limit of 2, concurrent questions wait their turn and all succeed"""
+    from tests.conftest import FakeChain
+
+    gemini = UpstreamLimiter(
+        "gemini", concurrency=AdaptiveLimiter(initial=2, max_limit=2)
+    )
+    offline_workflow.query_agent.limiter = gemini
+    offline_workflow.answer_agent.limiter = gemini
+    offline_workflow.answer_agent.chain = FakeChain("fake answer", delay=0.02)
+
+    async def run_all():
+        return await asyncio.gather(
+            *(offline_workflow.arun(f"question {i}") for i in range(10))
+        )
+
+    results = asyncio.run(run_all())
+
+    assert all(r["content"] == "fake answer" for r in results)
+    assert gemini.stats()["queued"] > 0
+    assert gemini.stats()["rejected"] == 0
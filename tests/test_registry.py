@@ -0,0 +1,43 @@
+"""
+Test the shared component registry
+"""
+
+import pytest
+
+from langflow.registry import ComponentRegistry, get_registry, reset_registry
+
+
+def test_components_are_built_lazily_once():
+    """Each component is constructed on first use and then reused"""
+    built = []
+
+    def factory(registry):
+        built.append(1)
+        return object()
+
+    registry = ComponentRegistry(factories={"search_tool": factory})
+
+    assert registry.loaded() == {}
+    assert registry.search_tool is registry.search_tool
+    assert len(built) == 1
+
+
+def test_workflow_and_agents_share_instances(api_keys):
+    """The workflow and both agents reuse the registry's instances and LLM client"""
+    pytest.importorskip("langgraph")
+    registry = ComponentRegistry()
+    workflow = registry.workflow
+
+    assert workflow.query_agent is registry.query_agent
+    assert workflow.search_tool is registry.search_tool
+    assert workflow.answer_agent is registry.answer_agent
+    assert registry.query_agent.llm is registry.answer_agent.llm
+
+
+def test_global_registry_reset():
+    """reset_registry() drops the process-wide instance"""
+    first = get_registry()
+    assert get_registry() is first
+
+    reset_registry()
+    assert get_registry() is not first
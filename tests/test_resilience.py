@@ -0,0 +1,200 @@
+"""
+Test hedged requests and jittered retries for upstream calls
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from tools.rate_limiter import RateLimitExceeded
+from tools.resilience import ResilientCaller, UpstreamError, is_retryable
+
+
+def make_caller(**kwargs):
+    options = {
+        "min_samples": 5,
+        "min_hedge_delay_ms": 20,
+        "max_hedge_rate": 0.5,
+        "backoff_base": 0,
+    }
+    options.update(kwargs)
+    return ResilientCaller("test", **options)
+
+
+def warm_up(caller, latency=0.005, calls=10):
+    for _ in range(calls):
+        caller.call(lambda: time.sleep(latency))
+
+
+def test_retryable_errors():
+    class ReadTimeout(Exception):
+        pass
+
+    assert is_retryable(ReadTimeout("timed out"))
+    assert is_retryable(UpstreamError("busy", 503))
+    assert is_retryable(RuntimeError("429 Too Many Requests"))
+    assert not is_retryable(UpstreamError("bad request", 400))
+    assert not is_retryable(ValueError("invalid api key"))
+    assert not is_retryable(RateLimitExceeded("queue full"))
+
+
+def test_transient_errors_are_retried():
+    caller = make_caller(hedge=False)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise UpstreamError("overloaded", 503)
+        return "ok"
+
+    assert caller.call(flaky) == "ok"
+    assert len(attempts) == 3
+    assert caller.stats()["retries"] == 2
+
+
+def test_permanent_errors_are_not_retried():
+    caller = make_caller(hedge=False)
+    attempts = []
+
+    def broken():
+        attempts.append(1)
+        raise ValueError("bad input")
+
+    with pytest.raises(ValueError):
+        caller.call(broken)
+    assert len(attempts) == 1
+
+
+def test_slow_call_is_hedged_and_duplicate_wins():
+    """A call still running past the latency percentile gets a faster duplicate"""
+    caller = make_caller()
+    warm_up(caller)
+    calls = []
+    lock = threading.Lock()
+
+    def first_slow():
+        with lock:
+            calls.append(1)
+            slow = len(calls) == 1
+        time.sleep(1.0 if slow else 0.005)
+        return "slow" if slow else "fast"
+
+    start = time.perf_counter()
+    assert caller.call(first_slow) == "fast"
+    assert time.perf_counter() - start < 0.5
+
+    stats = caller.stats()
+    assert stats["hedges"] == 1
+    assert stats["hedge_wins"] == 1
+    assert stats["hedge_rate"] == pytest.approx(1 / 11)
+
+
+def test_hedge_rate_is_capped():
+    caller = make_caller(max_hedge_rate=0.0)
+    warm_up(caller)
+
+    assert caller.call(lambda: time.sleep(0.1) or "done") == "done"
+    assert caller.stats()["hedges"] == 0
+
+
+def test_async_hedge_cancels_the_loser():
+    caller = make_caller()
+    cancelled = []
+
+    async def run():
+        for _ in range(10):
+            await caller.acall(lambda: asyncio.sleep(0.005))
+
+        calls = []
+
+        async def first_slow():
+            calls.append(1)
+            if len(calls) == 1:
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    cancelled.append(True)
+                    raise
+                return "slow"
+            return "fast"
+
+        return await caller.acall(first_slow)
+
+    assert asyncio.run(run()) == "fast"
+    assert cancelled == [True]
+    assert caller.stats()["hedge_wins"] == 1
+
+
+def test_agents_built_directly_leave_retries_to_the_caller(monkeypatch):
+    """The client's own retries would multiply with ResilientCaller's attempts and hedges"""
+    from agents.answer_agent import AnswerAgent
+    from agents.query_agent import QueryAgent
+
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+
+    assert QueryAgent().llm.max_retries == 0
+    assert AnswerAgent().llm.max_retries == 0
+
+
+def test_search_tool_retries_serpapi_overload(offline_workflow):
+    """HTTP 429 from SerpAPI is retried, and the limiter sees the overload"""
+    import httpx
+
+    from tests.conftest import fake_serpapi_results
+
+    tool = offline_workflow.search_tool
+    tool.resilience = make_caller(hedge=False)
+    responses = iter([429, 200])
+
+    def handler(request):
+        status = next(responses)
+        if status != 200:
+            return httpx.Response(status, json={"error": "Too many requests"})
+        return httpx.Response(200, json=fake_serpapi_results(request.url.params["q"]))
+
+    tool.transport = httpx.MockTransport(handler)
+    limit_before = tool.limiter.stats()["limit"]
+
+    result = asyncio.run(tool.acall("model context protocol"))
+
+    assert result["content"].startswith("Search Results:")
+    assert tool.resilience.stats()["retries"] == 1
+    assert tool.limiter.stats()["limit"] < limit_before
+
+
+def test_workflow_reports_resilience_stats(offline_workflow):
+    offline_workflow.run("What is MCP?")
+
+    stats = offline_workflow.resilience_stats()
+    assert set(stats) == {"gemini.rewrite", "serpapi", "gemini.answer"}
+    assert all(s["calls"] == 1 for s in stats.values())
+    assert all(s["retry_rate"] == 0.0 for s in stats.values())
+
+
+def test_async_search_retries_quota_error_body(offline_workflow):
+    """A quota error in a 200 response body is retried and reported to the limiter, like the sync path"""
+    import httpx
+
+    from tests.conftest import fake_serpapi_results
+
+    tool = offline_workflow.search_tool
+    tool.resilience = make_caller(hedge=False)
+    bodies = iter([{"error": "Your account has run out of searches."}, None])
+
+    def handler(request):
+        body = next(bodies)
+        return httpx.Response(
+            200, json=body or fake_serpapi_results(request.url.params["q"])
+        )
+
+    tool.transport = httpx.MockTransport(handler)
+    limit_before = tool.limiter.stats()["limit"]
+
+    result = asyncio.run(tool.acall("model context protocol"))
+
+    assert result["content"].startswith("Search Results:")
+    assert tool.resilience.stats()["retries"] == 1
+    assert tool.limiter.stats()["limit"] < limit_before
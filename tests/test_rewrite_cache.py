@@ -0,0 +1,74 @@
+"""
+Test QueryAgent rewrite memoization
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.rewrite_cache import RewriteCache, canonicalize_question
+
+
+class CountingChain:
+    """Stand-in for the LangChain chain that counts invocations"""
+
+    def __init__(self, response="openai news 2025"):
+        self.response = response
+        self.calls = 0
+
+    def invoke(self, inputs):
+        self.calls += 1
+        return self.response
+
+
+def test_canonicalize_question():
+    """Case, whitespace and punctuation variants canonicalize identically"""
+    assert canonicalize_question("What's new with  OpenAI?") == canonicalize_question(
+        "what's new with openai"
+    )
+    assert canonicalize_question("C++ news") == "c++ news"
+
+
+def test_exact_hits_and_eviction():
+    """Exact repeats hit; the cache stays within its size bound"""
+    cache = RewriteCache(max_size=2)
+    cache.set("Question one?", "q1")
+    cache.set("Question two?", "q2")
+    cache.set("Question three?", "q3")
+
+    assert cache.get("question ONE") is None
+    assert cache.get("question three") == "q3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_fuzzy_layer():
+    """Near-identical questions reuse a rewrite only when fuzzy matching is on"""
+    exact_only = RewriteCache()
+    exact_only.set("latest news about python release", "python release news")
+    assert exact_only.get("latest news about the python release") is None
+
+    fuzzy = RewriteCache(fuzzy_threshold=0.8)
+    fuzzy.set("latest news about python release", "python release news")
+    assert fuzzy.get("latest news about the python release") == "python release news"
+    assert fuzzy.get("latest news about java") is None
+    assert fuzzy.stats()["fuzzy_hits"] == 1
+
+
+def test_query_agent_skips_llm_for_repeats(monkeypatch):
+    """Repeated questions are answered from the rewrite cache"""
+    pytest.importorskip("langchain_google_genai")
+    from agents.query_agent import QueryAgent
+
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    monkeypatch.setenv("QUERY_FAST_PATH_ENABLED", "false")
+    agent = QueryAgent(rewrite_cache=RewriteCache())
+    agent.chain = CountingChain()
+
+    assert agent("What's new with OpenAI?")["content"] == "openai news 2025"
+    assert agent("what's new with openai")["content"] == "openai news 2025"
+    assert agent.chain.calls == 1
+    assert agent.cache_stats()["hits"] == 1
@@ -0,0 +1,126 @@
+"""
+Test the search result cache and its backends
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.cache import (
+    CacheBackend,
+    MemoryCache,
+    RedisCache,
+    create_cache,
+    make_cache_key,
+)
+
+
+class FakeClock:
+    """Manually advanced clock for TTL tests"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_key_normalizes_query():
+    """Case and whitespace differences map to the same key"""
+    key_a = make_cache_key("search", "OpenAI  News", num=5, safe="active")
+    key_b = make_cache_key("search", " openai news ", safe="active", num=5)
+    key_c = make_cache_key("search", "openai news", num=10, safe="active")
+
+    assert key_a == key_b
+    assert key_a != key_c
+
+
+def test_memory_cache_ttl_expiry():
+    """Entries expire after their TTL"""
+    clock = FakeClock()
+    cache = MemoryCache(max_size=10, ttl=60, clock=clock)
+
+    cache.set("k", {"v": 1})
+    assert cache.get("k") == {"v": 1}
+
+    clock.now = 61
+    assert cache.get("k") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_memory_cache_lru_eviction():
+    """Least recently used entry is evicted once the size bound is hit"""
+    cache = MemoryCache(max_size=2, ttl=60)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_redis_cache_with_fake_redis():
+    """Redis backend round-trips JSON values"""
+    fakeredis = pytest.importorskip("fakeredis")
+    cache = RedisCache(client=fakeredis.FakeRedis(), ttl=60)
+
+    cache.set("k", {"organic_results": [{"title": "t"}]})
+    assert cache.get("k") == {"organic_results": [{"title": "t"}]}
+    assert cache.get("missing") is None
+
+    cache.clear()
+    assert cache.get("k") is None
+
+
+def test_incomplete_backend_fails_at_creation():
+    """A backend missing part of the interface cannot be instantiated"""
+
+    class GetOnlyCache(CacheBackend):
+        def _get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnlyCache()
+
+
+def test_create_cache_disabled():
+    """The none backend disables caching"""
+    assert create_cache(backend="none") is None
+    assert isinstance(create_cache(backend="memory"), MemoryCache)
+
+
+def test_search_tool_serves_repeats_from_cache(monkeypatch):
+    """Repeated queries only hit SerpAPI once"""
+    pytest.importorskip("serpapi")
+    import tools.search_tool as search_tool
+
+    calls = []
+
+    class FakeGoogleSearch:
+        def __init__(self, params):
+            calls.append(params)
+
+        def get_dict(self):
+            return {"organic_results": [{"title": "T", "snippet": "S", "link": "L"}]}
+
+    monkeypatch.setenv("SERPAPI_KEY", "test")
+    monkeypatch.setattr(search_tool, "GoogleSearch", FakeGoogleSearch)
+
+    tool = search_tool.SearchTool(cache=MemoryCache())
+    first = tool("Latest AI news")
+    second = tool("latest ai  news")
+    structured = tool.search("LATEST AI NEWS")
+
+    assert first == second
+    assert structured[0]["title"] == "T"
+    assert len(calls) == 1
+    assert tool.cache_stats()["hits"] == 2
@@ -0,0 +1,88 @@
+"""
+Test typed search result records and their rendering
+"""
+
+from tools.context_compactor import estimate_tokens
+from tools.search_results import (
+    NO_RESULTS,
+    SearchResult,
+    evidence_records,
+    evidence_text,
+    parse_results,
+    render_results,
+    rendered_tokens,
+)
+
+RECORDS = [
+    SearchResult(
+        "MCP spec",
+        "The Model Context Protocol connects models to tools.",
+        "https://spec.example.com/",
+        1,
+    ),
+    SearchResult("MCP servers", "", "https://servers.example.com/docs", 2),
+]
+
+
+def test_render_parse_round_trip():
+    text = render_results(RECORDS)
+
+    assert text == (
+        "Search Results:\n\n"
+        "1. MCP spec\n   The Model Context Protocol connects models to tools.\n   Source: https://spec.example.com/\n\n"
+        "2. MCP servers\n   Source: https://servers.example.com/docs"
+    )
+    assert parse_results(render_results(RECORDS[:1])) == RECORDS[:1]
+    assert render_results([]) == NO_RESULTS
+    assert parse_results(NO_RESULTS) == []
+    assert render_results(RECORDS, limit=1) == render_results(RECORDS[:1])
+
+
+def test_rendered_size_is_computed_without_rendering():
+    for records in (RECORDS, RECORDS[:1], []):
+        assert rendered_tokens(records) == estimate_tokens(render_results(records))
+    assert all(
+        r.rendered_length(i) == len(r.render(i)) for i, r in enumerate(RECORDS, 1)
+    )
+
+
+def test_records_are_compact_and_copied_on_change():
+    record = SearchResult.from_serpapi(
+        {"title": "T", "link": "https://a.example.com/x"}, 3
+    )
+
+    assert not hasattr(record, "__dict__")
+    assert (record.snippet, record.position, record.source) == (
+        "No description available",
+        3,
+        "a.example.com",
+    )
+    changed = record.replace(snippet="New")
+    assert changed.snippet == "New" and record.snippet == "No description available"
+    assert record.to_dict()["link"] == "https://a.example.com/x"
+
+
+def test_evidence_accepts_records_or_text():
+    text = render_results(RECORDS[:1])
+
+    assert evidence_text(RECORDS[:1]) == text
+    assert evidence_text("Search failed: boom") == "Search failed: boom"
+    assert evidence_records(text) == RECORDS[:1]
+
+
+def test_workflow_makes_one_serpapi_call_per_question(offline_workflow):
+    import tools.search_tool as search_tool
+
+    offline_workflow.search_tool.cache = None
+    prompts = []
+    offline_workflow.answer_agent.chain.response = (
+        lambda inputs: prompts.append(inputs["search_results"]) or "fake answer"
+    )
+    calls = search_tool.GoogleSearch.calls
+
+    result = offline_workflow.run("What is MCP?")
+
+    assert search_tool.GoogleSearch.calls == calls + 1
+    assert result["content"] == "fake answer"
+    assert len(parse_results(prompts[0])) == 5
+    assert prompts[0].endswith("Source: https://example.com/5")
@@ -0,0 +1,102 @@
+"""
+Test single-flight coalescing of identical in-flight work
+"""
+
+import asyncio
+import threading
+import time
+
+from tools.search_results import SearchResult
+from tools.singleflight import SingleFlight
+
+
+def test_sync_callers_share_one_execution():
+    """Concurrent threads with the same key run the work once"""
+    flight = SingleFlight()
+    calls = []
+    results = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.2)
+        return "result"
+
+    def caller():
+        results.append(flight.do("key", work))
+
+    threads = [threading.Thread(target=caller) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False] + [True] * 9
+    assert flight.stats() == {"executions": 1, "coalesced": 9, "in_flight": 0}
+
+
+def test_async_errors_propagate_to_waiters():
+    """Every waiter sees the leader's exception"""
+    flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("boom")
+
+    async def run_all():
+        return await asyncio.gather(
+            *(flight.ado("key", failing) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(run_all())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flight.stats()["executions"] == 1
+
+
+def test_cancelled_leader_hands_the_call_to_a_waiter():
+    """A waiter outliving a cancelled leader (e.g. one cut by its deadline) runs the call itself"""
+    flight = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.1)
+        return "result"
+
+    async def run_all():
+        leader = asyncio.ensure_future(flight.ado("key", slow))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.ado("key", slow))
+        await asyncio.sleep(0.02)
+        leader.cancel()
+        return await waiter
+
+    assert asyncio.run(run_all()) == ("result", False)
+    assert flight.stats() == {"executions": 2, "coalesced": 1, "in_flight": 0}
+
+
+def test_workflow_shares_search_between_questions(offline_workflow):
+    """Questions that rewrite to the same query share one search call"""
+    calls = []
+
+    async def slow_search(query):
+        calls.append(query)
+        await asyncio.sleep(0.1)
+        return {
+            "content": "",
+            "results": [
+                SearchResult(f"Result for {query}", "Snippet.", "https://example.com/")
+            ],
+        }
+
+    offline_workflow.search_tool.afetch_results = slow_search
+
+    async def run_all():
+        return await asyncio.gather(
+            offline_workflow.arun("What is MCP?"),
+            offline_workflow.arun("WHAT IS MCP?"),
+        )
+
+    results = asyncio.run(run_all())
+
+    assert len(calls) == 1
+    assert all(r["metadata"]["success"] for r in results)
+    assert offline_workflow.coalescing_stats()["coalesced"] == 1
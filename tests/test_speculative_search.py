@@ -0,0 +1,95 @@
+"""
+Test speculative search on the raw question while the rewrite runs
+"""
+
+import asyncio
+import time
+
+from tests.conftest import FakeChain
+
+
+def speculative(workflow, **settings):
+    """Turn speculation on for an offline workflow"""
+    workflow.speculative = True
+    workflow.speculative_similarity = settings.get("similarity", 0.5)
+    workflow.speculative_deadline = settings.get("deadline_ms", 1500) / 1000
+    return workflow
+
+
+def serpapi_calls(workflow):
+    import tools.search_tool as search_tool
+
+    return search_tool.GoogleSearch.calls
+
+
+def test_similar_rewrite_reuses_speculative_results(offline_workflow):
+    """A rewrite close to the question skips the second search"""
+    workflow = speculative(offline_workflow)
+    before = serpapi_calls(workflow)
+
+    result = workflow.run("Latest MCP server releases")
+
+    assert result["metadata"]["speculation"] == "hit"
+    assert result["metadata"]["success"] is True
+    assert serpapi_calls(workflow) - before == 1
+    assert workflow.speculation_stats()["hit"] == 1
+
+
+def test_divergent_rewrite_runs_refined_search(offline_workflow):
+    """A rewrite that changes the topic triggers a search for the rewrite"""
+    workflow = speculative(offline_workflow)
+    workflow.query_agent.chain = FakeChain("anthropic model context protocol 2025")
+    before = serpapi_calls(workflow)
+
+    result = workflow.run("What is MCP?")
+
+    assert result["metadata"]["speculation"] == "miss"
+    assert result["metadata"]["search_query"] == "anthropic model context protocol 2025"
+    assert serpapi_calls(workflow) - before == 2
+
+
+def test_slow_rewrite_falls_back_to_speculative_results(offline_workflow):
+    """Past the deadline the raw-question results are answered directly"""
+    workflow = speculative(offline_workflow, deadline_ms=50)
+
+    def slow_rewrite(inputs):
+        time.sleep(0.5)
+        return "unrelated rewrite"
+
+    workflow.query_agent.chain = FakeChain(slow_rewrite)
+
+    start = time.perf_counter()
+    result = workflow.run("What is MCP?")
+    elapsed = time.perf_counter() - start
+
+    assert result["metadata"]["speculation"] == "deadline"
+    assert result["metadata"]["search_query"] == "What is MCP?"
+    assert elapsed < 0.4
+
+
+def test_async_deadline(offline_workflow):
+    """The async path honours the same deadline"""
+    workflow = speculative(offline_workflow, deadline_ms=50)
+    workflow.query_agent.chain = FakeChain("unrelated rewrite", delay=0.5)
+    seen = []
+    workflow.answer_agent.chain = FakeChain(
+        lambda inputs: seen.append(inputs) or "fake answer"
+    )
+
+    result = asyncio.run(workflow.arun("What is MCP?"))
+
+    assert result["metadata"]["speculation"] == "deadline"
+    assert result["content"] == "fake answer"
+    assert "Snippet 1 about What is MCP?" in str(seen[0])
+
+
+def test_local_rewrites_do_not_speculate(offline_workflow):
+    """Cached rewrites are instant, so no speculative search is issued"""
+    workflow = speculative(offline_workflow)
+    workflow.run("What is MCP?")
+    before = serpapi_calls(workflow)
+
+    result = workflow.run("What is MCP?")
+
+    assert "speculation" not in result["metadata"]
+    assert serpapi_calls(workflow) - before == 0  # search result cache hit
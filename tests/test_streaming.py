@@ -0,0 +1,81 @@
+"""
+Test token streaming of answers through the workflow
+"""
+
+import asyncio
+
+
+def test_stream_emits_tokens_then_result(offline_workflow):
+    """Tokens arrive before the final result event"""
+    events = list(offline_workflow.stream("What is MCP?"))
+
+    tokens = [e["content"] for e in events if e["type"] == "token"]
+    result = events[-1]
+
+    assert events[-1]["type"] == "result"
+    assert all(e["type"] == "token" for e in events[:-1])
+    assert len(tokens) > 1
+    assert result["content"] == "".join(tokens)
+    assert result["content"].startswith("streamed")
+    assert result["metadata"]["time_to_first_token_ms"] is not None
+    assert offline_workflow.streaming_stats()["count"] == 1
+
+
+def test_astream_matches_stream(offline_workflow):
+    """The async stream yields the same answer"""
+
+    async def collect():
+        return [e async for e in offline_workflow.astream("What is MCP?")]
+
+    events = asyncio.run(collect())
+
+    assert events[-1]["type"] == "result"
+    assert (
+        events[-1]["content"]
+        == list(offline_workflow.stream("What is MCP?"))[-1]["content"]
+    )
+
+
+def test_invoke_does_not_stream(offline_workflow):
+    """run() keeps using the non-streaming chain"""
+    result = offline_workflow.run("What is MCP?")
+
+    assert result["content"] == "fake answer"
+    assert offline_workflow.answer_agent.stream_chain.calls == 0
+
+
+class FailingStream:
+    """Stream chain that fails after its first token"""
+
+    def stream(self, inputs, config=None):
+        yield "partial "
+        raise RuntimeError("boom")
+
+    async def astream(self, inputs, config=None):
+        yield "partial "
+        raise RuntimeError("boom")
+
+
+def test_stream_failing_after_first_token_is_an_error_and_not_cached(offline_workflow):
+    """A mid-stream Gemini failure fails the run and never reaches the answer cache"""
+    from agents.answer_cache import AnswerCache
+    from tools.cache import MemoryCache
+
+    offline_workflow.answer_cache = AnswerCache(MemoryCache())
+    offline_workflow.answer_agent.stream_chain = FailingStream()
+
+    async def collect():
+        return [e async for e in offline_workflow.astream("What is MCP?")]
+
+    for events in (
+        list(offline_workflow.stream("What is MCP?")),
+        asyncio.run(collect()),
+    ):
+        result = events[-1]
+        assert events[0] == {"type": "token", "content": "partial "}
+        assert result["content"] == "Answer generation failed: boom"
+        assert result["metadata"]["success"] is False
+        assert result["metadata"]["current_step"].startswith("answer_error")
+
+    assert offline_workflow.answer_cache.stats()["hits"] == 0
+    assert offline_workflow.run("What is MCP?")["content"] == "fake answer"
@@ -0,0 +1,141 @@
+"""
+Test per-request tracing and the timings attached to workflow metadata
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from tools import tracing
+from tools.tracing import Trace, Tracer
+
+STAGES = {"query_processing", "web_search", "context_compaction", "answer_generation"}
+
+
+@pytest.fixture
+def tracer(tmp_path):
+    """Process-wide tracer exporting to a temporary JSONL file"""
+    previous = tracing.get_tracer()
+    tracer = Tracer(export_path=str(tmp_path / "traces.jsonl"))
+    tracing.set_tracer(tracer)
+    yield tracer
+    tracing.set_tracer(previous)
+
+
+def read_traces(tracer):
+    with open(tracer.export_path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_spans_nest_and_external_calls_are_split_out():
+    """Top-level spans are stages; gemini.* and serpapi spans count as external"""
+    tracer = Tracer()
+    with tracer.trace("run") as trace:
+        with tracing.span("web_search"):
+            with tracing.span("serpapi", query="mcp") as call:
+                call.retry()
+                call.retry()
+
+    timings = trace.timings()
+    assert set(timings["stages"]) == {"web_search"}
+    assert set(timings["external"]) == {"serpapi"}
+    assert timings["overhead_ms"] <= timings["total_ms"]
+    serpapi = next(span for span in trace.spans if span.name == "serpapi")
+    assert serpapi.parent == "web_search"
+    assert serpapi.attributes == {"query": "mcp", "retries": 2}
+
+
+def test_span_outside_a_trace_is_a_noop():
+    """Code paths used without a request (tests, scripts) record nothing"""
+    with tracing.span("serpapi") as span:
+        assert span is None
+
+
+def test_run_metadata_includes_timings(offline_workflow, tracer):
+    """run() reports every node and the external calls it made"""
+    result = offline_workflow.run("What is MCP?")
+
+    timings = result["metadata"]["timings"]
+    assert set(timings["stages"]) == STAGES
+    assert {"gemini.rewrite", "serpapi", "gemini.answer"} <= set(timings["external"])
+
+    exported = read_traces(tracer)
+    assert len(exported) == 1
+    assert exported[0]["trace_id"] == timings["trace_id"]
+    serpapi = next(span for span in exported[0]["spans"] if span["name"] == "serpapi")
+    assert serpapi["parent"] == "web_search"
+    assert serpapi["attributes"]["results"] == 5
+
+
+def test_async_stream_records_answer_ttft(offline_workflow, tracer):
+    """Streamed answers record their Gemini span with time to first token"""
+
+    async def consume():
+        return [event async for event in offline_workflow.astream("What is MCP?")]
+
+    events = asyncio.run(consume())
+
+    assert set(events[-1]["metadata"]["timings"]["stages"]) == STAGES
+    assert tracing.current_trace() is None
+    spans = {span["name"]: span for span in read_traces(tracer)[0]["spans"]}
+    assert spans["gemini.answer"]["attributes"]["streamed"] is True
+    assert spans["gemini.answer"]["attributes"]["ttft_ms"] is not None
+    # The async client sees the raw response body
+    assert spans["serpapi"]["attributes"]["response_bytes"] > 0
+
+
+def test_batch_items_get_their_own_traces(offline_workflow, tracer):
+    """Each batch item has its own trace, including time queued for a stage slot"""
+    results = list(
+        offline_workflow.run_batch(
+            ["What is MCP?", "What is LangGraph?"], max_concurrency=1
+        )
+    )
+
+    trace_ids = {result["metadata"]["timings"]["trace_id"] for result in results}
+    assert len(trace_ids) == 2
+    for result in results:
+        assert set(result["metadata"]["timings"]["stages"]) == STAGES
+    for trace in read_traces(tracer):
+        search = next(span for span in trace["spans"] if span["name"] == "web_search")
+        assert "queue_wait_ms" in search["attributes"]
+
+
+def test_step_by_step_metadata_includes_timings(offline_workflow, tracer):
+    """process_step_by_step reports the same breakdown as the workflow"""
+    from server import MCPWebSearchServer
+
+    server = MCPWebSearchServer(registry=offline_workflow.registry)
+    result = server.process_step_by_step("What is MCP?")
+
+    timings = result["metadata"]["timings"]
+    assert set(timings["stages"]) == {
+        "query_processing",
+        "web_search",
+        "answer_generation",
+    }
+    assert {"gemini.rewrite", "serpapi", "gemini.answer"} <= set(timings["external"])
+    assert read_traces(tracer)[0]["name"] == "step_by_step"
+
+
+def test_disabled_tracer_adds_no_timings(offline_workflow):
+    """TRACE_ENABLED=false leaves metadata unchanged"""
+    previous = tracing.get_tracer()
+    tracing.set_tracer(Tracer(enabled=False))
+    try:
+        result = offline_workflow.run("What is MCP?")
+    finally:
+        tracing.set_tracer(previous)
+
+    assert "timings" not in result["metadata"]
+
+
+def test_export_respects_sample_rate(tmp_path):
+    """Unsampled traces still produce timings but are not written"""
+    tracer = Tracer(export_path=str(tmp_path / "traces.jsonl"), sample_rate=0.0)
+    with tracer.trace("run") as trace:
+        pass
+
+    assert isinstance(trace, Trace)
+    assert not (tmp_path / "traces.jsonl").exists()
@@ -1 +1 @@
-# Tools package for MCP Web Search Answer application
\ No newline at end of file
+# Tools package for MCP Web Search Answer application
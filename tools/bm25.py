@@ -0,0 +1,73 @@
+"""
+BM25 - Okapi BM25 relevance scoring vectorized with NumPy
+Shared by the extractive answerer and page passage selection
+"""
+
+from typing import List
+
+import numpy as np
+
+from tools.context_compactor import QUESTION_WORDS, WORD_PATTERN
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase word tokens
+
+    Args:
+        text: Any text
+
+    Returns:
+        Tokens in order (duplicates kept)
+    """
+    return WORD_PATTERN.findall(text.lower())
+
+
+def query_terms(question: str) -> List[str]:
+    """
+    Distinct content words of a question
+
+    Args:
+        question: User question or search query
+
+    Returns:
+        Sorted terms without question words ("what", "the", ...)
+    """
+    return sorted({word for word in tokenize(question) if word not in QUESTION_WORDS})
+
+
+def bm25_scores(
+    terms: List[str], documents: List[List[str]], k1: float = 1.5, b: float = 0.75
+) -> np.ndarray:
+    """
+    BM25 scores of tokenized documents against query terms
+
+    Document frequencies come from the documents themselves, so scores are
+    only comparable within one call.
+
+    Args:
+        terms: Distinct query terms
+        documents: Tokenized documents
+        k1: Term-frequency saturation
+        b: Length normalization
+
+    Returns:
+        Array with one score per document
+    """
+    if not terms or not documents:
+        return np.zeros(len(documents))
+
+    column = {term: j for j, term in enumerate(terms)}
+    tf = np.zeros((len(documents), len(terms)))
+    for row, tokens in enumerate(documents):
+        for token in tokens:
+            j = column.get(token)
+            if j is not None:
+                tf[row, j] += 1
+
+    lengths = np.array([len(tokens) for tokens in documents], dtype=float)
+    avg_length = lengths.mean() or 1.0
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log1p((len(documents) - df + 0.5) / (df + 0.5))
+    norm = k1 * (1 - b + b * lengths / avg_length)
+    return (idf * tf * (k1 + 1) / (tf + norm[:, None])).sum(axis=1)
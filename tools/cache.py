@@ -0,0 +1,534 @@
+"""
+Cache Backends - TTL + LRU caching with pluggable storage
+Used by the search tool to avoid repeat SerpAPI calls for identical queries,
+optionally backed by a persistent SQLite tier that survives restarts
+"""
+
+import abc
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_TTL = 3600
+DEFAULT_MAX_SIZE = 1024
+DEFAULT_PERSIST_MAX_SIZE = 100_000
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query for cache lookups
+
+    Args:
+        query: Raw query string
+
+    Returns:
+        Lowercased query with collapsed whitespace
+    """
+    return " ".join(query.lower().split())
+
+
+def make_cache_key(namespace: str, query: str, **params: Any) -> str:
+    """
+    Build a stable cache key from a query and its parameters
+
+    Args:
+        namespace: Key prefix identifying the cached value type
+        query: Query string (normalized before hashing)
+        **params: Extra parameters that change the result (num, safe, engine, ...)
+
+    Returns:
+        Namespaced hex digest key
+    """
+    payload = json.dumps({"q": normalize_query(query), **params}, sort_keys=True)
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+class CacheBackend(abc.ABC):
+    """
+    Base class for cache backends with shared hit/miss accounting
+    Subclasses must implement _get, _set, delete and clear
+    """
+
+    name = "base"
+
+    def __init__(self, ttl: float = DEFAULT_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Look up a value, recording a hit or miss
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Cached value or None if missing/expired
+        """
+        value = self._get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def peek(self, key: str) -> Optional[Any]:
+        """
+        Look up a value without touching the hit/miss counters
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Cached value or None if missing/expired
+        """
+        return self._get(key)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store a value
+
+        Args:
+            key: Cache key
+            value: JSON-serializable value to store
+            ttl: Optional TTL override in seconds
+        """
+        self._set(key, value, self.ttl if ttl is None else ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache hit/miss counters
+
+        Returns:
+            Dict with backend name, hits, misses, evictions and hit rate
+        """
+        total = self.hits + self.misses
+        return {
+            "backend": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    @abc.abstractmethod
+    def _get(self, key: str) -> Optional[Any]:
+        """Return the stored value, or None if it is missing or expired"""
+
+    @abc.abstractmethod
+    def _set(self, key: str, value: Any, ttl: float) -> None:
+        """Store a value for ttl seconds"""
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove one key"""
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        """Remove every key"""
+
+
+class MemoryCache(CacheBackend):
+    """
+    In-process cache with per-entry TTL and an LRU size bound
+    """
+
+    name = "memory"
+
+    def __init__(
+        self,
+        max_size: int = DEFAULT_MAX_SIZE,
+        ttl: float = DEFAULT_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        super().__init__(ttl=ttl)
+        self.max_size = max_size
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+
+            # Mark as most recently used
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, self._clock() + ttl)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisCache(CacheBackend):
+    """
+    Shared cache stored in Redis (see the `with-cache` docker-compose profile)
+
+    TTL is enforced by Redis key expiry; the size bound comes from the server's
+    maxmemory + allkeys-lru eviction policy.
+    """
+
+    name = "redis"
+
+    def __init__(
+        self,
+        client: Any = None,
+        url: Optional[str] = None,
+        ttl: float = DEFAULT_TTL,
+        prefix: str = "mcp:",
+    ):
+        super().__init__(ttl=ttl)
+        if client is None:
+            # Redis is optional - only needed for the shared "redis" backend
+            try:
+                import redis
+            except ImportError:
+                raise ImportError(
+                    "redis package is required for the redis cache backend"
+                )
+            client = redis.Redis.from_url(
+                url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+            )
+        self.client = client
+        self.prefix = prefix
+
+    def _get(self, key: str) -> Optional[Any]:
+        try:
+            raw = self.client.get(self.prefix + key)
+        except Exception as e:
+            print(f"⚠️  Redis cache read failed: {e}")
+            return None
+        return None if raw is None else json.loads(raw)
+
+    def _set(self, key: str, value: Any, ttl: float) -> None:
+        try:
+            self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+        except Exception as e:
+            print(f"⚠️  Redis cache write failed: {e}")
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Persistent cache in a SQLite database (WAL mode)
+
+    Several threads and worker processes can share one file: each thread gets
+    its own connection, and WAL lets readers proceed while a writer commits.
+    Expired entries and the least recently used entries beyond max_size are
+    removed periodically; compact() also reclaims the file space.
+    """
+
+    name = "sqlite"
+
+    # Run eviction once per this many writes
+    evict_every = 64
+
+    def __init__(
+        self,
+        path: str,
+        max_size: int = DEFAULT_PERSIST_MAX_SIZE,
+        ttl: float = DEFAULT_TTL,
+        clock: Callable[[], float] = time.time,
+    ):
+        super().__init__(ttl=ttl)
+        self.path = path
+        self.max_size = max_size
+        # Wall clock, since entries outlive the process
+        self._clock = clock
+        self._local = threading.local()
+        self._writes = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)"
+        )
+        self._evict()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's connection (reopened after fork)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _get(self, key: str) -> Optional[Any]:
+        now = self._clock()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            raw, expires_at = row
+            if expires_at <= now:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+
+            # Mark as recently used for LRU eviction
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            print(f"⚠️  SQLite cache read failed: {e}")
+            return None
+        return json.loads(raw)
+
+    def _set(self, key: str, value: Any, ttl: float) -> None:
+        now = self._clock()
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl, now),
+            )
+        except sqlite3.Error as e:
+            print(f"⚠️  SQLite cache write failed: {e}")
+            return
+
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            self._evict()
+
+    def _evict(self) -> int:
+        """Remove expired entries and trim to max_size; return the number removed"""
+        try:
+            conn = self._connect()
+            removed = conn.execute(
+                "DELETE FROM entries WHERE expires_at <= ?", (self._clock(),)
+            ).rowcount
+            overflow = (
+                conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                - self.max_size
+            )
+            if overflow > 0:
+                removed += conn.execute(
+                    "DELETE FROM entries WHERE key IN "
+                    "(SELECT key FROM entries ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                ).rowcount
+                with self._stats_lock:
+                    self.evictions += overflow
+        except sqlite3.Error as e:
+            print(f"⚠️  SQLite cache eviction failed: {e}")
+            return 0
+        return removed
+
+    def compact(self) -> int:
+        """
+        Evict stale entries, checkpoint the WAL and reclaim free pages
+
+        Returns:
+            Number of entries removed
+        """
+        removed = self._evict()
+        try:
+            conn = self._connect()
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("VACUUM")
+        except sqlite3.Error as e:
+            print(f"⚠️  SQLite cache compaction failed: {e}")
+        return removed
+
+    def delete(self, key: str) -> None:
+        self._connect().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM entries")
+
+    def close(self) -> None:
+        """Close this thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class TieredCache(CacheBackend):
+    """
+    Layered cache: fast tiers first, persistent tiers below
+
+    Reads fall through the layers and promote hits into the layers above;
+    writes go to every layer.
+    """
+
+    def __init__(self, layers: List[CacheBackend]):
+        super().__init__(ttl=layers[0].ttl)
+        self.layers = layers
+        self.name = "+".join(layer.name for layer in layers)
+        self.promotions = 0
+
+    def _get(self, key: str) -> Optional[Any]:
+        for depth, layer in enumerate(self.layers):
+            value = layer.peek(key)
+            if value is None:
+                continue
+            for upper in self.layers[:depth]:
+                upper.set(key, value)
+            if depth:
+                with self._stats_lock:
+                    self.promotions += 1
+            return value
+        return None
+
+    def _set(self, key: str, value: Any, ttl: float) -> None:
+        for layer in self.layers:
+            layer.set(key, value, ttl if layer is self.layers[0] else None)
+
+    def delete(self, key: str) -> None:
+        for layer in self.layers:
+            layer.delete(key)
+
+    def clear(self) -> None:
+        for layer in self.layers:
+            layer.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache hit/miss counters
+
+        Returns:
+            Base counters plus hits served by a lower (persistent) tier
+        """
+        stats = super().stats()
+        stats["lower_tier_hits"] = self.promotions
+        stats["evictions"] = sum(layer.evictions for layer in self.layers)
+        return stats
+
+
+def create_persistent_cache(
+    env_prefix: str = "SEARCH_CACHE", ttl: Optional[float] = None
+) -> Optional[SQLiteCache]:
+    """
+    Build the persistent SQLite tier for a cache, if CACHE_DIR is set
+
+    Reads CACHE_DIR (shared directory, one database file per cache),
+    {env_prefix}_PERSIST_MAX_SIZE and {env_prefix}_PERSIST_TTL.
+
+    Args:
+        env_prefix: Environment variable prefix of the cache
+        ttl: Default entry lifetime when {env_prefix}_PERSIST_TTL is unset
+
+    Returns:
+        SQLiteCache, or None when no cache directory is configured
+    """
+    cache_dir = os.getenv("CACHE_DIR")
+    if not cache_dir:
+        return None
+
+    ttl = float(
+        os.getenv(f"{env_prefix}_PERSIST_TTL", ttl if ttl is not None else DEFAULT_TTL)
+    )
+    max_size = int(
+        os.getenv(f"{env_prefix}_PERSIST_MAX_SIZE", DEFAULT_PERSIST_MAX_SIZE)
+    )
+    path = os.path.join(cache_dir, f"{env_prefix.lower()}.sqlite3")
+    try:
+        return SQLiteCache(path, max_size=max_size, ttl=ttl)
+    except (OSError, sqlite3.Error) as e:
+        print(f"⚠️  Persistent cache unavailable at {path}: {e}")
+        return None
+
+
+def create_cache(
+    backend: Optional[str] = None,
+    ttl: Optional[float] = None,
+    max_size: Optional[int] = None,
+    env_prefix: str = "SEARCH_CACHE",
+) -> Optional[CacheBackend]:
+    """
+    Build a cache backend from arguments or environment variables
+
+    Reads {env_prefix}_BACKEND (memory | redis | sqlite | none), {env_prefix}_TTL
+    and {env_prefix}_MAX_SIZE when the matching argument is not given. When
+    CACHE_DIR is set, a persistent SQLite tier is placed below the memory or
+    Redis backend so a restarted process starts warm.
+
+    Args:
+        backend: Backend name
+        ttl: Entry time-to-live in seconds
+        max_size: Maximum number of entries for the memory backend
+        env_prefix: Environment variable prefix
+
+    Returns:
+        Configured cache backend, or None when caching is disabled
+    """
+    backend = (backend or os.getenv(f"{env_prefix}_BACKEND", "memory")).lower()
+    ttl = float(ttl if ttl is not None else os.getenv(f"{env_prefix}_TTL", DEFAULT_TTL))
+    max_size = int(
+        max_size
+        if max_size is not None
+        else os.getenv(f"{env_prefix}_MAX_SIZE", DEFAULT_MAX_SIZE)
+    )
+
+    if backend in ("none", "off", "disabled"):
+        return None
+
+    persistent = create_persistent_cache(env_prefix, ttl)
+    if backend == "sqlite":
+        if persistent is not None:
+            return persistent
+        print("⚠️  CACHE_DIR is not set, falling back to in-memory cache")
+
+    primary: Optional[CacheBackend] = None
+    if backend == "redis":
+        try:
+            primary = RedisCache(ttl=ttl)
+        except ImportError as e:
+            print(f"⚠️  {e}, falling back to in-memory cache")
+    if primary is None:
+        primary = MemoryCache(max_size=max_size, ttl=ttl)
+
+    return TieredCache([primary, persistent]) if persistent is not None else primary
@@ -0,0 +1,165 @@
+"""
+Circuit Breaker - Stops calling an upstream that keeps failing or is too slow
+Opens when too many recent calls fail or exceed a latency threshold, stays
+open for a cool-down, then lets single probe calls through until one succeeds.
+A probe that never reports back (cancelled stream, abandoned task) expires
+after another cool-down.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker (thread-safe)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_ratio: float = 0.5,
+        min_calls: int = 5,
+        window: int = 20,
+        latency_threshold_ms: Optional[float] = None,
+        open_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            name: Upstream name used in logs
+            failure_ratio: Share of failed (or slow) calls in the window that opens the breaker
+            min_calls: Calls needed in the window before it can open
+            window: Recent calls considered
+            latency_threshold_ms: Successful calls slower than this count as failures
+            open_seconds: How long the breaker stays open before probing
+            clock: Monotonic time source
+        """
+        self.name = name
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.latency_threshold = (
+            latency_threshold_ms / 1000 if latency_threshold_ms else None
+        )
+        self.open_seconds = open_seconds
+        self.clock = clock
+
+        self.state = CLOSED
+        self.counts: Dict[str, int] = {"opened": 0, "rejected": 0}
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str) -> "CircuitBreaker":
+        """
+        Build a breaker from {prefix}_* environment variables
+
+        Args:
+            name: Upstream name
+            prefix: Environment variable prefix (e.g. ANSWER_BREAKER)
+
+        Returns:
+            Configured CircuitBreaker
+        """
+        latency = os.getenv(f"{prefix}_LATENCY_MS")
+        return cls(
+            name,
+            failure_ratio=float(os.getenv(f"{prefix}_FAILURE_RATIO", 0.5)),
+            min_calls=int(os.getenv(f"{prefix}_MIN_CALLS", 5)),
+            window=int(os.getenv(f"{prefix}_WINDOW", 20)),
+            latency_threshold_ms=float(latency) if latency else 10000.0,
+            open_seconds=float(os.getenv(f"{prefix}_OPEN_SECONDS", 30)),
+        )
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go to the upstream now
+
+        Returns:
+            True when closed, or for the single probe of a half-open breaker;
+            the caller must then report the outcome
+        """
+        with self._lock:
+            if (
+                self.state == OPEN
+                and self.clock() - self._opened_at >= self.open_seconds
+            ):
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and (
+                not self._probing or self.clock() - self._probe_at >= self.open_seconds
+            ):
+                self._probing = True
+                self._probe_at = self.clock()
+                return True
+            self.counts["rejected"] += 1
+            return False
+
+    def record_success(self, latency: Optional[float] = None) -> None:
+        """
+        Report a successful call
+
+        Args:
+            latency: Call duration in seconds (slow calls count as failures)
+        """
+        if (
+            self.latency_threshold is not None
+            and latency is not None
+            and latency > self.latency_threshold
+        ):
+            self.record_failure()
+            return
+        with self._lock:
+            if self.state == HALF_OPEN:
+                print(f"✅ {self.name} circuit closed")
+                self.state = CLOSED
+                self._outcomes.clear()
+            self._probing = False
+            self._outcomes.append(True)
+
+    def record_failure(self) -> None:
+        """Report a failed (or too slow) call"""
+        with self._lock:
+            self._probing = False
+            self._outcomes.append(False)
+            failures = self._outcomes.count(False)
+            if self.state == HALF_OPEN or (
+                self.state == CLOSED
+                and len(self._outcomes) >= self.min_calls
+                and failures / len(self._outcomes) >= self.failure_ratio
+            ):
+                if self.state == CLOSED:
+                    print(
+                        f"⚠️ {self.name} circuit opened ({failures}/{len(self._outcomes)} recent calls failed)"
+                    )
+                    self.counts["opened"] += 1
+                self.state = OPEN
+                self._opened_at = self.clock()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get breaker state and counters
+
+        Returns:
+            Dict with state, recent failure ratio, times opened and calls rejected
+        """
+        with self._lock:
+            recent = len(self._outcomes)
+            return {
+                "state": self.state,
+                "recent_failure_ratio": (
+                    self._outcomes.count(False) / recent if recent else 0.0
+                ),
+                **self.counts,
+            }
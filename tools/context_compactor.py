@@ -0,0 +1,274 @@
+"""
+Context Compactor - Shrinks search results before they reach AnswerAgent
+Removes near-duplicate snippets (word shingling), strips boilerplate and trims
+the context to a token budget, keeping the results most relevant to the question
+"""
+
+import math
+import os
+import re
+import threading
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from tools.search_results import (
+    RESULTS_HEADER,
+    SearchResult,
+    parse_results,
+    render_results,
+    rendered_tokens,
+)
+
+# Calls to action only count as furniture when they stand alone at the end of
+# the snippet, so "analysts expect to see more rate cuts" is kept
+CALL_TO_ACTION = r"(?:^|(?<=[.!?|»·-]))\s*"
+
+# Crawled page furniture that carries no evidence
+BOILERPLATE_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        CALL_TO_ACTION
+        + r"(read|learn|see|find out) more\s*(»|›|→|>|\.{3}|…|(at|on) \S+|here)?[.!]?\s*$",
+        CALL_TO_ACTION + r"click here\b[^.!?]{0,60}[.!]?\s*$",
+        CALL_TO_ACTION
+        + r"(subscribe|sign up|log in|sign in)( now| today)?( to [^.!?]{0,60})?[.!]?\s*$",
+        r"\bwe use cookies\b[^.]*\.?",
+        r"\ball rights reserved\b\.?",
+        r"\bskip to (main )?content\b",
+        r"(\.{3}|…)\s*$",
+    )
+]
+EMPTY_SNIPPETS = frozenset(["", "no description available"])
+
+WORD_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*")
+# Question words that say nothing about relevance
+QUESTION_WORDS = frozenset("""
+a an and are about at be by can did do does for from how i in is it me of on or
+tell the to was what when where which who why with you your latest recent new
+""".split())
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (about four characters per token for English)"""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def shingles(text: str, size: int = 3) -> FrozenSet[Tuple[str, ...]]:
+    """
+    Word shingles of a text
+
+    Args:
+        text: Text to shingle
+        size: Words per shingle
+
+    Returns:
+        Set of word tuples (the whole text when shorter than one shingle)
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) <= size:
+        return frozenset([tuple(words)]) if words else frozenset()
+    return frozenset(tuple(words[i : i + size]) for i in range(len(words) - size + 1))
+
+
+def jaccard(a: FrozenSet, b: FrozenSet) -> float:
+    """Jaccard similarity of two sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ContextCompactor:
+    """
+    Dedupe, clean and budget search results for the answer prompt
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 800,
+        duplicate_threshold: float = 0.6,
+        shingle_size: int = 3,
+    ):
+        """
+        Args:
+            token_budget: Maximum estimated tokens of context (0 disables trimming)
+            duplicate_threshold: Shingle similarity above which a snippet is a duplicate
+            shingle_size: Words per shingle
+        """
+        self.token_budget = token_budget
+        self.duplicate_threshold = duplicate_threshold
+        self.shingle_size = shingle_size
+
+        self.requests = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.duplicates_removed = 0
+        self.results_trimmed = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["ContextCompactor"]:
+        """
+        Build a compactor from CONTEXT_* environment variables
+
+        Returns:
+            Configured ContextCompactor, or None when compaction is disabled
+        """
+        if os.getenv("CONTEXT_COMPACTION_ENABLED", "true").lower() in (
+            "0",
+            "false",
+            "no",
+            "off",
+        ):
+            return None
+        return cls(
+            token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", 800)),
+            duplicate_threshold=float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", 0.6)),
+        )
+
+    def compact(self, search_results: str, question: str) -> Tuple[str, Dict[str, int]]:
+        """
+        Compact formatted search results
+
+        Args:
+            search_results: Text produced by render_results
+            question: Original user question, used to rank results
+
+        Returns:
+            Tuple of (compacted text, per-request stats as in compact_results)
+        """
+        results = parse_results(search_results)
+        if not results:
+            # Error messages and "No search results found." pass through untouched
+            tokens = estimate_tokens(search_results)
+            return search_results, self._record(tokens, tokens, 0, 0)
+        compacted, stats = self.compact_results(results, question)
+        return render_results(compacted), stats
+
+    def compact_results(
+        self, results: Sequence[SearchResult], question: str
+    ) -> Tuple[List[SearchResult], Dict[str, int]]:
+        """
+        Compact search result records
+
+        Token counts are estimated from the records' rendered length without
+        building the prompt text.
+
+        Args:
+            results: Search result records, best first
+            question: Original user question, used to rank results
+
+        Returns:
+            Tuple of (kept records, per-request stats with tokens_before,
+            tokens_after, tokens_saved, duplicates_removed and results_trimmed)
+        """
+        tokens_before = rendered_tokens(results)
+        if not results:
+            return [], self._record(tokens_before, tokens_before, 0, 0)
+
+        cleaned = [
+            result.replace(snippet=self._strip_boilerplate(result.snippet))
+            for result in results
+        ]
+        unique, duplicates = self._dedupe(cleaned)
+        kept = self._fit_budget(unique, question)
+
+        return kept, self._record(
+            tokens_before, rendered_tokens(kept), duplicates, len(unique) - len(kept)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cumulative compaction counters
+
+        Returns:
+            Dict with request count, token totals, tokens saved and savings ratio
+        """
+        with self._lock:
+            saved = self.tokens_before - self.tokens_after
+            return {
+                "requests": self.requests,
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "tokens_saved": saved,
+                "savings_ratio": (
+                    saved / self.tokens_before if self.tokens_before else 0.0
+                ),
+                "duplicates_removed": self.duplicates_removed,
+                "results_trimmed": self.results_trimmed,
+            }
+
+    def _strip_boilerplate(self, snippet: str) -> str:
+        for pattern in BOILERPLATE_PATTERNS:
+            snippet = pattern.sub("", snippet)
+        return " ".join(snippet.split()).strip(" -|·")
+
+    def _dedupe(self, results: List[SearchResult]) -> Tuple[List[SearchResult], int]:
+        """Keep the first of each group of near-identical snippets"""
+        kept: List[SearchResult] = []
+        seen: List[FrozenSet] = []
+        duplicates = 0
+        for result in results:
+            if result.snippet.lower() in EMPTY_SNIPPETS:
+                result = result.replace(snippet="")
+                text = result.title
+            else:
+                text = result.snippet
+            signature = shingles(text, self.shingle_size)
+            if any(
+                jaccard(signature, other) >= self.duplicate_threshold for other in seen
+            ):
+                duplicates += 1
+                continue
+            seen.append(signature)
+            kept.append(result)
+        return kept, duplicates
+
+    def _fit_budget(
+        self, results: List[SearchResult], question: str
+    ) -> List[SearchResult]:
+        """Drop the least relevant results until the context fits the budget"""
+        if not self.token_budget:
+            return results
+
+        terms = {
+            word
+            for word in WORD_PATTERN.findall(question.lower())
+            if word not in QUESTION_WORDS
+        }
+
+        def relevance(item: Tuple[int, SearchResult]) -> Tuple[float, int]:
+            position, result = item
+            words = set(
+                WORD_PATTERN.findall(f"{result.title} {result.snippet}".lower())
+            )
+            overlap = len(terms & words) / len(terms) if terms else 0.0
+            # Ties keep SerpAPI's ranking
+            return (-overlap, position)
+
+        budget = self.token_budget - estimate_tokens(RESULTS_HEADER)
+        selected = []
+        for position, result in sorted(enumerate(results), key=relevance):
+            cost = math.ceil(result.rendered_length(len(selected) + 1) / 4)
+            if selected and cost > budget:
+                continue
+            budget -= cost
+            selected.append(position)
+
+        # Present the survivors in their original order
+        return [results[position] for position in sorted(selected)]
+
+    def _record(
+        self, before: int, after: int, duplicates: int, trimmed: int
+    ) -> Dict[str, int]:
+        with self._lock:
+            self.requests += 1
+            self.tokens_before += before
+            self.tokens_after += after
+            self.duplicates_removed += duplicates
+            self.results_trimmed += trimmed
+        return {
+            "tokens_before": before,
+            "tokens_after": after,
+            "tokens_saved": before - after,
+            "duplicates_removed": duplicates,
+            "results_trimmed": trimmed,
+        }
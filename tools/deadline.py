@@ -0,0 +1,151 @@
+"""
+Deadline - Per-request time limit shared by the workflow stages
+The deadline is fixed when a request starts. Each stage runs with the time
+that is left and is cut once it runs out: async calls are cancelled, sync
+calls are abandoned to a worker thread so the caller returns on time
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class DeadlineExpired(Exception):
+    """A stage did not finish before the request deadline"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"{stage} cut by the request deadline")
+        self.stage = stage
+
+
+class Deadline:
+    """
+    Absolute end time of one request and the stages it cut
+    """
+
+    __slots__ = ("deadline_ms", "started", "expires_at", "cut_stages", "clock")
+
+    def __init__(self, deadline_ms: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            deadline_ms: Time the whole request may take, in milliseconds
+            clock: Monotonic clock in seconds (injectable for tests)
+        """
+        self.deadline_ms = float(deadline_ms)
+        self.clock = clock
+        self.started = clock()
+        self.expires_at = self.started + self.deadline_ms / 1000
+        self.cut_stages: List[str] = []
+
+    @classmethod
+    def start(cls, deadline_ms: Optional[float]) -> Optional["Deadline"]:
+        """
+        Start a deadline for a new request
+
+        Args:
+            deadline_ms: Request deadline (None or 0 means no deadline)
+
+        Returns:
+            Deadline, or None when the request is unbounded
+        """
+        return cls(deadline_ms) if deadline_ms and deadline_ms > 0 else None
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (0 once it has passed)"""
+        return max(0.0, self.expires_at - self.clock())
+
+    def expired(self) -> bool:
+        """Whether the deadline has passed"""
+        return self.clock() >= self.expires_at
+
+    def cut(self, stage: str) -> None:
+        """Record a stage that was cut short or skipped"""
+        if stage not in self.cut_stages:
+            self.cut_stages.append(stage)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summary for result metadata: deadline_ms, elapsed_ms and cut_stages"""
+        return {
+            "deadline_ms": self.deadline_ms,
+            "elapsed_ms": round((self.clock() - self.started) * 1000, 1),
+            "cut_stages": list(self.cut_stages),
+        }
+
+    def __repr__(self) -> str:
+        return f"Deadline({self.deadline_ms:.0f} ms, remaining={self.remaining() * 1000:.0f} ms)"
+
+
+def call_within(
+    deadline: Deadline,
+    stage: str,
+    executor: concurrent.futures.Executor,
+    fn: Callable[..., Any],
+    *args: Any,
+    share: float = 1.0,
+    **kwargs: Any,
+) -> Any:
+    """
+    Run a blocking call with at most a share of the time left before the deadline
+
+    Threads cannot be interrupted, so a call still running at the deadline is
+    abandoned: the caller gets DeadlineExpired right away and the worker
+    finishes (and is discarded) in the background, bounded by the client's
+    own timeouts.
+
+    Args:
+        deadline: Request deadline
+        stage: Stage name reported in the error
+        executor: Pool that runs the call
+        fn: Callable to run (in a copy of the caller's context)
+        *args: Positional arguments for fn
+        share: Fraction of the remaining time the call may use, leaving the
+            rest for later stages
+        **kwargs: Keyword arguments for fn
+
+    Returns:
+        The call's result
+
+    Raises:
+        DeadlineExpired: When the deadline (or the call's share) passes first
+    """
+    if deadline.expired():
+        raise DeadlineExpired(stage)
+    timeout = deadline.remaining() * share
+    future = executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise DeadlineExpired(stage) from None
+
+
+async def acall_within(
+    deadline: Deadline, stage: str, awaitable: Awaitable[Any], share: float = 1.0
+) -> Any:
+    """
+    Await a call with at most a share of the time left before the deadline
+
+    Args:
+        deadline: Request deadline
+        stage: Stage name reported in the error
+        awaitable: Coroutine to run; it is cancelled at the deadline, which
+            closes its outstanding HTTP requests
+        share: Fraction of the remaining time the call may use
+
+    Returns:
+        The call's result
+
+    Raises:
+        DeadlineExpired: When the deadline (or the call's share) passes first
+    """
+    if deadline.expired():
+        # Close the coroutine instead of leaving it never awaited
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExpired(stage)
+    try:
+        return await asyncio.wait_for(awaitable, deadline.remaining() * share)
+    except asyncio.TimeoutError:
+        raise DeadlineExpired(stage) from None
@@ -0,0 +1,447 @@
+"""
+Metrics - Prometheus instrumentation for the workflow, tools and server
+Stage and request latency histograms, LLM token and SerpAPI counters, in-flight
+gauges, and cache counters collected from the components' stats() at scrape time.
+Without prometheus_client installed every metric is a no-op.
+"""
+
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+try:
+    from prometheus_client import (
+        REGISTRY,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+        start_http_server,
+    )
+    from prometheus_client.core import CounterMetricFamily
+
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from tools.context_compactor import estimate_tokens
+
+# Seconds; LLM stages routinely take 0.5-5s
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    0.75,
+    1.0,
+    1.5,
+    2.0,
+    3.0,
+    5.0,
+    7.5,
+    10.0,
+    20.0,
+    30.0,
+)
+
+
+class _NoopMetric:
+    """Stand-in used when prometheus_client is not installed"""
+
+    def labels(self, *args: Any, **kwargs: Any) -> "_NoopMetric":
+        return self
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def dec(self, amount: float = 1) -> None:
+        pass
+
+
+def _metric(
+    kind: str, name: str, documentation: str, labels: List[str], **kwargs: Any
+) -> Any:
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    factory = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}[kind]
+    return factory(name, documentation, labels, **kwargs)
+
+
+STAGE_DURATION = _metric(
+    "histogram",
+    "mcp_stage_duration_seconds",
+    "Time spent in each workflow node",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+WORKFLOW_DURATION = _metric(
+    "histogram",
+    "mcp_workflow_duration_seconds",
+    "End-to-end WebSearchWorkflow latency",
+    ["method"],
+    buckets=LATENCY_BUCKETS,
+)
+WORKFLOW_IN_FLIGHT = _metric(
+    "gauge",
+    "mcp_workflow_in_flight",
+    "Workflow executions currently running",
+    ["method"],
+)
+REQUEST_DURATION = _metric(
+    "histogram",
+    "http_request_duration_seconds",
+    "Latency of requests served by MCPWebSearchServer",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS = _metric(
+    "counter",
+    "http_requests",
+    "Requests served by MCPWebSearchServer (status 500 on failure)",
+    ["endpoint", "status"],
+)
+REQUESTS_IN_FLIGHT = _metric(
+    "gauge",
+    "http_requests_in_flight",
+    "Requests currently being served",
+    ["endpoint"],
+)
+LLM_TOKENS = _metric(
+    "counter",
+    "mcp_llm_tokens",
+    "Gemini tokens by agent and direction (estimated when usage is not reported)",
+    ["agent", "direction"],
+)
+LLM_CALLS = _metric(
+    "counter",
+    "mcp_llm_calls",
+    "Gemini calls by agent and outcome",
+    ["agent", "status"],
+)
+SERPAPI_CALLS = _metric(
+    "counter",
+    "mcp_serpapi_calls",
+    "SerpAPI requests that reached the network",
+    ["status"],
+)
+
+
+@contextmanager
+def observe_stage(stage: str) -> Iterator[None]:
+    """Time a workflow node"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.labels(stage).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def track_workflow(method: str) -> Iterator[None]:
+    """Time an end-to-end workflow execution and count it as in flight"""
+    gauge = WORKFLOW_IN_FLIGHT.labels(method)
+    gauge.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        gauge.dec()
+        WORKFLOW_DURATION.labels(method).observe(time.perf_counter() - start)
+
+
+class RequestTracker:
+    """Times one server request; call fail() to report it as a 500"""
+
+    def __init__(self):
+        self.status = "200"
+
+    def fail(self) -> None:
+        self.status = "500"
+
+    def record(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Mark the request failed when the result says so; returns the result"""
+        if not result.get("metadata", {}).get("success", True):
+            self.fail()
+        return result
+
+
+@contextmanager
+def track_request(endpoint: str) -> Iterator[RequestTracker]:
+    """Time a server request, count it by status and track it as in flight"""
+    tracker = RequestTracker()
+    gauge = REQUESTS_IN_FLIGHT.labels(endpoint)
+    gauge.inc()
+    start = time.perf_counter()
+    try:
+        yield tracker
+    except BaseException:
+        tracker.fail()
+        raise
+    finally:
+        gauge.dec()
+        REQUEST_DURATION.labels(endpoint).observe(time.perf_counter() - start)
+        REQUESTS.labels(endpoint, tracker.status).inc()
+
+
+def record_serpapi_call(results: Optional[Dict[str, Any]]) -> None:
+    """Count a network SerpAPI call (None or an "error" body counts as an error)"""
+    SERPAPI_CALLS.labels(
+        "error" if results is None or "error" in results else "success"
+    ).inc()
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """
+    LangChain callback counting Gemini calls and tokens for one agent
+    """
+
+    def __init__(self, agent: str):
+        self.agent = agent
+        # Estimated prompt tokens per run, used when the model reports no usage
+        self._prompt_tokens: Dict[UUID, int] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[Any]],
+        *,
+        run_id: UUID,
+        **kwargs: Any,
+    ) -> None:
+        estimate = sum(
+            estimate_tokens(str(message.content))
+            for batch in messages
+            for message in batch
+        )
+        with self._lock:
+            self._prompt_tokens[run_id] = estimate
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            prompt_estimate = self._prompt_tokens.pop(run_id, 0)
+
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    input_tokens += usage.get("input_tokens", 0)
+                    output_tokens += usage.get("output_tokens", 0)
+                else:
+                    input_tokens += prompt_estimate
+                    output_tokens += estimate_tokens(generation.text)
+
+        LLM_CALLS.labels(self.agent, "success").inc()
+        LLM_TOKENS.labels(self.agent, "input").inc(input_tokens)
+        LLM_TOKENS.labels(self.agent, "output").inc(output_tokens)
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        with self._lock:
+            self._prompt_tokens.pop(run_id, None)
+        LLM_CALLS.labels(self.agent, "error").inc()
+
+
+class ComponentStatsCollector:
+    """
+    Exposes the counters components already keep (cache stats, rewrite paths,
+    coalescing, compaction, hedges, retries, answer modes and model tiers) as Prometheus counters at scrape time
+    """
+
+    def __init__(self):
+        self._workflows: "weakref.WeakSet" = weakref.WeakSet()
+
+    def track(self, workflow: Any) -> None:
+        self._workflows.add(workflow)
+
+    def collect(self) -> Iterator[Any]:
+        hits = CounterMetricFamily(
+            "mcp_cache_hits", "Cache hits by cache", labels=["cache"]
+        )
+        misses = CounterMetricFamily(
+            "mcp_cache_misses", "Cache misses by cache", labels=["cache"]
+        )
+        rewrites = CounterMetricFamily(
+            "mcp_query_rewrites", "Query rewrites by path", labels=["path"]
+        )
+        coalesced = CounterMetricFamily(
+            "mcp_search_coalesced", "Searches served by an identical in-flight call"
+        )
+        saved = CounterMetricFamily(
+            "mcp_context_tokens_saved", "Prompt tokens removed by context compaction"
+        )
+        hedges = CounterMetricFamily(
+            "mcp_upstream_hedges",
+            "Duplicate requests sent for slow upstream calls",
+            labels=["call"],
+        )
+        hedge_wins = CounterMetricFamily(
+            "mcp_upstream_hedge_wins",
+            "Hedged calls won by the duplicate",
+            labels=["call"],
+        )
+        retries = CounterMetricFamily(
+            "mcp_upstream_retries",
+            "Upstream call retries after transient errors",
+            labels=["call"],
+        )
+        answers = CounterMetricFamily(
+            "mcp_answers", "Answers by mode (llm, extractive)", labels=["mode"]
+        )
+        fallbacks = CounterMetricFamily(
+            "mcp_answer_fallbacks",
+            "Extractive answers served in place of Gemini",
+            labels=["reason"],
+        )
+        tier_calls = CounterMetricFamily(
+            "mcp_model_calls", "Gemini calls by model tier", labels=["tier"]
+        )
+        tier_cost = CounterMetricFamily(
+            "mcp_model_cost_usd",
+            "Estimated Gemini cost in USD by model tier",
+            labels=["tier"],
+        )
+        deadline_cuts = CounterMetricFamily(
+            "mcp_deadline_cuts",
+            "Workflow stages cut by the request deadline",
+            labels=["stage"],
+        )
+
+        totals: Dict[str, Dict[str, float]] = {}
+
+        def add(group: str, key: str, value: float) -> None:
+            totals.setdefault(group, {}).setdefault(key, 0)
+            totals[group][key] += value
+
+        for workflow in list(self._workflows):
+            caches = {
+                "search": workflow.search_tool.cache_stats(),
+                "rewrite": workflow.query_agent.cache_stats(),
+                "answer": workflow.answer_cache_stats(),
+                "passages": workflow.passage_index_stats(),
+            }
+            for cache, stats in caches.items():
+                if stats:
+                    add(
+                        "hits", cache, stats.get("hits", 0) + stats.get("fuzzy_hits", 0)
+                    )
+                    add("misses", cache, stats.get("misses", 0))
+            for path in ("cache", "rules", "llm"):
+                add("rewrites", path, workflow.query_agent.path_stats()[path])
+            add("coalesced", "", workflow.coalescing_stats().get("coalesced", 0))
+            add("saved", "", workflow.compaction_stats().get("tokens_saved", 0))
+            for call, stats in workflow.resilience_stats().items():
+                add("hedges", call, stats["hedges"])
+                add("hedge_wins", call, stats["hedge_wins"])
+                add("retries", call, stats["retries"])
+            modes = workflow.answer_mode_stats()
+            for mode in ("llm", "extractive"):
+                add("answers", mode, modes[mode])
+            for reason, value in modes["fallbacks"].items():
+                add("fallbacks", reason, value)
+            for tier, stats in workflow.router_stats()["tiers"].items():
+                add("tier_calls", tier, stats["calls"])
+                add("tier_cost", tier, stats["cost_usd"])
+            for stage, value in workflow.deadline_stats()["cuts"].items():
+                add("deadline_cuts", stage, value)
+
+        for cache, value in totals.get("hits", {}).items():
+            hits.add_metric([cache], value)
+        for cache, value in totals.get("misses", {}).items():
+            misses.add_metric([cache], value)
+        for path, value in totals.get("rewrites", {}).items():
+            rewrites.add_metric([path], value)
+        coalesced.add_metric([], totals.get("coalesced", {}).get("", 0))
+        saved.add_metric([], totals.get("saved", {}).get("", 0))
+        for family, group in (
+            (hedges, "hedges"),
+            (hedge_wins, "hedge_wins"),
+            (retries, "retries"),
+            (answers, "answers"),
+            (fallbacks, "fallbacks"),
+            (tier_calls, "tier_calls"),
+            (tier_cost, "tier_cost"),
+            (deadline_cuts, "deadline_cuts"),
+        ):
+            for key, value in totals.get(group, {}).items():
+                family.add_metric([key], value)
+        yield from (
+            hits,
+            misses,
+            rewrites,
+            coalesced,
+            saved,
+            hedges,
+            hedge_wins,
+            retries,
+            answers,
+            fallbacks,
+            tier_calls,
+            tier_cost,
+            deadline_cuts,
+        )
+
+
+_collector = ComponentStatsCollector()
+if PROMETHEUS_AVAILABLE:
+    REGISTRY.register(_collector)
+
+
+def track_component_stats(workflow: Any) -> None:
+    """Include a workflow's component counters in /metrics"""
+    _collector.track(workflow)
+
+
+def render() -> bytes:
+    """
+    Render all metrics in the Prometheus text format
+
+    Returns:
+        Exposition text (empty without prometheus_client)
+    """
+    return generate_latest(REGISTRY) if PROMETHEUS_AVAILABLE else b""
+
+
+_http_started = False
+_http_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None) -> bool:
+    """
+    Serve /metrics over HTTP once per process
+
+    Args:
+        port: Listen port (defaults to METRICS_PORT; nothing starts when unset)
+
+    Returns:
+        True when the endpoint is being served
+    """
+    global _http_started
+    port = port if port is not None else int(os.getenv("METRICS_PORT", 0) or 0)
+    if not port:
+        return False
+    if not PROMETHEUS_AVAILABLE:
+        print("⚠️  prometheus_client not installed, /metrics disabled")
+        return False
+
+    with _http_lock:
+        if not _http_started:
+            start_http_server(port, addr=os.getenv("METRICS_ADDR", "0.0.0.0"))
+            _http_started = True
+            print(f"📈 Serving Prometheus metrics on :{port}/metrics")
+    return True
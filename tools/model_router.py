@@ -0,0 +1,476 @@
+"""
+Model Router - Picks a Gemini tier and output length per question and stage
+Classifies each question by length, entity count and comparison/multi-hop
+cues, routes simple lookups to a cheaper, faster model and complex questions
+to a stronger one, and fits the plan into an optional per-request latency
+budget using the latencies observed for each tier
+"""
+
+import contextvars
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+DEFAULT_MODEL = "gemini-2.0-flash-exp"  # Using Gemini 2.5 Flash Lite equivalent
+
+# Tiers from cheapest and fastest to strongest
+TIERS = ("fast", "standard", "deep")
+
+# Stages that call Gemini
+MODEL_STAGES = ("rewrite", "answer")
+
+# Tier each complexity level asks for when routing is enabled
+LEVEL_TIERS = {"simple": "fast", "moderate": "standard", "complex": "deep"}
+
+# Output token limit per stage and complexity level
+OUTPUT_TOKENS = {
+    "rewrite": {"simple": 32, "moderate": 48, "complex": 64},
+    "answer": {"simple": 256, "moderate": 512, "complex": 1024},
+}
+
+# Default model, list price per 1M input/output tokens (USD) and prior latency
+# per stage (ms) for each tier, until calls have been observed
+TIER_DEFAULTS = {
+    "fast": ("gemini-2.0-flash-lite", 0.075, 0.30, {"rewrite": 250.0, "answer": 600.0}),
+    "standard": (DEFAULT_MODEL, 0.10, 0.40, {"rewrite": 400.0, "answer": 1000.0}),
+    "deep": ("gemini-2.5-flash", 0.30, 2.50, {"rewrite": 800.0, "answer": 2500.0}),
+}
+
+# Prior latency (ms) of the workflow stages that do not call Gemini
+NODE_PRIORS = {"web_search": 800.0, "page_fetching": 1000.0}
+
+COMPARISON_CUES = re.compile(
+    r"\b(vs\.?|versus|compared?|comparing|comparison|differences?\s+between|better\s+than|"
+    r"worse\s+than|faster\s+than|cheaper\s+than|pros\s+and\s+cons|which\s+is\s+(better|faster|cheaper))\b",
+    re.IGNORECASE,
+)
+MULTI_HOP_CUES = re.compile(
+    r"\b(and\s+(then|also|how|why|what|when|where|who)|as\s+well\s+as|because|why\s+did|how\s+did|"
+    r"before|after|impact\s+of|relationship\s+between|led\s+to|caused?\s+by)\b",
+    re.IGNORECASE,
+)
+ENTITY_PATTERN = re.compile(r"\b(?:[A-Z][\w.+-]*(?:\s+[A-Z][\w.+-]*)*|\d[\d.,]*%?)")
+
+_current_route: contextvars.ContextVar = contextvars.ContextVar(
+    "model_route", default=None
+)
+
+
+def classify(question: str) -> Dict[str, Any]:
+    """
+    Estimate how hard a question is to answer
+
+    Args:
+        question: User question
+
+    Returns:
+        Dict with level (simple, moderate, complex), score and the features
+        it was computed from (words, entities, comparison, multi_hop)
+    """
+    question = question.strip()
+    words = question.split()
+    # Capitalized runs and numbers; a lone capitalized first word is just the sentence start
+    entities = [
+        match.group(0)
+        for match in ENTITY_PATTERN.finditer(question)
+        if match.start() > 0 or " " in match.group(0) or not match.group(0).istitle()
+    ]
+    comparison = bool(COMPARISON_CUES.search(question))
+    multi_hop = bool(MULTI_HOP_CUES.search(question)) or question.count("?") > 1
+
+    score = 0
+    score += 2 if len(words) > 25 else 1 if len(words) > 12 else 0
+    score += 2 if len(entities) >= 4 else 1 if len(entities) >= 2 else 0
+    score += 2 if comparison else 0
+    score += 2 if multi_hop else 0
+    level = "complex" if score >= 4 else "moderate" if score >= 2 else "simple"
+    return {
+        "level": level,
+        "score": score,
+        "words": len(words),
+        "entities": len(entities),
+        "comparison": comparison,
+        "multi_hop": multi_hop,
+    }
+
+
+class StageRoute:
+    """Model tier and output length for one stage of one request"""
+
+    __slots__ = ("stage", "tier", "model", "max_output_tokens")
+
+    def __init__(self, stage: str, tier: str, model: str, max_output_tokens: int):
+        self.stage = stage
+        self.tier = tier
+        self.model = model
+        self.max_output_tokens = max_output_tokens
+
+    def __repr__(self) -> str:
+        return f"StageRoute({self.stage!r}, tier={self.tier!r}, max_output_tokens={self.max_output_tokens})"
+
+
+class Route:
+    """
+    Routing decision for one request
+
+    answer_mode is "extractive" when even the fast tier does not fit the
+    budget; light means optional stages (page fetching, fan-out) are skipped.
+    """
+
+    __slots__ = (
+        "complexity",
+        "stages",
+        "budget_ms",
+        "estimate_ms",
+        "answer_mode",
+        "light",
+    )
+
+    def __init__(
+        self,
+        complexity: Dict[str, Any],
+        stages: Dict[str, StageRoute],
+        budget_ms: Optional[float] = None,
+        estimate_ms: float = 0.0,
+        answer_mode: Optional[str] = None,
+        light: bool = False,
+    ):
+        self.complexity = complexity
+        self.stages = stages
+        self.budget_ms = budget_ms
+        self.estimate_ms = estimate_ms
+        self.answer_mode = answer_mode
+        self.light = light
+
+    def stage(self, name: str) -> Optional[StageRoute]:
+        """Route of a stage, or None when it is not routed"""
+        return self.stages.get(name)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summary for response metadata"""
+        summary: Dict[str, Any] = {
+            "complexity": self.complexity["level"],
+            "tiers": {name: stage.tier for name, stage in self.stages.items()},
+            "max_output_tokens": {
+                name: stage.max_output_tokens for name, stage in self.stages.items()
+            },
+            "estimate_ms": round(self.estimate_ms, 1),
+        }
+        if self.budget_ms is not None:
+            summary["budget_ms"] = self.budget_ms
+        if self.answer_mode:
+            summary["answer_mode"] = self.answer_mode
+        if self.light:
+            summary["light"] = True
+        return summary
+
+
+class ModelRouter:
+    """
+    Per-request model tier selection with latency and cost tracking (thread-safe)
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        models: Optional[Dict[str, str]] = None,
+        prices: Optional[Dict[str, Tuple[float, float]]] = None,
+        default_tier: str = "standard",
+        default_budget_ms: Optional[float] = None,
+        client_factory: Optional[Callable[[str], Any]] = None,
+        alpha: float = 0.2,
+    ):
+        """
+        Args:
+            enabled: Route by question complexity; when off every request
+                uses default_tier unless a latency budget forces a faster one
+            models: Model name per tier (TIER_DEFAULTS for missing tiers)
+            prices: (input, output) USD per 1M tokens per tier
+            default_tier: Tier of unrouted requests (the shared client's model)
+            default_budget_ms: Budget applied when a request passes none
+            client_factory: Builds a chat model client for a model name;
+                without one every tier reuses the shared client and only the
+                output length changes
+            alpha: Weight of the newest call in the latency averages
+        """
+        if default_tier not in TIERS:
+            raise ValueError(
+                f"default_tier must be one of {TIERS}, got {default_tier!r}"
+            )
+        self.enabled = enabled
+        self.models = {
+            tier: (models or {}).get(tier) or TIER_DEFAULTS[tier][0] for tier in TIERS
+        }
+        self.prices = {
+            tier: (prices or {}).get(tier) or TIER_DEFAULTS[tier][1:3] for tier in TIERS
+        }
+        self.default_tier = default_tier
+        self.default_budget_ms = default_budget_ms
+        self.client_factory = client_factory
+        self.alpha = alpha
+
+        # Latency averages (ms) per (stage, tier); node stages use tier ""
+        self._latency: Dict[Tuple[str, str], float] = {}
+        self._clients: Dict[str, Any] = {}
+        self.route_counts: Dict[str, int] = {"simple": 0, "moderate": 0, "complex": 0}
+        self.budget_counts: Dict[str, int] = {
+            "budgeted": 0,
+            "downgraded": 0,
+            "light": 0,
+            "extractive": 0,
+        }
+        self.usage: Dict[str, Dict[str, float]] = {
+            tier: {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0}
+            for tier in TIERS
+        }
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(
+        cls,
+        default_model: Optional[str] = None,
+        client_factory: Optional[Callable[[str], Any]] = None,
+    ) -> "ModelRouter":
+        """
+        Build a router from MODEL_ROUTER_* environment variables
+
+        Args:
+            default_model: Model of the standard tier (defaults to GEMINI_MODEL)
+            client_factory: Builds a chat model client for a model name
+
+        Returns:
+            Configured ModelRouter
+        """
+        models = {
+            "fast": os.getenv("MODEL_ROUTER_FAST_MODEL"),
+            "standard": default_model or os.getenv("GEMINI_MODEL", DEFAULT_MODEL),
+            "deep": os.getenv("MODEL_ROUTER_DEEP_MODEL"),
+        }
+        prices = {}
+        for tier in TIERS:
+            price = os.getenv(f"MODEL_ROUTER_{tier.upper()}_PRICE")
+            if price:
+                input_price, output_price = (float(value) for value in price.split(","))
+                prices[tier] = (input_price, output_price)
+        budget = float(os.getenv("MODEL_ROUTER_BUDGET_MS", 0))
+        return cls(
+            enabled=os.getenv("MODEL_ROUTER_ENABLED", "false").lower()
+            in ("1", "true", "yes", "on"),
+            models=models,
+            prices=prices,
+            default_budget_ms=budget or None,
+            client_factory=client_factory,
+        )
+
+    def route(
+        self,
+        question: str,
+        budget_ms: Optional[float] = None,
+        optional_stages: Sequence[str] = (),
+    ) -> Optional[Route]:
+        """
+        Plan the model tiers and modes of a request
+
+        The complexity level picks each stage's tier (when enabled). With a
+        budget, the slowest stage is moved down a tier until the estimate
+        fits; if the fast tier is still too slow, optional stages are
+        skipped, then the answer is made extractive.
+
+        Args:
+            question: User question
+            budget_ms: End-to-end latency budget (defaults to MODEL_ROUTER_BUDGET_MS)
+            optional_stages: Workflow stages that may be skipped (e.g. page_fetching)
+
+        Returns:
+            Route, or None when routing is off and there is no budget
+        """
+        budget_ms = budget_ms if budget_ms is not None else self.default_budget_ms
+        if not self.enabled and budget_ms is None:
+            return None
+
+        complexity = classify(question)
+        level = complexity["level"]
+        wanted = LEVEL_TIERS[level] if self.enabled else self.default_tier
+        tiers = {stage: TIERS.index(wanted) for stage in MODEL_STAGES}
+        light = False
+        answer_mode = None
+
+        def estimate() -> float:
+            total = self.latency("web_search")
+            if not light:
+                total += sum(self.latency(stage) for stage in optional_stages)
+            for stage, index in tiers.items():
+                if stage == "answer" and answer_mode:
+                    continue
+                total += self.latency(stage, TIERS[index])
+            return total
+
+        downgraded = False
+        while budget_ms is not None and estimate() > budget_ms:
+            slower = [stage for stage, index in tiers.items() if index > 0]
+            if slower:
+                stage = max(
+                    slower, key=lambda name: self.latency(name, TIERS[tiers[name]])
+                )
+                tiers[stage] -= 1
+                downgraded = True
+            elif optional_stages and not light:
+                light = True
+            elif answer_mode is None:
+                answer_mode = "extractive"
+            else:
+                break
+
+        stages = {
+            stage: StageRoute(
+                stage,
+                TIERS[index],
+                self.models[TIERS[index]],
+                OUTPUT_TOKENS[stage][level],
+            )
+            for stage, index in tiers.items()
+        }
+        with self._lock:
+            self.route_counts[level] += 1
+            if budget_ms is not None:
+                self.budget_counts["budgeted"] += 1
+                self.budget_counts["downgraded"] += int(downgraded)
+                self.budget_counts["light"] += int(light)
+                self.budget_counts["extractive"] += int(answer_mode is not None)
+        return Route(complexity, stages, budget_ms, estimate(), answer_mode, light)
+
+    def latency(self, stage: str, tier: str = "") -> float:
+        """Expected latency (ms) of a stage on a tier: the observed average, or the prior"""
+        observed = self._latency.get((stage, tier))
+        if observed is not None:
+            return observed
+        if tier:
+            return TIER_DEFAULTS[tier][3].get(stage, 0.0)
+        return NODE_PRIORS.get(stage, 0.0)
+
+    def record(
+        self,
+        stage: str,
+        tier: str,
+        elapsed_ms: Optional[float],
+        input_chars: int = 0,
+        output_chars: int = 0,
+    ) -> None:
+        """
+        Record a finished Gemini call
+
+        Args:
+            stage: rewrite or answer
+            tier: Tier the call ran on
+            elapsed_ms: Call latency (None for batched calls, which only count cost)
+            input_chars: Prompt size
+            output_chars: Response size
+        """
+        # About four characters per token, like the context compactor's estimate
+        input_tokens = -(-input_chars // 4)
+        output_tokens = -(-output_chars // 4)
+        input_price, output_price = self.prices[tier]
+        with self._lock:
+            if elapsed_ms is not None:
+                self._update(stage, tier, elapsed_ms)
+            usage = self.usage[tier]
+            usage["calls"] += 1
+            usage["input_tokens"] += input_tokens
+            usage["output_tokens"] += output_tokens
+            usage["cost_usd"] += (
+                input_tokens * input_price + output_tokens * output_price
+            ) / 1_000_000
+
+    def observe(self, stage: str, elapsed_ms: float) -> None:
+        """Record the latency of a workflow stage that does not call Gemini"""
+        if stage not in NODE_PRIORS:
+            return
+        with self._lock:
+            self._update(stage, "", elapsed_ms)
+
+    def _update(self, stage: str, tier: str, elapsed_ms: float) -> None:
+        """Fold one latency sample into its average (lock held)"""
+        previous = self._latency.get((stage, tier))
+        self._latency[(stage, tier)] = (
+            elapsed_ms
+            if previous is None
+            else previous + self.alpha * (elapsed_ms - previous)
+        )
+
+    def client(self, tier: str, default: Any) -> Any:
+        """
+        Chat model client of a tier, built on first use
+
+        Args:
+            tier: Tier name
+            default: Shared client, used for the default tier's model and
+                when no client factory is configured
+
+        Returns:
+            Chat model client
+        """
+        model = self.models[tier]
+        if self.client_factory is None or model == self.models[self.default_tier]:
+            return default
+        with self._lock:
+            if model not in self._clients:
+                self._clients[model] = self.client_factory(model)
+            return self._clients[model]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get routing decisions, per-tier latency and cost
+
+        Returns:
+            Dict with enabled, routes per complexity level, budget outcomes
+            (budgeted, downgraded, light, extractive), total cost_usd and per
+            tier the model, calls, tokens, cost_usd and latency_ms per stage
+        """
+        with self._lock:
+            tiers = {
+                tier: {
+                    "model": self.models[tier],
+                    **{
+                        key: round(value, 6) if key == "cost_usd" else int(value)
+                        for key, value in self.usage[tier].items()
+                    },
+                    "latency_ms": {
+                        stage: round(self._latency[(stage, tier)], 1)
+                        for stage in MODEL_STAGES
+                        if (stage, tier) in self._latency
+                    },
+                }
+                for tier in TIERS
+            }
+            return {
+                "enabled": self.enabled,
+                "routes": dict(self.route_counts),
+                **self.budget_counts,
+                "cost_usd": round(
+                    sum(usage["cost_usd"] for usage in self.usage.values()), 6
+                ),
+                "tiers": tiers,
+            }
+
+
+def current_route() -> Optional[Route]:
+    """Get the route of the request being processed, if any"""
+    return _current_route.get()
+
+
+def current_stage(stage: str) -> Optional[StageRoute]:
+    """Get the active route of a stage (None outside routed requests)"""
+    route = _current_route.get()
+    return route.stage(stage) if route is not None else None
+
+
+@contextmanager
+def activate(route: Optional[Route]) -> Iterator[Optional[Route]]:
+    """Make a request's route current, so the agents pick its tiers"""
+    token = _current_route.set(route)
+    try:
+        yield route
+    finally:
+        _current_route.reset(token)
@@ -0,0 +1,538 @@
+"""
+Page Fetcher - Adds passages from the top result pages to the search results
+Fetches the top-k result links concurrently over a pooled HTTP client with a
+per-host limit, stream-parses the HTML under hard byte and time caps, keeps
+the main text (paragraphs, not navigation or link lists) and appends the
+passages most relevant to the question to their result's snippet
+"""
+
+import asyncio
+import codecs
+import concurrent.futures
+import contextvars
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from html.parser import HTMLParser
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from tools.bm25 import bm25_scores, query_terms, tokenize
+from tools.search_results import SearchResult
+from tools.tracing import span
+
+# Elements whose text is page furniture rather than content
+SKIP_TAGS = frozenset(
+    [
+        "script",
+        "style",
+        "noscript",
+        "template",
+        "svg",
+        "head",
+        "nav",
+        "header",
+        "footer",
+        "aside",
+        "form",
+        "button",
+        "select",
+        "iframe",
+    ]
+)
+
+# Elements that end a paragraph of text
+BLOCK_TAGS = frozenset(
+    [
+        "p",
+        "div",
+        "section",
+        "article",
+        "main",
+        "li",
+        "ul",
+        "ol",
+        "td",
+        "th",
+        "tr",
+        "table",
+        "h1",
+        "h2",
+        "h3",
+        "h4",
+        "h5",
+        "h6",
+        "blockquote",
+        "pre",
+        "br",
+        "hr",
+        "dd",
+        "dt",
+        "figcaption",
+    ]
+)
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; mcp-web-search/1.0)",
+    "Accept": "text/html,application/xhtml+xml;q=0.9,text/plain;q=0.8",
+}
+
+
+class MainTextExtractor(HTMLParser):
+    """
+    Incremental HTML parser keeping content paragraphs
+
+    Fed decoded chunks as they arrive; holds at most max_chars of text, so
+    memory stays flat however large the page is.
+    """
+
+    def __init__(
+        self, max_chars: int = 20000, min_words: int = 8, max_link_density: float = 0.5
+    ):
+        """
+        Args:
+            max_chars: Text kept per page; the caller stops reading once reached
+            min_words: Shorter blocks (menus, captions, buttons) are dropped
+            max_link_density: Blocks with a larger share of link text are dropped
+        """
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.min_words = min_words
+        self.max_link_density = max_link_density
+        self.paragraphs: List[str] = []
+        self.chars = 0
+        self._skip_depth = 0
+        self._link_depth = 0
+        self._block: List[str] = []
+        self._block_chars = 0
+        self._link_chars = 0
+
+    @property
+    def full(self) -> bool:
+        """Whether enough text has been kept"""
+        return self.chars >= self.max_chars
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self._flush()
+        elif tag == "a":
+            self._link_depth += 1
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self._flush()
+        elif tag == "a":
+            self._link_depth = max(0, self._link_depth - 1)
+
+    def handle_data(self, data: str) -> None:
+        if self._skip_depth or self.full:
+            return
+        self._block.append(data)
+        self._block_chars += len(data)
+        if self._link_depth:
+            self._link_chars += len(data.strip())
+        # A page without block tags must not accumulate unbounded text
+        if self._block_chars >= self.max_chars:
+            self._flush()
+
+    def close(self) -> None:
+        super().close()
+        self._flush()
+
+    def _flush(self) -> None:
+        """End the current block, keeping it when it reads like content"""
+        text = " ".join("".join(self._block).split())
+        link_chars = self._link_chars
+        self._block, self._block_chars, self._link_chars = [], 0, 0
+        if (
+            not text
+            or len(text.split()) < self.min_words
+            or link_chars / len(text) > self.max_link_density
+        ):
+            return
+        text = text[: self.max_chars - self.chars]
+        self.paragraphs.append(text)
+        self.chars += len(text)
+
+
+class Page:
+    """
+    Outcome of one page fetch (partial text survives a timeout)
+    """
+
+    __slots__ = ("url", "extractor", "bytes", "truncated", "error", "elapsed_ms")
+
+    def __init__(self, url: str, max_chars: int):
+        self.url = url
+        self.extractor = MainTextExtractor(max_chars)
+        self.bytes = 0
+        self.truncated = False
+        self.error: Optional[str] = None
+        self.elapsed_ms = 0.0
+
+    @property
+    def paragraphs(self) -> List[str]:
+        # Copied: a timed-out sync fetch may still be appending
+        return list(self.extractor.paragraphs)
+
+
+class PageFetcher:
+    """
+    Concurrent, capped page fetching and passage selection
+    """
+
+    def __init__(
+        self,
+        top_k: int = 3,
+        max_bytes: int = 512 * 1024,
+        timeout: float = 3.0,
+        per_host: int = 2,
+        max_connections: int = 20,
+        max_passages: int = 6,
+        passage_words: int = 60,
+        max_text_chars: int = 20000,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        sync_transport: Optional[httpx.BaseTransport] = None,
+    ):
+        """
+        Args:
+            top_k: Result links fetched per question
+            max_bytes: Bytes read per page before it is cut off
+            timeout: Seconds allowed per page, queueing for its host included
+            per_host: Concurrent requests to one host
+            max_connections: Pooled connections in total
+            max_passages: Passages added to the results per question
+            passage_words: Words per passage
+            max_text_chars: Main text kept per page
+            transport: Optional httpx transport for the async client (tests, benchmarks)
+            sync_transport: Optional httpx transport for the sync client
+        """
+        self.top_k = top_k
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.per_host = per_host
+        self.max_connections = max_connections
+        self.max_passages = max_passages
+        self.passage_words = passage_words
+        self.max_text_chars = max_text_chars
+        self.transport = transport
+        self.sync_transport = sync_transport
+
+        self._client: Optional[httpx.Client] = None
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        # Async client and per-host semaphores are bound to the loop that created them
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_loop: Any = None
+        self._async_host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["PageFetcher"]:
+        """
+        Build a page fetcher from PAGE_FETCH_* environment variables
+
+        Returns:
+            Configured PageFetcher, or None unless PAGE_FETCH_ENABLED is set
+        """
+        if os.getenv("PAGE_FETCH_ENABLED", "false").lower() not in (
+            "1",
+            "true",
+            "yes",
+            "on",
+        ):
+            return None
+        return cls(
+            top_k=int(os.getenv("PAGE_FETCH_TOP_K", 3)),
+            max_bytes=int(os.getenv("PAGE_FETCH_MAX_BYTES", 512 * 1024)),
+            timeout=float(os.getenv("PAGE_FETCH_TIMEOUT", 3)),
+            per_host=int(os.getenv("PAGE_FETCH_PER_HOST", 2)),
+            max_connections=int(os.getenv("PAGE_FETCH_MAX_CONNECTIONS", 20)),
+            max_passages=int(os.getenv("PAGE_FETCH_PASSAGES", 6)),
+            passage_words=int(os.getenv("PAGE_FETCH_PASSAGE_WORDS", 60)),
+        )
+
+    def enrich(
+        self, results: Sequence[SearchResult], question: str
+    ) -> Tuple[List[SearchResult], Dict[str, Any]]:
+        """
+        Fetch the top result pages and add their most relevant passages
+
+        Args:
+            results: Search result records
+            question: Original user question
+
+        Returns:
+            Tuple of (records with passages appended to snippets, fetch stats)
+        """
+        links = self._links(results)
+        if not links:
+            return list(results), {}
+        return self._merge(results, self.fetch(links), question)
+
+    async def aenrich(
+        self, results: Sequence[SearchResult], question: str
+    ) -> Tuple[List[SearchResult], Dict[str, Any]]:
+        """Async variant of enrich"""
+        links = self._links(results)
+        if not links:
+            return list(results), {}
+        return self._merge(results, await self.afetch(links), question)
+
+    def fetch(self, urls: List[str]) -> List[Page]:
+        """
+        Fetch pages in parallel threads; returns once all finish or the timeout passes
+
+        Args:
+            urls: Page URLs
+
+        Returns:
+            One Page per URL, in order
+        """
+        deadline = time.monotonic() + self.timeout
+        pages = [Page(url, self.max_text_chars) for url in urls]
+        executor = self._get_executor()
+        futures = {
+            executor.submit(
+                contextvars.copy_context().run, self._fetch_into, page, deadline
+            ): page
+            for page in pages
+        }
+        done, pending = concurrent.futures.wait(futures, timeout=self.timeout)
+        for future in pending:
+            # The worker stops at its next chunk; keep what it has parsed so far
+            futures[future].error = "timeout"
+        return pages
+
+    async def afetch(self, urls: List[str]) -> List[Page]:
+        """Async variant of fetch; every page shares the pooled client"""
+        pages = [Page(url, self.max_text_chars) for url in urls]
+
+        async def one(page: Page) -> None:
+            try:
+                await asyncio.wait_for(self._afetch_into(page), self.timeout)
+            except asyncio.TimeoutError:
+                page.error = "timeout"
+
+        await asyncio.gather(*(one(page) for page in pages))
+        return pages
+
+    def _fetch_into(self, page: Page, deadline: float) -> None:
+        """Stream one page through its extractor until done or a cap is hit"""
+        start = time.perf_counter()
+        with span("page.fetch", url=page.url) as current:
+            try:
+                # Waiting for a host slot counts against the page, so a slot timeout is recorded like any failure
+                with self._host_slot(page.url, deadline), self._get_client().stream(
+                    "GET", page.url
+                ) as response:
+                    decoder = self._decoder(response)
+                    for chunk in response.iter_bytes():
+                        if (
+                            self._feed(page, decoder, chunk)
+                            or time.monotonic() >= deadline
+                        ):
+                            break
+                page.extractor.close()
+            except Exception as e:
+                page.error = page.error or str(e) or type(e).__name__
+            finally:
+                self._finish(page, start, current)
+
+    async def _afetch_into(self, page: Page) -> None:
+        """Async variant of _fetch_into; the caller enforces the time cap"""
+        start = time.perf_counter()
+        with span("page.fetch", url=page.url) as current:
+            try:
+                # Binds the client and host slots to this event loop first
+                client = self._get_async_client()
+                async with self._ahost_slot(page.url):
+                    async with client.stream("GET", page.url) as response:
+                        decoder = self._decoder(response)
+                        async for chunk in response.aiter_bytes():
+                            if self._feed(page, decoder, chunk):
+                                break
+                page.extractor.close()
+            except Exception as e:
+                page.error = str(e) or type(e).__name__
+            finally:
+                self._finish(page, start, current)
+
+    def _decoder(self, response: httpx.Response) -> Any:
+        """Incremental text decoder for an HTML response; raises for other content"""
+        response.raise_for_status()
+        content_type = response.headers.get("content-type", "text/html").lower()
+        if "html" not in content_type and "text/plain" not in content_type:
+            raise ValueError(f"unsupported content type {content_type}")
+        try:
+            return codecs.getincrementaldecoder(response.charset_encoding or "utf-8")(
+                errors="replace"
+            )
+        except LookupError:
+            return codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def _feed(self, page: Page, decoder: Any, chunk: bytes) -> bool:
+        """Parse one chunk; True once the byte or text cap is reached"""
+        chunk = chunk[: self.max_bytes - page.bytes]
+        page.bytes += len(chunk)
+        page.extractor.feed(decoder.decode(chunk))
+        if page.bytes >= self.max_bytes or page.extractor.full:
+            page.truncated = True
+            return True
+        return False
+
+    def _finish(self, page: Page, start: float, current: Any) -> None:
+        page.elapsed_ms = (time.perf_counter() - start) * 1000
+        if current is not None:
+            current.set(
+                bytes=page.bytes,
+                truncated=page.truncated,
+                paragraphs=len(page.extractor.paragraphs),
+            )
+            if page.error:
+                current.set(error=page.error)
+
+    def _links(self, results: Sequence[SearchResult]) -> List[str]:
+        """Links of the top-k results"""
+        links = []
+        for result in results:
+            link = result.link
+            if link.startswith(("http://", "https://")) and link not in links:
+                links.append(link)
+        return links[: self.top_k]
+
+    def _merge(
+        self, results: Sequence[SearchResult], pages: List[Page], question: str
+    ) -> Tuple[List[SearchResult], Dict[str, Any]]:
+        """Append the best passages across all pages to their results' snippets"""
+        passages: List[Tuple[str, str]] = []
+        for page in pages:
+            for paragraph in page.paragraphs:
+                words = paragraph.split()
+                for i in range(0, len(words), self.passage_words):
+                    passages.append(
+                        (page.url, " ".join(words[i : i + self.passage_words]))
+                    )
+
+        selected: Dict[str, List[str]] = {}
+        if passages:
+            scores = bm25_scores(
+                query_terms(question), [tokenize(text) for _, text in passages]
+            )
+            best = sorted(range(len(passages)), key=lambda i: -scores[i])[
+                : self.max_passages
+            ]
+            # Keep page order within each result
+            for i in sorted(i for i in best if scores[i] > 0):
+                url, text = passages[i]
+                selected.setdefault(url, []).append(text)
+
+        enriched = [
+            (
+                result.replace(
+                    snippet=" ".join([result.snippet, *selected[result.link]])
+                )
+                if result.link in selected
+                else result
+            )
+            for result in results
+        ]
+
+        stats = {
+            "pages": len(pages),
+            "fetched": sum(1 for page in pages if page.paragraphs),
+            "failed": sum(1 for page in pages if page.error and not page.paragraphs),
+            "truncated": sum(1 for page in pages if page.truncated),
+            "bytes": sum(page.bytes for page in pages),
+            "passages": sum(len(texts) for texts in selected.values()),
+            "slowest_ms": round(
+                max((page.elapsed_ms for page in pages), default=0.0), 3
+            ),
+        }
+        return enriched, stats
+
+    @contextmanager
+    def _host_slot(self, url: str, deadline: float) -> Iterator[None]:
+        """Hold one of the per-host slots (sync); raises when none frees up in time"""
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            slots = self._host_slots.setdefault(
+                host, threading.BoundedSemaphore(self.per_host)
+            )
+        if not slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise TimeoutError(f"no free connection slot for {host}")
+        try:
+            yield
+        finally:
+            slots.release()
+
+    @asynccontextmanager
+    async def _ahost_slot(self, url: str) -> AsyncIterator[None]:
+        """Hold one of the per-host slots (async)"""
+        host = urlsplit(url).netloc.lower()
+        slots = self._async_host_slots.setdefault(
+            host, asyncio.Semaphore(self.per_host)
+        )
+        async with slots:
+            yield
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+        )
+
+    def _get_client(self) -> httpx.Client:
+        """Lazily create the pooled sync client (thread-safe)"""
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    transport=self.sync_transport,
+                    timeout=self.timeout,
+                    limits=self._limits(),
+                    headers=HEADERS,
+                    follow_redirects=True,
+                )
+            return self._client
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """Lazily create the pooled async client for the running event loop"""
+        loop = asyncio.get_running_loop()
+        if (
+            self._async_client is None
+            or self._async_client.is_closed
+            or self._async_loop is not loop
+        ):
+            self._async_loop = loop
+            self._async_host_slots = {}
+            self._async_client = httpx.AsyncClient(
+                transport=self.transport,
+                timeout=self.timeout,
+                limits=self._limits(),
+                headers=HEADERS,
+                follow_redirects=True,
+            )
+        return self._async_client
+
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """Lazily create the thread pool used by sync fetches"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=int(os.getenv("PAGE_FETCH_WORKERS", 16)),
+                    thread_name_prefix="page-fetch",
+                )
+            return self._executor
+
+    async def aclose(self) -> None:
+        """Close the pooled async HTTP client"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
@@ -0,0 +1,378 @@
+"""
+Passage Index - Local retrieval over previously retrieved evidence
+Accumulates result snippets (and fetched page passages) with their URLs and
+timestamps in a BM25 inverted index, optionally with dense vectors held in a
+memory-mapped NumPy matrix, so repeat topics can be answered without SerpAPI
+"""
+
+import os
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from tools.bm25 import query_terms, tokenize
+from tools.rank_fusion import canonical_url
+from tools.search_results import SearchResult
+
+
+def hash_embedding(tokens: List[str], dims: int) -> np.ndarray:
+    """
+    Dense vector of a token list via the hashing trick
+
+    Unigrams and bigrams are hashed (crc32, stable across processes) into
+    signed buckets, so no embedding model or API call is needed.
+
+    Args:
+        tokens: Tokenized text
+        dims: Vector size
+
+    Returns:
+        L2-normalized float32 vector (all zeros for no tokens)
+    """
+    vector = np.zeros(dims, dtype=np.float32)
+    for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+        bucket = zlib.crc32(feature.encode("utf-8"))
+        vector[bucket % dims] += 1.0 if bucket & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class PassageIndex:
+    """
+    Bounded BM25 (and optional dense) index of evidence passages
+
+    Passages live in a fixed number of slots reused in insertion order, so
+    memory stays bounded; postings of an evicted slot are removed with it.
+    """
+
+    def __init__(
+        self,
+        max_passages: int = 5000,
+        max_age: float = 86400,
+        min_coverage: float = 0.75,
+        min_passages: int = 3,
+        max_results: int = 5,
+        passage_words: int = 60,
+        dense_dims: int = 0,
+        dense_dir: Optional[str] = None,
+        min_similarity: float = 0.5,
+        k1: float = 1.5,
+        b: float = 0.75,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Args:
+            max_passages: Passages kept; the oldest are evicted first
+            max_age: Seconds a passage counts as fresh evidence
+            min_coverage: Share of the query's terms a passage must contain
+            min_passages: Qualifying fresh passages needed to skip the search
+            max_results: Results rendered from a hit
+            passage_words: Words per indexed passage
+            dense_dims: Dense vector size (0 for BM25 only)
+            dense_dir: Directory for the file backing the memory-mapped
+                vectors (the system temp directory when not set)
+            min_similarity: Cosine similarity a passage needs in dense mode
+            k1: BM25 term-frequency saturation
+            b: BM25 length normalization
+            clock: Time source (for tests)
+        """
+        self.max_passages = max_passages
+        self.max_age = max_age
+        self.min_coverage = min_coverage
+        self.min_passages = min_passages
+        self.max_results = max_results
+        self.passage_words = passage_words
+        self.dense_dims = dense_dims
+        self.min_similarity = min_similarity
+        self.k1 = k1
+        self.b = b
+        self.clock = clock
+
+        # Slot arrays; a timestamp of 0 marks a free slot
+        self._passages: List[Optional[Tuple[str, str, str]]] = [None] * max_passages
+        self._terms: List[Optional[Counter]] = [None] * max_passages
+        self._keys: List[Optional[Tuple[str, str]]] = [None] * max_passages
+        self._lengths = np.zeros(max_passages)
+        self._timestamps = np.zeros(max_passages)
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._slots: Dict[Tuple[str, str], int] = {}
+        self._next = 0
+        self._count = 0
+
+        self._vectors: Optional[np.ndarray] = None
+        if dense_dims:
+            handle, path = tempfile.mkstemp(
+                prefix="passage-vectors-", suffix=".f32", dir=dense_dir
+            )
+            os.close(handle)
+            self._vectors = np.memmap(
+                path, dtype=np.float32, mode="w+", shape=(max_passages, dense_dims)
+            )
+            try:
+                # The mapping outlives the name; nothing is left behind on exit
+                os.unlink(path)
+            except OSError:
+                pass
+
+        self.lookups = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["PassageIndex"]:
+        """
+        Build a passage index from PASSAGE_INDEX_* environment variables
+
+        Returns:
+            Configured PassageIndex, or None unless PASSAGE_INDEX_ENABLED is set
+        """
+        if os.getenv("PASSAGE_INDEX_ENABLED", "false").lower() not in (
+            "1",
+            "true",
+            "yes",
+            "on",
+        ):
+            return None
+        dense_dims = int(os.getenv("PASSAGE_INDEX_DENSE_DIMS", 0))
+        dense_dir = os.getenv("CACHE_DIR") or None
+        if dense_dims and dense_dir:
+            os.makedirs(dense_dir, exist_ok=True)
+        return cls(
+            max_passages=int(os.getenv("PASSAGE_INDEX_MAX_PASSAGES", 5000)),
+            max_age=float(os.getenv("PASSAGE_INDEX_MAX_AGE", 86400)),
+            min_coverage=float(os.getenv("PASSAGE_INDEX_MIN_COVERAGE", 0.75)),
+            min_passages=int(os.getenv("PASSAGE_INDEX_MIN_PASSAGES", 3)),
+            max_results=int(os.getenv("PASSAGE_INDEX_MAX_RESULTS", 5)),
+            dense_dims=dense_dims,
+            dense_dir=dense_dir,
+            min_similarity=float(os.getenv("PASSAGE_INDEX_MIN_SIMILARITY", 0.5)),
+        )
+
+    def add_results(self, results: Sequence[SearchResult]) -> int:
+        """
+        Index the results of a search
+
+        Args:
+            results: Search result records (snippets may carry appended
+                page passages)
+
+        Returns:
+            Number of passages added or refreshed
+        """
+        added = 0
+        for result in results:
+            words = result.snippet.split()
+            for i in range(0, len(words), self.passage_words):
+                added += self.add(
+                    " ".join(words[i : i + self.passage_words]),
+                    result.link,
+                    result.title,
+                )
+        return added
+
+    def add(
+        self, text: str, url: str, title: str = "", timestamp: Optional[float] = None
+    ) -> bool:
+        """
+        Index one passage; an already indexed passage only gets a new timestamp
+
+        Args:
+            text: Passage text
+            url: Source URL
+            title: Source title
+            timestamp: Retrieval time (defaults to now)
+
+        Returns:
+            True when the passage was indexed
+        """
+        tokens = tokenize(text)
+        if not tokens:
+            return False
+        timestamp = self.clock() if timestamp is None else timestamp
+        key = (canonical_url(url), " ".join(tokens))
+
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is not None:
+                self._timestamps[slot] = timestamp
+                return True
+
+            slot = self._next
+            self._next = (self._next + 1) % self.max_passages
+            self._evict(slot)
+
+            terms = Counter(tokens)
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[slot] = tf
+            self._passages[slot] = (text, url, title)
+            self._terms[slot] = terms
+            self._lengths[slot] = len(tokens)
+            self._timestamps[slot] = timestamp
+            self._keys[slot] = key
+            self._slots[key] = slot
+            self._count += 1
+            if self._vectors is not None:
+                self._vectors[slot] = hash_embedding(tokens, self.dense_dims)
+            return True
+
+    def search(
+        self, query: str, limit: int = 10, max_age: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Rank fresh passages against a query
+
+        Args:
+            query: Search query or question
+            limit: Maximum passages returned
+            max_age: Freshness window in seconds (defaults to max_age)
+
+        Returns:
+            Passages best first, each with text, link, title, age_s, score,
+            coverage (share of query terms contained) and qualifies; dense
+            indexes add similarity
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+        now = self.clock()
+        window = self.max_age if max_age is None else max_age
+
+        with self._lock:
+            if not self._count:
+                return []
+            live = self._timestamps > 0
+            fresh = live & (self._timestamps >= now - window)
+            scores = np.zeros(self.max_passages)
+            matched = np.zeros(self.max_passages)
+            average_length = self._lengths[live].mean() or 1.0
+            norm = self.k1 * (1 - self.b + self.b * self._lengths / average_length)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                slots = np.fromiter(postings.keys(), dtype=int, count=len(postings))
+                tf = np.fromiter(postings.values(), dtype=float, count=len(postings))
+                idf = np.log1p(
+                    (self._count - len(postings) + 0.5) / (len(postings) + 0.5)
+                )
+                scores[slots] += idf * tf * (self.k1 + 1) / (tf + norm[slots])
+                matched[slots] += 1
+            coverage = matched / len(terms)
+
+            similarity = None
+            if self._vectors is not None:
+                # Vectorized cosine search; stored vectors are unit length
+                similarity = np.asarray(
+                    self._vectors @ hash_embedding(tokenize(query), self.dense_dims)
+                )
+                rank_by = similarity
+                qualifies = fresh & (similarity >= self.min_similarity) & (matched > 0)
+            else:
+                rank_by = scores
+                qualifies = fresh & (coverage >= self.min_coverage)
+
+            candidates = np.flatnonzero(fresh & (matched > 0))
+            order = candidates[np.argsort(-rank_by[candidates], kind="stable")][:limit]
+            results = []
+            for slot in order:
+                text, link, title = self._passages[slot]
+                result = {
+                    "text": text,
+                    "link": link,
+                    "title": title,
+                    "age_s": round(float(now - self._timestamps[slot]), 3),
+                    "score": round(float(scores[slot]), 4),
+                    "coverage": round(float(coverage[slot]), 4),
+                    "qualifies": bool(qualifies[slot]),
+                }
+                if similarity is not None:
+                    result["similarity"] = round(float(similarity[slot]), 4)
+                results.append(result)
+            return results
+
+    def lookup(self, query: str) -> Optional[Tuple[List[SearchResult], Dict[str, Any]]]:
+        """
+        Serve a search from the index when enough fresh evidence matches
+
+        Args:
+            query: Search query
+
+        Returns:
+            Tuple of (one SearchResult per source, lookup stats), or None
+            when the external search is still needed
+        """
+        passages = [
+            p for p in self.search(query, limit=self.max_results * 4) if p["qualifies"]
+        ]
+        with self._lock:
+            self.lookups += 1
+            if len(passages) < self.min_passages:
+                return None
+            self.hits += 1
+
+        # One result per source, its passages in rank order
+        by_link: Dict[str, Dict[str, Any]] = {}
+        for passage in passages:
+            result = by_link.setdefault(
+                canonical_url(passage["link"]), {**passage, "texts": []}
+            )
+            result["texts"].append(passage["text"])
+        results = list(by_link.values())[: self.max_results]
+
+        records = [
+            SearchResult(
+                result["title"] or "No title",
+                " ".join(result["texts"]),
+                result["link"],
+                position,
+            )
+            for position, result in enumerate(results, 1)
+        ]
+        stats = {
+            "hit": True,
+            "passages": sum(len(result["texts"]) for result in results),
+            "results": len(results),
+            "oldest_s": max(passage["age_s"] for passage in passages),
+        }
+        return records, stats
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get index size and lookup counters
+
+        Returns:
+            Dict with passages, lookups, hits, misses and hit_rate
+        """
+        with self._lock:
+            return {
+                "passages": self._count,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "misses": self.lookups - self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _evict(self, slot: int) -> None:
+        """Free a slot and drop its postings (lock held)"""
+        if self._passages[slot] is None:
+            return
+        for term in self._terms[slot]:
+            postings = self._postings[term]
+            del postings[slot]
+            if not postings:
+                del self._postings[term]
+        del self._slots[self._keys[slot]]
+        self._passages[slot] = None
+        self._terms[slot] = None
+        self._keys[slot] = None
+        self._lengths[slot] = 0
+        self._timestamps[slot] = 0
+        self._count -= 1
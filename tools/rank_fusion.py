@@ -0,0 +1,80 @@
+"""
+Rank Fusion - Merges result lists from several search queries
+Results are deduplicated by canonical URL and ordered by reciprocal-rank
+fusion, which rewards pages that several queries rank highly without having
+to compare scores across queries
+"""
+
+from typing import Dict, List, Sequence
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from tools.search_results import SearchResult
+
+# Query parameters that track the click rather than identify the page
+TRACKING_PARAMS = frozenset(
+    ["gclid", "fbclid", "msclkid", "mc_cid", "mc_eid", "ref", "ref_src", "srsltid"]
+)
+
+# Standard RRF damping constant (Cormack et al.); larger values flatten rank differences
+RRF_K = 60
+
+
+def canonical_url(link: str) -> str:
+    """
+    Normalize a result URL so the same page found by different queries matches
+
+    Args:
+        link: Result URL
+
+    Returns:
+        URL with scheme, "www.", fragment, tracking parameters and trailing
+        slash removed and the host lowercased (the raw link when it has no host)
+    """
+    parts = urlsplit(link.strip())
+    if not parts.netloc:
+        return link.strip()
+
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode(
+        sorted(
+            (key, value)
+            for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if key.lower() not in TRACKING_PARAMS and not key.lower().startswith("utm_")
+        )
+    )
+    return urlunsplit(("", host, parts.path.rstrip("/"), query, "")).lstrip("/")
+
+
+def reciprocal_rank_fusion(
+    result_lists: Sequence[List[SearchResult]], k: int = RRF_K, limit: int = 0
+) -> List[SearchResult]:
+    """
+    Fuse ranked result lists into one
+
+    Each result scores sum(1 / (k + rank)) over the lists it appears in. Ties
+    keep the order of first appearance (earlier query, then higher rank).
+
+    Args:
+        result_lists: Ranked results per query
+        k: RRF damping constant
+        limit: Maximum results returned (0 for all)
+
+    Returns:
+        Deduplicated results, best first; each keeps the record from its best-ranked appearance
+    """
+    scores: Dict[str, float] = {}
+    best: Dict[str, SearchResult] = {}
+    best_rank: Dict[str, int] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, 1):
+            key = canonical_url(result.link) or f"{result.title}\n{result.snippet}"
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            if rank < best_rank.get(key, rank + 1):
+                best[key] = result
+                best_rank[key] = rank
+
+    # dicts keep insertion order, and sorted is stable, so ties stay in order of first appearance
+    fused = [best[key] for key in sorted(scores, key=lambda key: -scores[key])]
+    return fused[:limit] if limit else fused
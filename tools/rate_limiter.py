@@ -0,0 +1,489 @@
+"""
+Rate Limiter - Client-side quota protection for Gemini and SerpAPI
+A token bucket caps the request rate per upstream and an AIMD limiter adapts
+the number of concurrent calls, backing off on 429/5xx responses and latency
+growth. Requests over either limit wait in a bounded queue instead of failing.
+"""
+
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, Optional
+
+# Exception class names used by google-api-core / google-genai for quota and server errors
+OVERLOAD_ERRORS = {
+    "ResourceExhausted",
+    "TooManyRequests",
+    "ServiceUnavailable",
+    "InternalServerError",
+    "ServerError",
+    "DeadlineExceeded",
+}
+
+OVERLOAD_PATTERN = re.compile(
+    r"\b(429|5\d\d)\b|rate.?limit|quota|resource.?exhausted|run out of searches",
+    re.IGNORECASE,
+)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request cannot be admitted before its queue timeout (or the queue is full)"""
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """
+    Whether an upstream error means "slow down" rather than "bad request"
+
+    Args:
+        error: Exception raised by the upstream call
+
+    Returns:
+        True for 429/5xx responses and quota errors
+    """
+    if isinstance(error, RateLimitExceeded):
+        return False
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    if type(error).__name__ in OVERLOAD_ERRORS:
+        return True
+    return bool(OVERLOAD_PATTERN.search(str(error)))
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at a fixed rate; callers reserve a token and sleep
+    until it is due, so bursts are smoothed into a steady request rate
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            rate: Tokens (requests) per second
+            burst: Bucket capacity (defaults to one second's worth, at least 1)
+            clock: Monotonic time source
+        """
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _reserve(self, timeout: Optional[float]) -> float:
+        """Take a token (possibly ahead of time); return how long to wait for it"""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if timeout is not None and wait > timeout:
+                raise RateLimitExceeded(f"rate limit: next slot in {wait:.2f}s")
+            self._tokens -= 1
+            return wait
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """
+        Wait for a token
+
+        Args:
+            timeout: Maximum wait in seconds (None waits as long as needed)
+
+        Returns:
+            Seconds waited
+        """
+        wait = self._reserve(timeout)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, timeout: Optional[float] = None) -> float:
+        """Async variant of acquire"""
+        wait = self._reserve(timeout)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class _Waiter:
+    """A queued request; woken by the limiter when a slot is handed to it"""
+
+    __slots__ = ("granted", "wake")
+
+    def __init__(self, wake: Callable[[], None]):
+        self.granted = False
+        self.wake = wake
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit shared by sync and asyncio callers
+
+    The limit grows by about one slot per limit's worth of healthy calls and
+    is cut multiplicatively on overload errors or when latency rises well
+    above the best latency seen. Latency is tracked per kind of call
+    (rewrite, answer, ...), so a mix of fast and slow calls sharing one
+    limit is not mistaken for congestion.
+    """
+
+    def __init__(
+        self,
+        initial: int = 16,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        backoff: float = 0.5,
+        latency_tolerance: float = 2.0,
+        max_queue: int = 256,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            initial: Starting concurrency limit
+            min_limit: Lowest limit backoff can reach
+            max_limit: Highest limit growth can reach
+            backoff: Multiplier applied to the limit on congestion
+            latency_tolerance: Latency / baseline ratio treated as congestion
+            max_queue: Requests allowed to wait for a slot before rejecting
+            clock: Monotonic time source
+        """
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.max_queue = max_queue
+        self.clock = clock
+
+        self.in_flight = 0
+        # Best and smoothed latency per kind of call
+        self.baseline: Dict[str, float] = {}
+        self.latency: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected": 0,
+            "backoffs": 0,
+        }
+        self._waiters: Deque[_Waiter] = deque()
+        self._last_backoff = float("-inf")
+        self._lock = threading.Lock()
+
+    def _admit(self, waiter_factory: Callable[[], _Waiter]) -> Optional[_Waiter]:
+        """Take a free slot, or enqueue a waiter; returns None when admitted"""
+        with self._lock:
+            if self.in_flight < int(self.limit) and not self._waiters:
+                self.in_flight += 1
+                self.counts["admitted"] += 1
+                return None
+            if len(self._waiters) >= self.max_queue:
+                self.counts["rejected"] += 1
+                raise RateLimitExceeded(
+                    f"concurrency limit: {len(self._waiters)} requests already queued"
+                )
+            waiter = waiter_factory()
+            self._waiters.append(waiter)
+            self.counts["queued"] += 1
+            return waiter
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Drop a waiter that gave up; returns True if it was granted a slot meanwhile"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            self.counts["rejected"] += 1
+            return False
+
+    def acquire(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait for a concurrency slot
+
+        Args:
+            timeout: Maximum wait in seconds (None waits as long as needed)
+
+        Raises:
+            RateLimitExceeded: The queue is full or the timeout passed
+        """
+        event = threading.Event()
+        waiter = self._admit(lambda: _Waiter(event.set))
+        if waiter is None or event.wait(timeout) or self._abandon(waiter):
+            return
+        raise RateLimitExceeded(f"concurrency limit: no slot within {timeout}s")
+
+    async def aacquire(self, timeout: Optional[float] = None) -> None:
+        """Async variant of acquire"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake() -> None:
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._admit(lambda: _Waiter(wake))
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            if not self._abandon(waiter):
+                raise RateLimitExceeded(
+                    f"concurrency limit: no slot within {timeout}s"
+                ) from None
+        except BaseException:
+            # Cancelled while queued: give back a slot handed over in the meantime
+            if self._abandon(waiter):
+                self.release()
+            raise
+
+    def release(
+        self,
+        latency: Optional[float] = None,
+        overloaded: bool = False,
+        kind: str = "call",
+    ) -> None:
+        """
+        Return a slot and adapt the limit to the call's outcome
+
+        Args:
+            latency: Call duration in seconds (None leaves the limit unchanged)
+            overloaded: Whether the upstream signalled overload (429/5xx, quota)
+            kind: Kind of call, compared only against its own latency baseline
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if overloaded:
+                self._back_off(self.latency.get(kind, 0.0))
+            elif latency is not None:
+                self._observe(latency, kind)
+            self._grant()
+
+    def _observe(self, latency: float, kind: str) -> None:
+        """Track latency against the baseline of its kind; grow or back off accordingly"""
+        smoothed = self.latency.get(kind)
+        smoothed = latency if smoothed is None else 0.8 * smoothed + 0.2 * latency
+        self.latency[kind] = smoothed
+        baseline = self.baseline.get(kind)
+        if baseline is None or latency < baseline:
+            baseline = latency
+        else:
+            # Let the baseline follow slow, persistent upstream changes
+            baseline += (latency - baseline) * 0.05
+        self.baseline[kind] = baseline
+
+        if smoothed > baseline * self.latency_tolerance:
+            self._back_off(smoothed)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def _back_off(self, interval: float) -> None:
+        """Cut the limit, at most once per typical call duration (interval, in seconds)"""
+        now = self.clock()
+        if now - self._last_backoff < interval:
+            return
+        self._last_backoff = now
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        self.counts["backoffs"] += 1
+
+    def _grant(self) -> None:
+        """Hand free slots to queued waiters in arrival order"""
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self.in_flight += 1
+            self.counts["admitted"] += 1
+            waiter.wake()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the current limit and admission counters
+
+        Returns:
+            Dict with limit, in_flight, queued_now, smoothed and baseline
+            latency per kind of call, and counters
+        """
+        with self._lock:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "queued_now": len(self._waiters),
+                "latency_ms": {
+                    kind: value * 1000 for kind, value in self.latency.items()
+                },
+                "baseline_ms": {
+                    kind: value * 1000 for kind, value in self.baseline.items()
+                },
+                **self.counts,
+            }
+
+
+class Permit:
+    """An admitted upstream call; mark it overloaded when the response says so"""
+
+    def __init__(self, queue_wait: float, kind: str = "call"):
+        self.queue_wait_ms = queue_wait * 1000
+        self.kind = kind
+        self.is_overloaded = False
+        self.start = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+
+    def overloaded(self) -> None:
+        self.is_overloaded = True
+
+    def first_token(self) -> None:
+        """Mark a streamed call's first token; its latency is measured up to here"""
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+
+class UpstreamLimiter:
+    """
+    Token bucket plus adaptive concurrency limit for one upstream service
+    """
+
+    def __init__(
+        self,
+        name: str,
+        bucket: Optional[TokenBucket] = None,
+        concurrency: Optional[AdaptiveLimiter] = None,
+        queue_timeout: Optional[float] = 30.0,
+    ):
+        """
+        Args:
+            name: Upstream name (serpapi, gemini)
+            bucket: Request rate limit (None for no rate limit)
+            concurrency: Adaptive concurrency limit (None for no limit)
+            queue_timeout: Longest a request may wait for admission, in seconds
+        """
+        self.name = name
+        self.bucket = bucket
+        self.concurrency = concurrency
+        self.queue_timeout = queue_timeout
+
+    @classmethod
+    def from_env(cls, name: str) -> "UpstreamLimiter":
+        """
+        Build a limiter from {NAME}_* environment variables
+
+        Args:
+            name: Upstream name; SERPAPI_* or GEMINI_* settings are read
+
+        Returns:
+            Configured UpstreamLimiter
+        """
+        prefix = name.upper()
+        if os.getenv("RATE_LIMIT_ENABLED", "true").lower() in (
+            "0",
+            "false",
+            "no",
+            "off",
+        ):
+            return cls(name, queue_timeout=None)
+
+        rate = float(os.getenv(f"{prefix}_RATE_LIMIT", 0))
+        burst = os.getenv(f"{prefix}_RATE_BURST")
+        max_limit = int(os.getenv(f"{prefix}_MAX_CONCURRENCY", 64))
+        return cls(
+            name,
+            bucket=(
+                TokenBucket(rate, float(burst) if burst else None) if rate > 0 else None
+            ),
+            concurrency=AdaptiveLimiter(
+                initial=int(
+                    os.getenv(f"{prefix}_INITIAL_CONCURRENCY", min(16, max_limit))
+                ),
+                min_limit=int(os.getenv(f"{prefix}_MIN_CONCURRENCY", 1)),
+                max_limit=max_limit,
+                max_queue=int(os.getenv(f"{prefix}_QUEUE_SIZE", 256)),
+            ),
+            queue_timeout=float(os.getenv(f"{prefix}_QUEUE_TIMEOUT", 30)),
+        )
+
+    def _remaining(self, deadline: Optional[float]) -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def _finish(self, permit: Permit, error: Optional[BaseException]) -> None:
+        if self.concurrency is None:
+            return
+        if error is not None and not is_overload_error(error):
+            # Failures unrelated to load say nothing about the right limit
+            self.concurrency.release()
+            return
+        overloaded = permit.is_overloaded or error is not None
+        # A stream's length depends on the answer, not on load; judge it by its first token
+        end = permit.first_token_at or time.perf_counter()
+        self.concurrency.release(end - permit.start, overloaded, permit.kind)
+
+    @contextmanager
+    def slot(self, kind: str = "call") -> Iterator[Permit]:
+        """
+        Wait for admission, then hold a slot for the duration of the call
+
+        Args:
+            kind: Kind of call (rewrite, answer, ...) whose latency baseline
+                the call is judged against
+
+        Yields:
+            Permit for the call
+
+        Raises:
+            RateLimitExceeded: Not admitted within queue_timeout
+        """
+        start = time.monotonic()
+        deadline = (
+            start + self.queue_timeout if self.queue_timeout is not None else None
+        )
+        if self.bucket is not None:
+            self.bucket.acquire(self._remaining(deadline))
+        if self.concurrency is not None:
+            self.concurrency.acquire(self._remaining(deadline))
+
+        permit = Permit(time.monotonic() - start, kind)
+        try:
+            yield permit
+        except BaseException as e:
+            self._finish(permit, e)
+            raise
+        self._finish(permit, None)
+
+    @asynccontextmanager
+    async def aslot(self, kind: str = "call") -> AsyncIterator[Permit]:
+        """Async variant of slot"""
+        start = time.monotonic()
+        deadline = (
+            start + self.queue_timeout if self.queue_timeout is not None else None
+        )
+        if self.bucket is not None:
+            await self.bucket.aacquire(self._remaining(deadline))
+        if self.concurrency is not None:
+            await self.concurrency.aacquire(self._remaining(deadline))
+
+        permit = Permit(time.monotonic() - start, kind)
+        try:
+            yield permit
+        except BaseException as e:
+            self._finish(permit, e)
+            raise
+        self._finish(permit, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get limiter state
+
+        Returns:
+            Dict with the upstream name, rate settings and concurrency stats
+        """
+        return {
+            "name": self.name,
+            "rate": self.bucket.rate if self.bucket is not None else None,
+            **(self.concurrency.stats() if self.concurrency is not None else {}),
+        }
@@ -0,0 +1,321 @@
+"""
+Resilience - Hedged requests and jittered retries for upstream calls
+A call that is still running at a high percentile of its recent latency gets a
+duplicate (hedge), and whichever finishes first wins; the share of hedged
+calls is capped. Transient failures (429/5xx, timeouts, connection errors) are
+retried with jittered exponential backoff via tenacity. All wrapped calls must
+be idempotent.
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from tenacity import (
+    AsyncRetrying,
+    Retrying,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+from tools import tracing
+from tools.rate_limiter import RateLimitExceeded, is_overload_error
+
+# Transport-level failures (httpx, requests, google-api-core, builtins) worth retrying
+RETRYABLE_ERRORS = {
+    "ConnectionError",
+    "TimeoutError",
+    "Timeout",
+    "ConnectTimeout",
+    "ReadTimeout",
+    "PoolTimeout",
+    "ConnectError",
+    "ReadError",
+    "WriteError",
+    "RemoteProtocolError",
+    "DeadlineExceeded",
+    "ServiceUnavailable",
+}
+
+
+class UpstreamError(Exception):
+    """An upstream reported failure in its response body rather than raising"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Whether a failed call may succeed if tried again
+
+    Args:
+        error: Exception raised by the call
+
+    Returns:
+        True for overload (429/5xx, quota) and transport errors; False for
+        local admission failures and everything else
+    """
+    if isinstance(error, (RateLimitExceeded, asyncio.CancelledError)):
+        return False
+    if any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__):
+        return True
+    return is_overload_error(error)
+
+
+class ResilientCaller:
+    """
+    Hedging and retry policy for one kind of upstream call
+    """
+
+    def __init__(
+        self,
+        name: str,
+        hedge: bool = True,
+        hedge_percentile: float = 0.95,
+        max_hedge_rate: float = 0.1,
+        min_samples: int = 20,
+        min_hedge_delay_ms: float = 50,
+        max_attempts: int = 3,
+        backoff_base: float = 0.2,
+        backoff_max: float = 5.0,
+        window: int = 200,
+    ):
+        """
+        Args:
+            name: Call name used in stats and logs (gemini.rewrite, serpapi, ...)
+            hedge: Whether slow calls get a duplicate
+            hedge_percentile: Latency percentile after which a call is hedged
+            max_hedge_rate: Largest share of recent calls that may be hedged
+            min_samples: Latency samples needed before hedging starts
+            min_hedge_delay_ms: Lower bound on the hedge delay
+            max_attempts: Attempts per call, including the first
+            backoff_base: Backoff multiplier in seconds (jittered, exponential)
+            backoff_max: Longest backoff between attempts in seconds
+            window: Recent calls kept for latency percentiles and the hedge rate
+        """
+        self.name = name
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.max_hedge_rate = max_hedge_rate
+        self.min_samples = min_samples
+        self.min_hedge_delay = min_hedge_delay_ms / 1000
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.counts: Dict[str, int] = {
+            "calls": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "retries": 0,
+        }
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._hedged: Deque[bool] = deque(maxlen=window)
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str) -> "ResilientCaller":
+        """
+        Build a policy from HEDGE_* and RETRY_* environment variables
+
+        Args:
+            name: Call name
+
+        Returns:
+            Configured ResilientCaller
+        """
+        return cls(
+            name,
+            hedge=os.getenv("HEDGE_ENABLED", "true").lower()
+            not in ("0", "false", "no", "off"),
+            hedge_percentile=float(os.getenv("HEDGE_PERCENTILE", 0.95)),
+            max_hedge_rate=float(os.getenv("HEDGE_MAX_RATE", 0.1)),
+            min_samples=int(os.getenv("HEDGE_MIN_SAMPLES", 20)),
+            min_hedge_delay_ms=float(os.getenv("HEDGE_MIN_DELAY_MS", 50)),
+            max_attempts=int(os.getenv("RETRY_MAX_ATTEMPTS", 3)),
+            backoff_base=float(os.getenv("RETRY_BACKOFF_BASE", 0.2)),
+            backoff_max=float(os.getenv("RETRY_BACKOFF_MAX", 5.0)),
+        )
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """
+        Run an idempotent call with hedging and retries
+
+        Args:
+            fn: Zero-argument callable performing the call
+
+        Returns:
+            The first successful result
+
+        Raises:
+            The last error once attempts are exhausted or the error is not retryable
+        """
+        retrying = Retrying(**self._retry_options())
+        return retrying(self._hedged_call, fn)
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant of call; fn returns a new coroutine per attempt"""
+        retrying = AsyncRetrying(**self._retry_options())
+        return await retrying(self._ahedged_call, fn)
+
+    def _retry_options(self) -> Dict[str, Any]:
+        return {
+            "stop": stop_after_attempt(self.max_attempts),
+            "wait": wait_random_exponential(
+                multiplier=self.backoff_base, max=self.backoff_max
+            ),
+            "retry": retry_if_exception(is_retryable),
+            "before_sleep": self._on_retry,
+            "reraise": True,
+        }
+
+    def _on_retry(self, retry_state: Any) -> None:
+        with self._lock:
+            self.counts["retries"] += 1
+        span = tracing.current_span()
+        if span is not None:
+            span.retry()
+        error = retry_state.outcome.exception()
+        print(
+            f"🔁 Retrying {self.name} (attempt {retry_state.attempt_number + 1}): {error}"
+        )
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None when hedging is off or not warmed up"""
+        if not self.hedge:
+            return None
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile))
+        return max(self.min_hedge_delay, ordered[index])
+
+    def _record(self, hedged: bool, hedge_won: bool = False) -> None:
+        """Count one attempt in the hedge-rate window"""
+        with self._lock:
+            self.counts["calls"] += 1
+            self._hedged.append(hedged)
+            self.counts["hedges"] += hedged
+            self.counts["hedge_wins"] += hedge_won
+
+    def _allow_hedge(self) -> bool:
+        """Whether the recent hedge rate leaves room for one more hedge"""
+        with self._lock:
+            return sum(self._hedged) + 1 <= self.max_hedge_rate * len(self._hedged)
+
+    def _timed(self, fn: Callable[[], Any]) -> Any:
+        start = time.perf_counter()
+        result = fn()
+        with self._lock:
+            self._latencies.append(time.perf_counter() - start)
+        return result
+
+    async def _atimed(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        start = time.perf_counter()
+        result = await fn()
+        with self._lock:
+            self._latencies.append(time.perf_counter() - start)
+        return result
+
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """Lazily create the pool sync calls run on once hedging is active"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=int(os.getenv("HEDGE_WORKERS", 32)),
+                    thread_name_prefix=f"hedge-{self.name}",
+                )
+            return self._executor
+
+    def _hedged_call(self, fn: Callable[[], Any]) -> Any:
+        """One attempt: run fn, duplicating it if it outlives the hedge delay"""
+        delay = self._hedge_delay()
+        if delay is None:
+            self._record(False)
+            return self._timed(fn)
+
+        executor = self._get_executor()
+        # Each future gets its own context copy so spans land in the caller's trace
+        primary = executor.submit(contextvars.copy_context().run, self._timed, fn)
+        done, _ = concurrent.futures.wait([primary], timeout=delay)
+        if done or not self._allow_hedge():
+            self._record(False)
+            return primary.result()
+
+        hedge = executor.submit(contextvars.copy_context().run, self._timed, fn)
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                if future.exception() is None:
+                    # The loser keeps running in the pool; its result is discarded
+                    self._record(True, hedge_won=future is hedge)
+                    return future.result()
+                error = future.exception()
+        self._record(True)
+        raise error
+
+    async def _ahedged_call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant of _hedged_call; the losing call is cancelled"""
+        delay = self._hedge_delay()
+        if delay is None:
+            self._record(False)
+            return await self._atimed(fn)
+
+        primary = asyncio.ensure_future(self._atimed(fn))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done or not self._allow_hedge():
+                self._record(False)
+                return await primary
+
+            hedge = asyncio.ensure_future(self._atimed(fn))
+            pending.add(hedge)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        self._record(True, hedge_won=task is hedge)
+                        return task.result()
+                    error = task.exception()
+            self._record(True)
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get hedge and retry counters
+
+        Returns:
+            Dict with calls, hedges, hedge_wins, retries, their rates and the
+            current hedge delay in milliseconds
+        """
+        delay = self._hedge_delay()
+        with self._lock:
+            counts = dict(self.counts)
+        calls = counts["calls"]
+        return {
+            **counts,
+            "hedge_rate": counts["hedges"] / calls if calls else 0.0,
+            "retry_rate": counts["retries"] / calls if calls else 0.0,
+            "hedge_delay_ms": delay * 1000 if delay is not None else None,
+        }
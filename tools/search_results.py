@@ -0,0 +1,184 @@
+"""
+Search Results - Compact typed records for search results
+The workflow passes SearchResult records between stages and renders the
+prompt text once, at the answer stage; parse_results turns formatted text
+back into records for callers that only have the string
+"""
+
+import math
+import re
+from typing import Any, Dict, List, Sequence, Union
+from urllib.parse import urlsplit
+
+# One formatted result as produced by render_results
+RESULT_PATTERN = re.compile(
+    r"^(?P<rank>\d+)\. (?P<title>.*)\n   (?P<snippet>.*)\n   Source: (?P<link>.*)$",
+    re.MULTILINE,
+)
+RESULTS_HEADER = "Search Results:"
+NO_RESULTS = "No search results found."
+
+# Characters render_results adds around each result ("1. ", "\n   ", "\n   Source: ")
+_SNIPPET_LINE = len("\n   ")
+_SOURCE_LINE = len("\n   Source: ")
+
+
+class SearchResult:
+    """
+    One search result
+
+    Records are never modified in place; replace() returns an updated copy,
+    so stages can share them safely across cached and coalesced searches.
+    """
+
+    __slots__ = ("title", "snippet", "link", "position", "source")
+
+    def __init__(
+        self, title: str, snippet: str, link: str, position: int = 0, source: str = ""
+    ):
+        """
+        Args:
+            title: Result title
+            snippet: Result snippet (may carry appended page passages)
+            link: Result URL
+            position: Rank in the search that found it (1-based)
+            source: Site name (the host when SerpAPI gives none)
+        """
+        self.title = title
+        self.snippet = snippet
+        self.link = link
+        self.position = position
+        self.source = source or urlsplit(link).netloc
+
+    @classmethod
+    def from_serpapi(cls, result: Dict[str, Any], position: int) -> "SearchResult":
+        """
+        Build a record from one SerpAPI organic result
+
+        Args:
+            result: Entry of organic_results
+            position: Rank of the entry (1-based)
+
+        Returns:
+            SearchResult with SerpAPI's defaults for missing fields
+        """
+        return cls(
+            title=result.get("title", "No title"),
+            snippet=result.get("snippet", "No description available"),
+            link=result.get("link", ""),
+            position=result.get("position", position),
+            source=result.get("source", ""),
+        )
+
+    def replace(self, **changes: Any) -> "SearchResult":
+        """Copy of the record with some fields changed"""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return SearchResult(**fields)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict with title, snippet, link, position and source"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def render(self, rank: int) -> str:
+        """Prompt text for the record at a rank (no snippet line when the snippet is empty)"""
+        if self.snippet:
+            return f"{rank}. {self.title}\n   {self.snippet}\n   Source: {self.link}"
+        return f"{rank}. {self.title}\n   Source: {self.link}"
+
+    def rendered_length(self, rank: int) -> int:
+        """Length of render(rank) without building the string"""
+        snippet = _SNIPPET_LINE + len(self.snippet) if self.snippet else 0
+        return (
+            len(str(rank))
+            + 2
+            + len(self.title)
+            + snippet
+            + _SOURCE_LINE
+            + len(self.link)
+        )
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, SearchResult):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def __repr__(self) -> str:
+        return f"SearchResult(position={self.position}, title={self.title!r}, link={self.link!r})"
+
+
+# Search results as records, or text (formatted results, an error or "No search results found.")
+Evidence = Union[str, Sequence[SearchResult]]
+
+
+def render_results(results: Sequence[SearchResult], limit: int = 0) -> str:
+    """
+    Render records as the numbered prompt text AnswerAgent expects
+
+    Args:
+        results: Records, best first
+        limit: Maximum results rendered (0 for all)
+
+    Returns:
+        "Search Results:" followed by one block per result, or
+        "No search results found." for no records
+    """
+    results = results[:limit] if limit else results
+    if not results:
+        return NO_RESULTS
+    body = "\n\n".join(result.render(rank) for rank, result in enumerate(results, 1))
+    return f"{RESULTS_HEADER}\n\n{body}"
+
+
+def rendered_tokens(results: Sequence[SearchResult]) -> int:
+    """
+    Estimated prompt tokens of render_results(results), computed without rendering
+
+    Args:
+        results: Records
+
+    Returns:
+        About four characters per token, like context_compactor.estimate_tokens
+    """
+    if not results:
+        return math.ceil(len(NO_RESULTS) / 4)
+    length = len(RESULTS_HEADER) + 2 * len(results)
+    length += sum(
+        result.rendered_length(rank) for rank, result in enumerate(results, 1)
+    )
+    return math.ceil(length / 4)
+
+
+def parse_results(search_results: str) -> List[SearchResult]:
+    """
+    Turn formatted results back into records
+
+    Args:
+        search_results: Text produced by render_results
+
+    Returns:
+        Records in order (empty for errors and "No search results found.")
+    """
+    if not search_results.startswith(RESULTS_HEADER):
+        return []
+    return [
+        SearchResult(
+            match.group("title"),
+            match.group("snippet").strip(),
+            match.group("link").strip(),
+            int(match.group("rank")),
+        )
+        for match in RESULT_PATTERN.finditer(search_results)
+    ]
+
+
+def evidence_records(evidence: Evidence) -> List[SearchResult]:
+    """Records of evidence given as records or as formatted text"""
+    return parse_results(evidence) if isinstance(evidence, str) else list(evidence)
+
+
+def evidence_text(evidence: Evidence) -> str:
+    """Prompt text of evidence given as records or as formatted text"""
+    return evidence if isinstance(evidence, str) else render_results(evidence)
@@ -1,119 +1,459 @@
 """
 Search Tool - Performs web search using SerpAPI
-Fetches top 5 Google search results and formats them for the answer agent
+Fetches top 5 Google search results as SearchResult records (rendered for the
+answer agent on request), or fans several queries out in parallel and fuses
+their results
 """
 
+import asyncio
+import concurrent.futures
+import contextvars
 import os
-from typing import Dict, Any, List
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
 from serpapi import GoogleSearch
 
+from tools.cache import CacheBackend, create_cache, make_cache_key
+from tools.metrics import record_serpapi_call
+from tools.rank_fusion import reciprocal_rank_fusion
+from tools.rate_limiter import OVERLOAD_PATTERN, UpstreamLimiter
+from tools.resilience import ResilientCaller, UpstreamError
+from tools.search_results import NO_RESULTS, SearchResult, render_results
+from tools.tracing import span
+
 
 class SearchTool:
     """
     Tool that performs Google searches using SerpAPI and formats results
     """
-    
-    def __init__(self):
+
+    # Parameters that change the result set and therefore the cache key
+    search_params = {
+        "engine": "google",
+        "num": 5,  # Get top 5 results
+        "safe": "active",
+    }
+
+    # SerpAPI JSON endpoint used by the async client
+    endpoint = "https://serpapi.com/search.json"
+
+    def __init__(
+        self,
+        cache: Optional[CacheBackend] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        limiter: Optional[UpstreamLimiter] = None,
+        resilience: Optional[ResilientCaller] = None,
+    ):
         self.api_key = os.getenv("SERPAPI_KEY")
         if not self.api_key:
             raise ValueError("SERPAPI_KEY not found in environment variables")
-    
+
+        # Result cache (memory by default, configurable via SEARCH_CACHE_* env vars)
+        self.cache = cache if cache is not None else create_cache()
+
+        # Pooled async HTTP client, created on first async search per event loop
+        self.transport = transport
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_client_loop = None
+
+        # Shared SerpAPI rate/concurrency limit (SERPAPI_* settings)
+        self.limiter = (
+            limiter if limiter is not None else UpstreamLimiter.from_env("serpapi")
+        )
+
+        # Hedging and retries for SerpAPI requests (HEDGE_* / RETRY_* settings)
+        self.resilience = (
+            resilience
+            if resilience is not None
+            else ResilientCaller.from_env("serpapi")
+        )
+        self.timeout = float(os.getenv("SERPAPI_TIMEOUT", 30))
+
+        # Thread pool for sync multi-query searches, created on first use
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+    def _cache_lookup(self, query: str) -> tuple:
+        """Return (cache_key, cached_results_or_None) for a query"""
+        cache_key = make_cache_key("search", query, **self.search_params)
+        if self.cache is None:
+            return cache_key, None
+        return cache_key, self.cache.get(cache_key)
+
+    def _cache_store(self, cache_key: str, results: Dict) -> None:
+        """Cache successful results (never SerpAPI error payloads)"""
+        if self.cache is not None and "error" not in results:
+            self.cache.set(cache_key, results)
+
+    def _fetch(self, query: str) -> Dict:
+        """
+        Fetch raw SerpAPI results, serving repeats from the result cache
+
+        Args:
+            query: Search query string
+
+        Returns:
+            Raw SerpAPI results dictionary
+        """
+        cache_key, cached = self._cache_lookup(query)
+        if cached is not None:
+            return cached
+
+        results = self.resilience.call(lambda: self._request(query))
+
+        self._cache_store(cache_key, results)
+        return results
+
+    def _request(self, query: str) -> Dict:
+        """One SerpAPI request, admitted by the limiter; quota errors are raised so they can be retried"""
+        search = GoogleSearch(
+            {"q": query, "api_key": self.api_key, **self.search_params}
+        )
+        search.timeout = self.timeout
+        with self.limiter.slot() as permit, span(
+            "serpapi", query=query, queue_wait_ms=permit.queue_wait_ms
+        ) as current:
+            try:
+                results = search.get_dict()
+            except Exception:
+                record_serpapi_call(None)
+                raise
+            record_serpapi_call(results)
+            if "error" in results and OVERLOAD_PATTERN.search(str(results["error"])):
+                raise UpstreamError(results["error"])
+            if current is not None:
+                current.set(results=len(results.get("organic_results", [])))
+        return results
+
+    async def _afetch(self, query: str) -> Dict:
+        """
+        Async variant of _fetch using the pooled httpx client
+
+        Args:
+            query: Search query string
+
+        Returns:
+            Raw SerpAPI results dictionary
+        """
+        cache_key, cached = self._cache_lookup(query)
+        if cached is not None:
+            return cached
+
+        results = await self.resilience.acall(lambda: self._arequest(query))
+
+        self._cache_store(cache_key, results)
+        return results
+
+    async def _arequest(self, query: str) -> Dict:
+        """Async variant of _request using the pooled httpx client"""
+        client = self._get_async_client()
+        async with self.limiter.aslot() as permit:
+            with span(
+                "serpapi", query=query, queue_wait_ms=permit.queue_wait_ms
+            ) as current:
+                try:
+                    response = await client.get(
+                        self.endpoint,
+                        params={
+                            "q": query,
+                            "api_key": self.api_key,
+                            **self.search_params,
+                        },
+                    )
+                    if response.status_code == 429 or response.status_code >= 500:
+                        raise UpstreamError(
+                            f"SerpAPI HTTP {response.status_code}: {response.text[:200]}",
+                            response.status_code,
+                        )
+                    # SerpAPI reports other failures as {"error": ...} bodies, like GoogleSearch.get_dict
+                    results = response.json()
+                except Exception:
+                    record_serpapi_call(None)
+                    raise
+                record_serpapi_call(results)
+                if "error" in results and OVERLOAD_PATTERN.search(
+                    str(results["error"])
+                ):
+                    raise UpstreamError(results["error"])
+                if current is not None:
+                    current.set(
+                        results=len(results.get("organic_results", [])),
+                        response_bytes=len(response.content),
+                    )
+        return results
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """Lazily create the shared async HTTP client for the running event loop"""
+        loop = asyncio.get_running_loop()
+        if (
+            self._async_client is None
+            or self._async_client.is_closed
+            or self._async_client_loop is not loop
+        ):
+            # Pooled connections are bound to the loop that opened them
+            self._async_client_loop = loop
+            self._async_client = httpx.AsyncClient(
+                transport=self.transport,
+                timeout=httpx.Timeout(float(os.getenv("SERPAPI_TIMEOUT", 30))),
+                limits=httpx.Limits(
+                    max_connections=int(os.getenv("SERPAPI_MAX_CONNECTIONS", 100)),
+                    max_keepalive_connections=20,
+                ),
+            )
+        return self._async_client
+
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """Lazily create the thread pool sync multi-query searches run on"""
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=int(os.getenv("SEARCH_FANOUT_WORKERS", 16)),
+                thread_name_prefix="search-fanout",
+            )
+        return self._executor
+
+    async def aclose(self) -> None:
+        """Close the pooled async HTTP client"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """
+        Get result cache hit/miss counters
+
+        Returns:
+            Dict with cache statistics (empty when caching is disabled)
+        """
+        return self.cache.stats() if self.cache is not None else {}
+
+    def fetch_results(self, query: str) -> Dict[str, Any]:
+        """
+        Perform Google search and return result records
+
+        This is the one fetch path; __call__, search and the workflow all use it.
+
+        Args:
+            query: Search query string
+
+        Returns:
+            Dict with results (SearchResult records) and content, which holds
+            the error or "No search results found." text when there are no records
+        """
+        try:
+            return self._outcome(self._structure_results(self._fetch(query)))
+        except Exception as e:
+            return {"content": f"Error performing search: {str(e)}", "results": []}
+
+    async def afetch_results(self, query: str) -> Dict[str, Any]:
+        """
+        Async variant of fetch_results
+
+        Args:
+            query: Search query string
+
+        Returns:
+            Dict with results (SearchResult records) and content
+        """
+        try:
+            return self._outcome(self._structure_results(await self._afetch(query)))
+        except Exception as e:
+            return {"content": f"Error performing search: {str(e)}", "results": []}
+
+    def _outcome(self, results: List[SearchResult]) -> Dict[str, Any]:
+        return {"content": "" if results else NO_RESULTS, "results": results}
+
     def __call__(self, input_data: str) -> Dict[str, Any]:
         """
         Perform Google search and return formatted results
-        
+
         Args:
             input_data: Search query string
-            
+
         Returns:
             Dict with content key containing formatted search results
         """
-        try:
-            # Configure search parameters
-            search_params = {
-                "q": input_data,
-                "api_key": self.api_key,
-                "engine": "google",
-                "num": 5,  # Get top 5 results
-                "safe": "active"
-            }
-            
-            # Perform the search
-            search = GoogleSearch(search_params)
-            results = search.get_dict()
-            
-            # Format the results
-            formatted_results = self._format_results(results)
-            
-            return {
-                "content": formatted_results
-            }
-            
-        except Exception as e:
+        outcome = self.fetch_results(input_data)
+        return {
+            "content": (
+                render_results(outcome["results"])
+                if outcome["results"]
+                else outcome["content"]
+            )
+        }
+
+    async def acall(self, input_data: str) -> Dict[str, Any]:
+        """
+        Async variant of __call__
+
+        Args:
+            input_data: Search query string
+
+        Returns:
+            Dict with content key containing formatted search results
+        """
+        outcome = await self.afetch_results(input_data)
+        return {
+            "content": (
+                render_results(outcome["results"])
+                if outcome["results"]
+                else outcome["content"]
+            )
+        }
+
+    def multi_search(
+        self, queries: Sequence[str], max_results: int = 8
+    ) -> Dict[str, Any]:
+        """
+        Search several queries in parallel and fuse their results
+
+        Args:
+            queries: Search queries, best first
+            max_results: Maximum results kept after fusion
+
+        Returns:
+            Dict with results (fused SearchResult records), content (the error
+            or "No search results found." text when there are no records) and
+            metadata with query, failure and result counts
+        """
+        executor = self._get_executor()
+        # Copy the context per query so each serpapi span lands in the caller's trace
+        futures = [
+            executor.submit(contextvars.copy_context().run, self._fetch, query)
+            for query in queries
+        ]
+        outcomes: List[Any] = []
+        for future in futures:
+            try:
+                outcomes.append(future.result())
+            except Exception as e:
+                outcomes.append(e)
+        return self._fuse(queries, outcomes, max_results)
+
+    async def amulti_search(
+        self, queries: Sequence[str], max_results: int = 8
+    ) -> Dict[str, Any]:
+        """
+        Async variant of multi_search; the searches share the pooled httpx client
+
+        Args:
+            queries: Search queries, best first
+            max_results: Maximum results kept after fusion
+
+        Returns:
+            Dict with results, content and metadata like multi_search
+        """
+        outcomes = await asyncio.gather(
+            *(self._afetch(query) for query in queries), return_exceptions=True
+        )
+        return self._fuse(queries, outcomes, max_results)
+
+    def _fuse(
+        self, queries: Sequence[str], outcomes: List[Any], max_results: int
+    ) -> Dict[str, Any]:
+        """Deduplicate and rank-fuse per-query results; fails only when every query failed"""
+        errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        result_lists = [
+            self._structure_results(outcome)
+            for outcome in outcomes
+            if not isinstance(outcome, BaseException)
+        ]
+        metadata = {
+            "queries": len(queries),
+            "failed": len(errors),
+            "results": sum(len(results) for results in result_lists),
+        }
+        if not result_lists:
             return {
-                "content": f"Error performing search: {str(e)}"
+                "content": f"Error performing search: {str(errors[0])}",
+                "results": [],
+                "metadata": {**metadata, "unique": 0},
             }
-    
-    def _format_results(self, results: Dict) -> str:
+
+        for query, error in zip(queries, outcomes):
+            if isinstance(error, BaseException):
+                print(
+                    f"⚠️ Search for '{query}' failed, fusing the other queries: {error}"
+                )
+
+        fused = reciprocal_rank_fusion(result_lists)
+        metadata["unique"] = len(fused)
+        return {**self._outcome(fused[:max_results]), "metadata": metadata}
+
+    def _format_results(self, results: Dict, limit: int = 5) -> str:
         """
         Format search results into readable text
-        
+
         Args:
             results: Raw SerpAPI results dictionary
-            
+            limit: Maximum results included
+
         Returns:
             Formatted string with titles and snippets
         """
         if "organic_results" not in results:
-            return "No search results found."
-        
-        formatted_text = "Search Results:\n\n"
-        
-        for i, result in enumerate(results["organic_results"][:5], 1):
-            title = result.get("title", "No title")
-            snippet = result.get("snippet", "No description available")
-            link = result.get("link", "")
-            
-            formatted_text += f"{i}. {title}\n"
-            formatted_text += f"   {snippet}\n"
-            formatted_text += f"   Source: {link}\n\n"
-        
-        return formatted_text.strip()
-    
-    def search(self, query: str) -> List[Dict[str, str]]:
+            return NO_RESULTS
+        return render_results(self._structure_results(results, limit))
+
+    def search(self, query: str) -> List[Dict[str, Any]]:
         """
         Alternative method that returns structured results
-        
+
         Args:
             query: Search query string
-            
+
         Returns:
-            List of dictionaries with title, snippet, and link
+            List of dictionaries with title, snippet, link, position and source
         """
-        try:
-            search_params = {
-                "q": query,
-                "api_key": self.api_key,
-                "engine": "google",
-                "num": 5,
-                "safe": "active"
-            }
-            
-            search = GoogleSearch(search_params)
-            results = search.get_dict()
-            
-            if "organic_results" not in results:
-                return []
-            
-            structured_results = []
-            for result in results["organic_results"][:5]:
-                structured_results.append({
-                    "title": result.get("title", "No title"),
-                    "snippet": result.get("snippet", "No description available"),
-                    "link": result.get("link", "")
-                })
-            
-            return structured_results
-            
-        except Exception as e:
-            return [{"title": "Error", "snippet": f"Search failed: {str(e)}", "link": ""}]
\ No newline at end of file
+        outcome = self.fetch_results(query)
+        if outcome["content"].startswith("Error"):
+            return [
+                {
+                    "title": "Error",
+                    "snippet": outcome["content"].replace(
+                        "Error performing search", "Search failed"
+                    ),
+                    "link": "",
+                }
+            ]
+        return [result.to_dict() for result in outcome["results"]]
+
+    async def asearch(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Async variant of search
+
+        Args:
+            query: Search query string
+
+        Returns:
+            List of dictionaries with title, snippet, link, position and source
+        """
+        outcome = await self.afetch_results(query)
+        if outcome["content"].startswith("Error"):
+            return [
+                {
+                    "title": "Error",
+                    "snippet": outcome["content"].replace(
+                        "Error performing search", "Search failed"
+                    ),
+                    "link": "",
+                }
+            ]
+        return [result.to_dict() for result in outcome["results"]]
+
+    def _structure_results(self, results: Dict, limit: int = 5) -> List[SearchResult]:
+        """
+        Convert raw SerpAPI results into result records
+
+        Args:
+            results: Raw SerpAPI results dictionary
+            limit: Maximum results converted
+
+        Returns:
+            SearchResult records in SerpAPI order
+        """
+        return [
+            SearchResult.from_serpapi(result, position)
+            for position, result in enumerate(
+                results.get("organic_results", [])[:limit], 1
+            )
+        ]
@@ -0,0 +1,129 @@
+"""
+Single-Flight - Coalesces concurrent identical calls into one execution
+The first caller for a key runs the work; callers arriving while it is in
+flight wait for and share its result
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class _Call:
+    """An in-flight synchronous call shared by its waiters"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls that share a key (sync and asyncio)
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self.executions = 0
+        self.coalesced = 0
+        self._calls: Dict[Any, _Call] = {}
+        self._async_calls: Dict[Tuple[int, Any], asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Any, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn once for all concurrent callers with the same key
+
+        Args:
+            key: Hashable identity of the work
+            fn: Zero-argument callable performing the work
+
+        Returns:
+            Tuple of (result, shared) where shared is True for callers that
+            reused another caller's execution
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: Any, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Async variant of do for callers on the same event loop
+
+        Args:
+            key: Hashable identity of the work
+            fn: Zero-argument coroutine function performing the work
+
+        Returns:
+            Tuple of (result, shared)
+        """
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+
+        future = self._async_calls.get(loop_key)
+        if future is not None:
+            self.coalesced += 1
+            try:
+                # Shield so a cancelled waiter doesn't cancel the shared call
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+            # The leader was cancelled (e.g. at its request deadline); run the work for this caller
+            return await self.ado(key, fn)
+
+        future = loop.create_future()
+        self._async_calls[loop_key] = future
+        self.executions += 1
+
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so lone failures don't log "never retrieved"
+            future.exception()
+            raise
+        finally:
+            del self._async_calls[loop_key]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get coalescing counters
+
+        Returns:
+            Dict with executions, coalesced callers and in-flight keys
+        """
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls) + len(self._async_calls),
+        }
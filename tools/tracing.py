@@ -0,0 +1,335 @@
+"""
+Tracing - Lightweight per-request spans for workflow nodes and external calls
+Each request gets a Trace; spans opened while it is active (across threads and
+asyncio tasks, via contextvars) record start/end, queue wait, retries and
+payload sizes. The timing breakdown is attached to response metadata and
+traces can be exported as JSONL for offline analysis.
+"""
+
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+# Span name prefixes of calls that leave the process
+EXTERNAL_PREFIXES = ("gemini.", "serpapi", "page.")
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar(
+    "current_trace", default=None
+)
+_current_span: contextvars.ContextVar = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+class Span:
+    """
+    One timed operation inside a trace
+    """
+
+    __slots__ = ("name", "parent", "start", "end", "attributes")
+
+    def __init__(self, name: str, parent: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attributes = attributes
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def set(self, **attributes: Any) -> None:
+        """Attach attributes (payload sizes, outcome, ...) to the span"""
+        self.attributes.update(attributes)
+
+    def retry(self) -> None:
+        """Count one retry of the operation"""
+        self.attributes["retries"] = self.attributes.get("retries", 0) + 1
+
+
+class Trace:
+    """
+    All spans recorded for one request
+    """
+
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attributes = attributes or {}
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def record(
+        self, name: str, start: float, end: Optional[float] = None, **attributes: Any
+    ) -> Span:
+        """
+        Add a span measured outside a `span()` block (generators, shared batch calls)
+
+        Args:
+            name: Span name
+            start: time.perf_counter() at the start
+            end: time.perf_counter() at the end (defaults to now)
+            **attributes: Span attributes
+
+        Returns:
+            The recorded Span
+        """
+        parent = _current_span.get()
+        recorded = Span(name, parent.name if parent is not None else None, attributes)
+        recorded.start = start
+        recorded.end = end if end is not None else time.perf_counter()
+        self.add(recorded)
+        return recorded
+
+    def timings(self) -> Dict[str, Any]:
+        """
+        Summarize where the request spent its time
+
+        Returns:
+            Dict with total_ms, per-node stage times, per-call external times,
+            overhead_ms (total minus external waits) and the trace id
+        """
+        stages: Dict[str, float] = {}
+        external: Dict[str, float] = {}
+        with self._lock:
+            spans = list(self.spans)
+
+        for span in spans:
+            if span.name.startswith(EXTERNAL_PREFIXES):
+                external[span.name] = external.get(span.name, 0.0) + span.duration_ms
+            elif span.parent is None:
+                stages[span.name] = stages.get(span.name, 0.0) + span.duration_ms
+
+        total = self.duration_ms
+        return {
+            "trace_id": self.trace_id,
+            "total_ms": round(total, 3),
+            "stages": {name: round(ms, 3) for name, ms in stages.items()},
+            "external": {name: round(ms, 3) for name, ms in external.items()},
+            # Parallel calls (speculative search, fan-out) can overlap
+            "overhead_ms": round(max(0.0, total - sum(external.values())), 3),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializable form used for JSONL export"""
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "spans": [
+                {
+                    "name": span.name,
+                    "parent": span.parent,
+                    "start_ms": round((span.start - self.start) * 1000, 3),
+                    "duration_ms": round(span.duration_ms, 3),
+                    "attributes": span.attributes,
+                }
+                for span in spans
+            ],
+        }
+
+
+class Tracer:
+    """
+    Creates traces and spans, and exports finished traces as JSONL
+    """
+
+    def __init__(
+        self,
+        export_path: Optional[str] = None,
+        sample_rate: float = 1.0,
+        enabled: bool = True,
+    ):
+        """
+        Args:
+            export_path: JSONL file finished traces are appended to (None disables export)
+            sample_rate: Share of traces exported
+            enabled: Whether traces and spans are recorded at all
+        """
+        self.export_path = export_path
+        self.sample_rate = sample_rate
+        self.enabled = enabled
+        self._export_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        """
+        Build a tracer from TRACE_* environment variables
+
+        Returns:
+            Configured Tracer
+        """
+        return cls(
+            export_path=os.getenv("TRACE_EXPORT_PATH") or None,
+            sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", 1.0)),
+            enabled=os.getenv("TRACE_ENABLED", "true").lower()
+            not in ("0", "false", "no", "off"),
+        )
+
+    @contextmanager
+    def trace(self, name: str, **attributes: Any) -> Iterator[Optional[Trace]]:
+        """
+        Record a request; spans opened inside belong to it
+
+        Args:
+            name: Request kind (run, arun, stream, step_by_step, ...)
+            **attributes: Request attributes (question, batch_index, ...)
+
+        Yields:
+            The active Trace, or None when tracing is disabled
+        """
+        trace = self.start(name, **attributes)
+        try:
+            with self.activate(trace):
+                yield trace
+        finally:
+            self.finish(trace)
+
+    def start(self, name: str, **attributes: Any) -> Optional[Trace]:
+        """
+        Create a trace without making it current (see activate / iterate)
+
+        Returns:
+            New Trace, or None when tracing is disabled
+        """
+        return Trace(name, attributes) if self.enabled else None
+
+    def finish(self, trace: Optional[Trace]) -> None:
+        """Close a trace started with start() and export it"""
+        if trace is not None:
+            trace.end = time.perf_counter()
+            self.export(trace)
+
+    @contextmanager
+    def activate(self, trace: Optional[Trace]) -> Iterator[Optional[Trace]]:
+        """Make an existing trace current, e.g. inside a batch item's task"""
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(None)
+        try:
+            yield trace
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+
+    def export(self, trace: Trace) -> None:
+        """Append a finished trace to the JSONL export file (if configured and sampled)"""
+        if not self.export_path or random.random() >= self.sample_rate:
+            return
+        line = json.dumps(trace.to_dict(), default=str)
+        try:
+            directory = os.path.dirname(os.path.abspath(self.export_path))
+            os.makedirs(directory, exist_ok=True)
+            with self._export_lock, open(self.export_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"⚠️  Trace export failed: {e}")
+
+
+_tracer = Tracer.from_env()
+
+
+def get_tracer() -> Tracer:
+    """Get the process-wide tracer"""
+    return _tracer
+
+
+def set_tracer(tracer: Tracer) -> None:
+    """Replace the process-wide tracer (e.g. to change the export path)"""
+    global _tracer
+    _tracer = tracer
+
+
+def iterate(trace: Optional[Trace], iterator: Iterator[Any]) -> Iterator[Any]:
+    """
+    Pull items from an iterator with a trace active only while producing them
+
+    Keeps the trace out of the consumer's context between items, which a
+    `with trace(...)` around a yielding generator would leak into.
+    """
+    tracer = get_tracer()
+    while True:
+        with tracer.activate(trace):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+async def aiterate(
+    trace: Optional[Trace], iterator: AsyncIterator[Any]
+) -> AsyncIterator[Any]:
+    """Async variant of iterate"""
+    tracer = get_tracer()
+    while True:
+        with tracer.activate(trace):
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+        yield item
+
+
+def current_trace() -> Optional[Trace]:
+    """Get the trace of the request being processed, if any"""
+    return _current_trace.get()
+
+
+def current_span() -> Optional[Span]:
+    """Get the innermost open span, if any"""
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Time an operation within the current trace
+
+    Args:
+        name: Node name, or gemini.* / serpapi / page.* for external calls
+        **attributes: Initial attributes (payload sizes, queue_wait_ms, ...)
+
+    Yields:
+        The Span, or None when no trace is active
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = Span(name, parent.name if parent is not None else None, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+        trace.add(current)